@@ -0,0 +1,211 @@
+# =====================================
+# File: audit_throughput.py
+# Description:
+#   Offline end-to-end benchmark of the audit pipeline against the local
+#   mock LLM server (no API costs). Each scenario audits N synthetic records
+#   through the selected backend's real client and reports records/sec,
+#   p50/p99 latency of the LLM calls, peak memory and PDF time.
+#   Scenarios run in fresh processes (with their own cache directory) so
+#   peak memory and caches don't carry over.
+#
+#   Usage: python benchmarks/audit_throughput.py --records 1000 10000 100000 --backend OPENAI GEMINI
+#          python benchmarks/audit_throughput.py --output baseline.json
+#          python benchmarks/audit_throughput.py --baseline baseline.json   # exit 1 on regressions
+# =====================================
+
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'src'), os.path.dirname(os.path.abspath(__file__))]
+import argparse
+import json
+import logging
+import multiprocessing
+import tempfile
+import time
+
+from mock_llm_server import MockLLMServer
+from src.generate_test_recipes import generate
+
+BACKENDS = ("OPENAI", "INTERNAL", "GEMINI")
+
+
+def write_records(path, count, seed=0):
+    """
+    Write count clean flat synthetic records (the shape of public_assets/test_data.json) as a JSON array.
+    """
+    generate("flat", count, "json", path, f"{os.path.splitext(path)[0]}.labels.jsonl", seed)
+
+
+def _percentile(values, share):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def _run_scenario(env, path, records, results, verbose):
+    # Runs in a fresh process: configure through the environment before the first import of config
+    os.environ.update(env)
+    if not verbose:
+        # Retries and salvaged responses are expected with injected faults
+        logging.disable(logging.ERROR)
+    import resource
+    from collections import Counter
+
+    from src import backends, metrics
+    from src.audit_pipeline import audit_source, summarize_results, tally_findings
+    from src.prompts import DEFAULT_SYSTEM_PROMPT, DEFAULT_USER_PROMPT
+    from src.reports import write_report
+
+    # Time every LLM call as the audit sees it (including streaming)
+    backend = backends.get_backend()
+    complete = backend.complete
+    latencies = []
+
+    def timed_complete(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return complete(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    backend.complete = timed_complete
+
+    live = Counter()
+    start = time.perf_counter()
+    with open(path, "rb") as source:
+        result_json, counts, _, _ = audit_source(
+            source, "json", records, "gpt-4o", DEFAULT_SYSTEM_PROMPT, DEFAULT_USER_PROMPT,
+            use_cache=False,
+            record_callback=lambda streamed: tally_findings(live, streamed),
+            file_name=path,
+            dataset_id=path
+        )
+    audit_seconds = time.perf_counter() - start
+    summary_stats = summarize_results(result_json, counts["total_entries"])
+
+    start = time.perf_counter()
+    write_report(result_json, path, summary_stats, "pdf", os.path.join(env["AUDIT_CACHE_DIR"], "report.pdf"))
+    pdf_seconds = time.perf_counter() - start
+
+    results.put({
+        "records": summary_stats["total_records"],
+        "findings": summary_stats["critical"] + summary_stats["moderate"] + summary_stats["minor"],
+        "llm_calls": len(latencies),
+        "audit_seconds": round(audit_seconds, 3),
+        "records_per_second": round(summary_stats["total_records"] / audit_seconds, 1),
+        "p50_latency": round(_percentile(latencies, 0.5) or 0, 3),
+        "p99_latency": round(_percentile(latencies, 0.99) or 0, 3),
+        "pdf_seconds": round(pdf_seconds, 3),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_memory_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        # Time spent per stage (summed over threads, so LLM time can exceed the audit time)
+        "stage_seconds": {stage: round(series["sum"], 3) for (stage, _), series in sorted(metrics.snapshot().items())},
+    })
+
+
+def run_scenario(server, backend, records, data_path, workdir, verbose=False):
+    """
+    Audit the records of data_path through backend against the mock server, in a fresh process.
+    """
+    env = {
+        "LLM_BACKEND": backend,
+        "OPENAI_API_KEY": "mock",
+        "OPENAI_BASE_URL": f"{server.url}/v1",
+        "PORTKEY_AZURE_API_KEY": "mock",
+        "PORTKEY_BASE_URL": f"{server.url}/v1",
+        "GEMINI_STUDIO_API_KEY": "mock",
+        "GEMINI_API_ENDPOINT": server.url,
+        "AUDIT_CACHE_DIR": tempfile.mkdtemp(dir=workdir),
+        "MAX_ENTRIES": str(records),
+    }
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_scenario, args=(env, data_path, records, results, verbose))
+    process.start()
+    result = results.get()
+    process.join()
+    return {"backend": backend, **result}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the regressions of results against a baseline run, as messages.
+    """
+    previous = {(entry["backend"], entry["records"]): entry for entry in baseline["results"]}
+    regressions = []
+    for entry in results:
+        before = previous.get((entry["backend"], entry["records"]))
+        if before is None:
+            continue
+        name = f"{entry['backend']} {entry['records']} records"
+        if entry["records_per_second"] < before["records_per_second"] * (1 - tolerance):
+            regressions.append(f"{name}: {entry['records_per_second']} records/s (was {before['records_per_second']})")
+        for metric in ("p99_latency", "pdf_seconds", "peak_memory_mb"):
+            if entry[metric] > before[metric] * (1 + tolerance) and entry[metric] - before[metric] > 0.05:
+                regressions.append(f"{name}: {metric} {entry[metric]} (was {before[metric]})")
+    return regressions
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Offline audit throughput benchmark against a mock LLM server.")
+    parser.add_argument("--records", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--backend", nargs="+", choices=BACKENDS, default=["OPENAI"])
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock seconds before a response starts.")
+    parser.add_argument("--ttft", type=float, default=0.2, help="Mock seconds to the first streamed token.")
+    parser.add_argument("--tokens-per-second", type=float, default=5000, help="Mock streaming rate (0 = unthrottled).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of mock requests answered with 500.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of mock requests answered with 429.")
+    parser.add_argument("--rpm", type=int, default=0, help="Mock requests per minute before 429s (0 = no ceiling).")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Share of mock responses cut off mid-way.")
+    parser.add_argument("--deviation-rate", type=float, default=0.2, help="Share of records with a mock finding.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Show the audit logs of the scenarios.")
+    parser.add_argument("--output", help="Write the results as JSON (e.g. a baseline).")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run; exit 1 if any scenario regressed.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    server = MockLLMServer(
+        latency=args.latency, ttft=args.ttft, tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, truncate_rate=args.truncate_rate,
+        deviation_rate=args.deviation_rate, rpm=args.rpm, seed=args.seed
+    ).start()
+
+    results = []
+    print(f"{'backend':>9} {'records':>8} {'findings':>9} {'calls':>6} {'records/s':>10} "
+          f"{'p50 (s)':>8} {'p99 (s)':>8} {'peak MB':>8} {'PDF (s)':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for records in args.records:
+            write_records(os.path.join(workdir, f"records_{records}.json"), records, args.seed)
+        for backend in args.backend:
+            for records in args.records:
+                data_path = os.path.join(workdir, f"records_{records}.json")
+                result = run_scenario(server, backend, records, data_path, workdir, args.verbose)
+                results.append(result)
+                print(f"{backend:>9} {result['records']:>8} {result['findings']:>9} {result['llm_calls']:>6} "
+                      f"{result['records_per_second']:>10} {result['p50_latency']:>8} {result['p99_latency']:>8} "
+                      f"{result['peak_memory_mb']:>8} {result['pdf_seconds']:>8}")
+    server.shutdown()
+    print(f"Mock server: {dict(server.stats)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# =====================================
+# File: cold_start.py
+# Description:
+#   Cold-start benchmark of the Streamlit app. Each measurement runs in a
+#   fresh Python process, like a new Cloud Run instance:
+#     - app_imports:    importing the modules app.py needs for the first page
+#     - first_page:     first run of app.py (Streamlit AppTest), streamlit
+#                       itself already imported as in the server process
+#     - pipeline_ready: importing the audit pipeline and creating the backend
+#                       client (what jobs.prewarm does in the background)
+#   Reports the median of --repeat runs; --importtime lists the slowest
+#   imports of the first page.
+#
+#   Usage: python benchmarks/cold_start.py --repeat 5 --output cold_start.json
+#          python benchmarks/cold_start.py --baseline cold_start.json   # exit 1 on regressions
+# =====================================
+
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+import argparse
+import json
+import statistics
+import subprocess
+
+APP_PATH = os.path.join(ROOT, "src", "app.py")
+# Modules imported by app.py at the top, besides streamlit
+APP_MODULES = ["config", "src.controls", "src.ingest", "src.jobs", "src.layout", "src.metrics", "src.reports", "src.utils"]
+
+MEASUREMENTS = {
+    "app_imports": """
+import importlib, time
+import streamlit
+start = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+seconds = time.perf_counter() - start
+""",
+    "first_page": """
+import time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=120).run()
+seconds = time.perf_counter() - start
+assert not at.exception, at.exception
+""",
+    "pipeline_ready": """
+import time
+start = time.perf_counter()
+import src.audit_pipeline, src.reports
+from src.backends import get_backend
+get_backend()
+seconds = time.perf_counter() - start
+""",
+}
+
+
+def _env(backend):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join([ROOT, os.path.join(ROOT, "src")]),
+        "LLM_BACKEND": backend,
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY") or "benchmark",
+        "PORTKEY_AZURE_API_KEY": env.get("PORTKEY_AZURE_API_KEY") or "benchmark",
+        "PORTKEY_BASE_URL": env.get("PORTKEY_BASE_URL") or "http://127.0.0.1:9/v1",
+        "GEMINI_STUDIO_API_KEY": env.get("GEMINI_STUDIO_API_KEY") or "benchmark",
+        # Only the startup path is measured; no background work in the child
+        "LLM_PREWARM": "false",
+    })
+    return env
+
+
+def measure(name, backend, importtime=False):
+    """
+    Seconds of one measurement in a fresh process (and the -X importtime report if asked).
+    """
+    code = MEASUREMENTS[name].format(modules=APP_MODULES, app=APP_PATH) + "\nprint('SECONDS', seconds)\n"
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    result = subprocess.run(command, cwd=ROOT, env=_env(backend), capture_output=True, text=True)
+    seconds = [line.split()[1] for line in result.stdout.splitlines() if line.startswith("SECONDS ")]
+    if result.returncode or not seconds:
+        raise RuntimeError(f"{name} failed:\n{result.stderr[-2000:]}")
+    return float(seconds[0]), result.stderr
+
+
+def slowest_imports(report, limit=15):
+    """
+    The top-level imports of a -X importtime report with the highest cumulative time.
+    """
+    imports = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        # Top-level imports have no indentation
+        if not module.startswith("  "):
+            imports.append((int(cumulative) / 1e6, module.strip()))
+    return sorted(imports, reverse=True)[:limit]
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Cold-start benchmark of the Streamlit app.")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per measurement (median reported).")
+    parser.add_argument("--backend", choices=("OPENAI", "INTERNAL", "GEMINI"), default="OPENAI")
+    parser.add_argument("--importtime", action="store_true", help="List the slowest imports of the first page.")
+    parser.add_argument("--output", help="Write the results as JSON (e.g. a baseline).")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run; exit 1 if a measurement regressed.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    results = {}
+    print(f"{'measurement':>15} {'median (s)':>11} {'min (s)':>8} {'max (s)':>8}")
+    for name in MEASUREMENTS:
+        runs = [measure(name, args.backend)[0] for _ in range(args.repeat)]
+        results[name] = {"median": round(statistics.median(runs), 4), "min": round(min(runs), 4),
+                         "max": round(max(runs), 4)}
+        print(f"{name:>15} {results[name]['median']:>11} {results[name]['min']:>8} {results[name]['max']:>8}")
+
+    if args.importtime:
+        _, report = measure("app_imports", args.backend, importtime=True)
+        print("\nSlowest first-page imports (cumulative seconds, streamlit included):")
+        for seconds, module in slowest_imports(report):
+            print(f"{seconds:>8.3f}  {module}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = [
+            f"{name}: {result['median']}s (was {baseline[name]['median']}s)"
+            for name, result in results.items()
+            if name in baseline and result["median"] > baseline[name]["median"] * (1 + args.tolerance)
+            and result["median"] - baseline[name]["median"] > 0.05
+        ]
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+# =====================================
+# File: detection_accuracy.py
+# Description:
+#   Scores the findings of an audit against the ground-truth labels of
+#   src/generate_test_recipes.py. A finding is a true positive when its
+#   record carries an injected deviation of the same type (record-level
+#   detection only asks for any finding on a labelled record). Reports
+#   precision/recall per severity and type, and recall per dollar when the
+#   audit's cost is known, to compare chunk sizes and models.
+#
+#   Usage: python src/generate_test_recipes.py --schema flat -n 5000 -o data/flat.json
+#          python src/batch_audit.py data/flat.json -f jsonl -o out/
+#          python benchmarks/detection_accuracy.py data/flat.labels.jsonl out/flat_findings.jsonl \
+#              --summary out/flat_summary.json
+# =====================================
+
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'src')]
+import argparse
+import json
+from collections import Counter
+
+from src.severity import SEVERITY_LEVELS, canonical_types, normalize_label
+
+
+def _read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _type_name(dev_type):
+    # Findings may spell types differently; compare on the canonical name
+    if not isinstance(dev_type, str):
+        return "Unknown"
+    return canonical_types.get(normalize_label(dev_type), dev_type.strip())
+
+
+def _rates(true_positives, false_positives, false_negatives):
+    precision = true_positives / (true_positives + false_positives) if true_positives + false_positives else None
+    recall = true_positives / (true_positives + false_negatives) if true_positives + false_negatives else None
+    f1 = 2 * precision * recall / (precision + recall) if precision and recall else None
+    return {
+        "true_positives": true_positives,
+        "false_positives": false_positives,
+        "false_negatives": false_negatives,
+        "precision": None if precision is None else round(precision, 4),
+        "recall": None if recall is None else round(recall, 4),
+        "f1": None if f1 is None else round(f1, 4),
+    }
+
+
+def score(labels, findings, records=None, cost=None):
+    """
+    Score findings ({record_id, type, severity, ...} rows) against labels.
+    Only labels of the first `records` records count when the audit was limited.
+    """
+    if records is not None:
+        labels = [label for label in labels if label["index"] < records]
+    expected = {(str(label["id"]), label["type"]) for label in labels}
+    severity_of = {label["type"]: label["severity"] for label in labels}
+    found = {(str(row["record_id"]), _type_name(row["type"])) for row in findings}
+    for row in findings:
+        severity_of.setdefault(_type_name(row["type"]), row.get("severity"))
+
+    result = {"labels": len(expected), "findings": len(found), "overall": _rates(
+        len(expected & found), len(found - expected), len(expected - found)
+    )}
+
+    labelled_records = {rec_id for rec_id, _ in expected}
+    flagged_records = {rec_id for rec_id, _ in found}
+    result["record_level"] = _rates(
+        len(labelled_records & flagged_records),
+        len(flagged_records - labelled_records),
+        len(labelled_records - flagged_records)
+    )
+
+    result["by_severity"] = {}
+    for severity in SEVERITY_LEVELS:
+        expected_part = {key for key in expected if severity_of.get(key[1]) == severity}
+        found_part = {key for key in found if severity_of.get(key[1]) == severity}
+        result["by_severity"][severity] = _rates(
+            len(expected_part & found_part), len(found_part - expected_part), len(expected_part - found_part)
+        )
+
+    hits = Counter(dev_type for _, dev_type in expected & found)
+    totals = Counter(dev_type for _, dev_type in expected)
+    result["recall_by_type"] = {dev_type: round(hits[dev_type] / total, 4) for dev_type, total in totals.most_common()}
+
+    if cost:
+        result["cost"] = cost
+        result["true_positives_per_dollar"] = round(result["overall"]["true_positives"] / cost, 2)
+    return result
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Score audit findings against generated ground-truth labels.")
+    parser.add_argument("labels", help="Label file written by generate_test_recipes.py.")
+    parser.add_argument("findings", help="Findings JSONL of the audit (batch_audit.py -f jsonl).")
+    parser.add_argument("--summary", help="Per-file summary JSON of batch_audit.py (records audited and cost).")
+    parser.add_argument("--records", type=int, help="Records audited, if the audit was limited.")
+    parser.add_argument("--cost", type=float, help="Cost of the audit in USD.")
+    parser.add_argument("--output", help="Write the scores as JSON.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    records, cost = args.records, args.cost
+    if args.summary:
+        with open(args.summary, encoding="utf-8") as f:
+            summary = json.load(f)
+        records = records if records is not None else summary.get("summary_stats", {}).get("total_records")
+        cost = cost if cost is not None else summary.get("estimated_cost")
+
+    result = score(_read_jsonl(args.labels), _read_jsonl(args.findings), records, cost)
+    print(f"{'':>13} {'TP':>7} {'FP':>7} {'FN':>7} {'precision':>10} {'recall':>8} {'F1':>8}")
+    rows = [("overall", result["overall"]), ("record level", result["record_level"])]
+    rows += list(result["by_severity"].items())
+    for name, rates in rows:
+        print(f"{name:>13} {rates['true_positives']:>7} {rates['false_positives']:>7} {rates['false_negatives']:>7} "
+              f"{rates['precision'] if rates['precision'] is not None else '-':>10} "
+              f"{rates['recall'] if rates['recall'] is not None else '-':>8} "
+              f"{rates['f1'] if rates['f1'] is not None else '-':>8}")
+    if "cost" in result:
+        print(f"Cost ${result['cost']:.4f}: {result['true_positives_per_dollar']} correct findings per dollar")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,440 @@
+# =====================================
+# File: mock_llm_server.py
+# Description:
+#   Local stand-in for the LLM APIs used by the audit, for offline benchmarks.
+#   Speaks the request shapes of the three backends:
+#     - OpenAI and Portkey: POST .../chat/completions (JSON or SSE stream)
+#     - Gemini (REST):      POST /v1beta/models/<model>:generateContent
+#                           and :streamGenerateContent (streamed JSON array)
+#   Answers with an audit result for the records found in the prompt, with
+#   configurable latency, time-to-first-token, streaming rate, injected
+#   errors / 429s, a requests-per-minute ceiling and truncated output.
+#   Emulates provider prompt caching and reports it in the usage of responses:
+#     - OpenAI: automatic caching of a repeated prefix (all messages but the
+#       last) of at least 1024 tokens, in steps of 128 tokens
+#     - Gemini: POST/PATCH /v1beta/cachedContents handles with a TTL, used
+#       by requests with "cachedContent"
+#
+#   Usage: python benchmarks/mock_llm_server.py --port 8765 --ttft 0.3 --tokens-per-second 2000
+#   then e.g. OPENAI_BASE_URL=http://127.0.0.1:8765/v1 or GEMINI_API_ENDPOINT=http://127.0.0.1:8765
+# =====================================
+
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'src')]
+import argparse
+import csv
+import io
+import json
+import random
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from src.severity import severity_mapping
+
+DEVIATION_TYPES = sorted(severity_mapping)
+# Characters per streamed token, and tokens per streamed chunk
+CHARS_PER_TOKEN = 4
+TOKENS_PER_CHUNK = 8
+# OpenAI caches prefixes of at least this many tokens, in steps of PREFIX_CACHE_STEP
+PREFIX_CACHE_MIN_TOKENS = 1024
+PREFIX_CACHE_STEP = 128
+
+
+def _prompt_record_ids(prompt):
+    # Record ids of the "Recipe data (...):" section (JSON array or CSV, see prompt_encoding)
+    marker = prompt.find("Recipe data (")
+    if marker < 0:
+        return []
+    data = prompt[prompt.find("):\n", marker) + 3:]
+    if data.startswith("["):
+        try:
+            return [rec.get("id", rec.get("recipe_id")) for rec in json.loads(data) if isinstance(rec, dict)]
+        except ValueError:
+            return []
+
+    dictionary = {}
+    if data.startswith("Dictionary:\n"):
+        entries, _, data = data[len("Dictionary:\n"):].partition("\nRecords:\n")
+        dictionary = dict(line.split("=", 1) for line in entries.splitlines() if "=" in line)
+    rows = list(csv.reader(io.StringIO(data)))
+    if not rows or rows[0][0] not in ("id", "recipe_id"):
+        return [f"row {index}" for index in range(1, len(rows))]
+    return [dictionary.get(row[0], row[0]) if row else None for row in rows[1:]]
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server answering audit prompts like an LLM API.
+    """
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.0, ttft=0.0, tokens_per_second=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, truncate_rate=0.0, deviation_rate=0.2,
+                 retry_after=1.0, rpm=0, seed=0):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.truncate_rate = truncate_rate
+        self.deviation_rate = deviation_rate
+        self.retry_after = retry_after
+        self.rpm = rpm
+        self._request_times = []
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # OpenAI prefixes seen (model, prefix) and Gemini cached contents by name
+        self.prefixes = set()
+        self.cached_contents = {}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections when they exit are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def roll(self):
+        with self._lock:
+            return self._random.random()
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def over_rpm(self):
+        """
+        Seconds until a request fits the requests-per-minute ceiling (sliding 60s window), or 0.
+        """
+        if not self.rpm:
+            return 0.0
+        now = time.time()
+        with self._lock:
+            self._request_times = [t for t in self._request_times if t > now - 60]
+            if len(self._request_times) >= self.rpm:
+                return self._request_times[0] + 60 - now
+            self._request_times.append(now)
+            return 0.0
+
+    def prefix_cached_tokens(self, model, prefix):
+        """
+        Tokens of an OpenAI prompt prefix served from the (emulated) prompt cache.
+        A prefix is cached by the first request sending it.
+        """
+        tokens = _tokens(prefix)
+        if tokens < PREFIX_CACHE_MIN_TOKENS:
+            return 0
+        with self._lock:
+            if (model, prefix) not in self.prefixes:
+                self.prefixes.add((model, prefix))
+                return 0
+        return tokens - tokens % PREFIX_CACHE_STEP
+
+    def cached_content(self, name):
+        """
+        The text of an unexpired Gemini cached content, or None.
+        """
+        with self._lock:
+            content = self.cached_contents.get(name)
+            if content is None or content["expires_at"] < time.time():
+                return None
+            return content["text"]
+
+    def audit_text(self, prompt):
+        """
+        Audit result for the records of a prompt, deterministic per record id.
+        """
+        records = []
+        for rec_id in _prompt_record_ids(prompt):
+            digest = zlib.crc32(str(rec_id).encode("utf-8"))
+            deviations = []
+            if digest % 1000 < self.deviation_rate * 1000:
+                dev_type = DEVIATION_TYPES[(digest // 1000) % len(DEVIATION_TYPES)]
+                deviations.append({
+                    "type": dev_type,
+                    "severity": severity_mapping[dev_type],
+                    "description": f"Record {rec_id} shows a '{dev_type}' deviation (mock finding).",
+                })
+            records.append({"id": rec_id, "deviations": deviations})
+        result = {"records": records, "data_quality_score": 7, "summary_text": "Mock audit summary."}
+        return "```json\n" + json.dumps(result, indent=1) + "\n```"
+
+    def start(self):
+        """
+        Serve in a daemon thread; returns the server.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True, name="mock-llm").start()
+        return self
+
+
+def _tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _gemini_text(body):
+    # Text of the system instruction and contents of a Gemini request
+    contents = [body.get("systemInstruction") or {}] + body.get("contents", [])
+    return "\n\n".join(part.get("text", "") for content in contents for part in content.get("parts", []))
+
+
+def _ttl_seconds(body):
+    # Gemini durations are strings like "3600s"
+    return float(str(body.get("ttl", "3600s")).rstrip("s"))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        return json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+    def _cached_content_response(self, name):
+        content = self.server.cached_contents[name]
+        expires = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(content["expires_at"]))
+        return {"name": name, "model": content["model"], "displayName": content["display_name"],
+                "expireTime": expires, "usageMetadata": {"totalTokenCount": _tokens(content["text"])}}
+
+    def do_PATCH(self):
+        # Gemini cached content TTL update
+        server = self.server
+        body = self._read_body()
+        name = urlparse(self.path).path.split("/v1beta/", 1)[-1]
+        if server.cached_content(name) is None:
+            self._send_json(404, {"error": {"message": f"{name} not found (mock)", "code": 404}})
+            return
+        with server._lock:
+            server.cached_contents[name]["expires_at"] = time.time() + _ttl_seconds(body)
+        server.count("cache_updates")
+        self._send_json(200, self._cached_content_response(name))
+
+    def do_POST(self):
+        server = self.server
+        body = self._read_body()
+        path = urlparse(self.path).path
+        prefix = ""
+        cached_tokens = 0
+        if path.endswith("/cachedContents"):
+            name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+            with server._lock:
+                server.cached_contents[name] = {
+                    "text": _gemini_text(body), "model": body.get("model", "mock"),
+                    "display_name": body.get("displayName", ""), "expires_at": time.time() + _ttl_seconds(body),
+                }
+            server.count("cache_creates")
+            self._send_json(200, self._cached_content_response(name))
+            return
+        if path.endswith("/chat/completions"):
+            api = "openai"
+            messages = [str(message.get("content", "")) for message in body.get("messages", [])]
+            prompt = "\n\n".join(messages)
+            stream = bool(body.get("stream"))
+            model = body.get("model", "mock")
+            max_tokens = body.get("max_tokens")
+            cached_tokens = server.prefix_cached_tokens(model, "\n\n".join(messages[:-1]))
+        elif ":generateContent" in path or ":streamGenerateContent" in path:
+            api = "gemini"
+            if body.get("cachedContent"):
+                prefix = server.cached_content(body["cachedContent"])
+                if prefix is None:
+                    self._send_json(404, {"error": {"message": "Cached content expired (mock)", "code": 404}})
+                    return
+                cached_tokens = _tokens(prefix)
+            prompt = "\n\n".join(text for text in (prefix, _gemini_text(body)) if text)
+            stream = ":streamGenerateContent" in path
+            model = path.rsplit("/", 1)[-1].split(":")[0]
+            max_tokens = body.get("generationConfig", {}).get("maxOutputTokens")
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {path}"}})
+            return
+        server.count(f"{api}_requests")
+
+        wait = server.over_rpm()
+        if wait:
+            server.count("rate_limited")
+            self._send_json(429, {"error": {"message": "Requests per minute exceeded (mock)", "code": 429}},
+                            {"Retry-After": f"{wait:.3f}"})
+            return
+
+        roll = server.roll()
+        if roll < server.rate_limit_rate:
+            server.count("rate_limited")
+            self._send_json(429, {"error": {"message": "Rate limit exceeded (mock)", "code": 429}},
+                            {"Retry-After": f"{server.retry_after:g}"})
+            return
+        if roll < server.rate_limit_rate + server.error_rate:
+            server.count("errors")
+            self._send_json(500, {"error": {"message": "Internal error (mock)", "code": 500}})
+            return
+
+        time.sleep(server.latency)
+        text = server.audit_text(prompt)
+        if server.roll() < server.truncate_rate:
+            server.count("truncated")
+            text = text[:len(text) // 2 + int(server.roll() * (len(text) - 1 - len(text) // 2))]
+        if max_tokens:
+            # Output beyond the requested completion cap is cut off, like the real APIs do
+            text = text[:max_tokens * CHARS_PER_TOKEN]
+        usage = {"input_tokens": _tokens(prompt), "cached_tokens": cached_tokens, "output_tokens": _tokens(text)}
+        server.count("input_tokens", usage["input_tokens"])
+        server.count("cached_tokens", cached_tokens)
+
+        if not stream:
+            self._send_json(
+                200, _openai_completion(text, model, usage) if api == "openai" else _gemini_response(text, usage)
+            )
+        elif api == "openai":
+            # The usage follows the last content chunk if the client asked for it
+            final = ""
+            if body.get("stream_options", {}).get("include_usage"):
+                final = f"data: {json.dumps(_openai_usage_chunk(model, usage))}\n\n"
+            self._stream(text, "text/event-stream", lambda piece: f"data: {json.dumps(_openai_chunk(piece, model))}\n\n",
+                         final + "data: [DONE]\n\n")
+        else:
+            # Gemini sends the usage with every chunk, the last one being the total
+            self._stream(text, "application/json", lambda piece: json.dumps(_gemini_response(piece, usage)), "]",
+                         prefix="[", separator=",")
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, text, content_type, render, suffix, prefix="", separator=""):
+        # Chunked transfer encoding, paced by the time to first token and the token rate
+        server = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(server.ttft)
+        step = CHARS_PER_TOKEN * TOKENS_PER_CHUNK
+        start = time.perf_counter()
+        for index, offset in enumerate(range(0, len(text), step)):
+            if server.tokens_per_second:
+                delay = start + index * TOKENS_PER_CHUNK / server.tokens_per_second - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self._write_chunk((prefix if index == 0 else separator) + render(text[offset:offset + step]))
+        self._write_chunk(suffix if text else prefix + suffix)
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def _openai_usage(usage):
+    return {
+        "prompt_tokens": usage["input_tokens"],
+        "completion_tokens": usage["output_tokens"],
+        "total_tokens": usage["input_tokens"] + usage["output_tokens"],
+        "prompt_tokens_details": {"cached_tokens": usage["cached_tokens"]},
+    }
+
+
+def _openai_completion(text, model, usage):
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": _openai_usage(usage),
+    }
+
+
+def _openai_usage_chunk(model, usage):
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [],
+        "usage": _openai_usage(usage),
+    }
+
+
+def _openai_chunk(piece, model):
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+    }
+
+
+def _gemini_response(text, usage):
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {
+            "promptTokenCount": usage["input_tokens"],
+            "cachedContentTokenCount": usage["cached_tokens"],
+            "candidatesTokenCount": usage["output_tokens"],
+            "totalTokenCount": usage["input_tokens"] + usage["output_tokens"],
+        },
+    }
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Local mock of the OpenAI/Portkey/Gemini APIs for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before a response starts.")
+    parser.add_argument("--ttft", type=float, default=0.0, help="Extra seconds to the first streamed token.")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Streaming rate (0 = unthrottled).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 500.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds of 429 responses.")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before 429s (0 = no ceiling).")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Share of responses cut off mid-way.")
+    parser.add_argument("--deviation-rate", type=float, default=0.2, help="Share of records with a finding.")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    server = MockLLMServer(
+        (args.host, args.port), latency=args.latency, ttft=args.ttft, tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, truncate_rate=args.truncate_rate,
+        deviation_rate=args.deviation_rate, retry_after=args.retry_after, rpm=args.rpm, seed=args.seed
+    )
+    print(f"Mock LLM server on {server.url} (OpenAI base URL {server.url}/v1)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Requests served: {dict(server.stats)}")
+
+
+if __name__ == "__main__":
+    main()
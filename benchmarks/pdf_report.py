@@ -0,0 +1,101 @@
+# =====================================
+# File: pdf_report.py
+# Description:
+#   Benchmark of PDF report generation time against the number of findings.
+#   Renders synthetic audit results of increasing size, in memory and
+#   written to a file, with the detailed findings capped (PDF_MAX_FINDINGS)
+#   and uncapped.
+#
+#   Usage: python benchmarks/pdf_report.py [--sizes 1000 10000 50000] [--repeat 3]
+# =====================================
+
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'src')]
+import argparse
+import random
+import tempfile
+import time
+
+import config
+from src.pdf_generator import generate_audit_report
+
+SEVERITIES = ("Critical", "Moderate", "Minor")
+DEVIATION_TYPES = ("Non-Standard Timestamp", "Missing Operator", "Out-of-Range Temperature", "Invalid Unit")
+
+
+def make_results(findings, seed=0):
+    """
+    Synthetic audit results with the given number of deviations (1-3 per record)
+    and matching summary statistics.
+    """
+    rng = random.Random(seed)
+    records = []
+    counts = {"critical": 0, "moderate": 0, "minor": 0}
+    multiple = 0
+    while sum(counts.values()) < findings:
+        deviations = []
+        for _ in range(min(rng.randint(1, 3), findings - sum(counts.values()))):
+            severity = rng.choice(SEVERITIES)
+            counts[severity.lower()] += 1
+            deviations.append({
+                "type": rng.choice(DEVIATION_TYPES),
+                "severity": severity,
+                "description": f"Field value {rng.randint(0, 10**6)} of record REC-{len(records)} does not match "
+                               f"the expected format; expected an ISO 8601 timestamp with timezone offset.",
+            })
+        multiple += len(deviations) > 1
+        records.append({"id": f"REC-{len(records)}", "deviations": deviations})
+
+    summary_stats = {
+        "data_quality_score": 5,
+        "total_entries_in_file": len(records),
+        "total_records": len(records),
+        "records_with_deviations": len(records),
+        "records_with_multiple_deviations": multiple,
+        "records_fully_compliant": 0,
+        "compliance_rate": 0.0,
+        **counts,
+        "critical_types": {DEVIATION_TYPES[0]: counts["critical"]},
+        "moderate_types": {DEVIATION_TYPES[1]: counts["moderate"]},
+    }
+    return {"summary_text": "Synthetic benchmark results.", "records": records}, summary_stats
+
+
+def _best_of(repeat, render):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = render()
+        timings.append(time.perf_counter() - start)
+    return min(timings), size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark PDF report generation.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000, 10000, 25000],
+                        help="Numbers of findings to render.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the fastest is reported.")
+    args = parser.parse_args(argv)
+
+    print(f"{'findings':>9} {'records':>8} {'capped (s)':>11} {'uncapped (s)':>13} {'to file (s)':>12} {'PDF size':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "report.pdf")
+        for findings in args.sizes:
+            results, stats = make_results(findings)
+            capped, _ = _best_of(args.repeat, lambda: len(generate_audit_report(results, "bench.json", stats)))
+            uncapped, size = _best_of(args.repeat, lambda: len(
+                generate_audit_report(results, "bench.json", stats, max_findings=0)
+            ))
+            to_file, _ = _best_of(args.repeat, lambda: os.path.getsize(
+                generate_audit_report(results, "bench.json", stats, output_path=path, max_findings=0)
+            ))
+            print(f"{findings:>9} {len(results['records']):>8} {capped:>11.3f} {uncapped:>13.3f} "
+                  f"{to_file:>12.3f} {size / 1024:>8.0f}kB")
+    print(f"capped = at most PDF_MAX_FINDINGS ({config.PDF_MAX_FINDINGS}) records listed in detail")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,8 @@
 # File: app.py
 # Description:
 #   Entry point for the Streamlit application.
-#   Loads configuration, initializes the audit runner,
-#   and manages user interactions.
+#   Loads configuration, confirms the estimated cost of an audit,
+#   submits it as a background job and shows its progress and results.
 # =====================================
 
 import os
@@ -11,14 +11,29 @@ import sys
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import logging
-import hashlib
+import time
 
 # logging.basicConfig(level=logging.INFO)
 
 import streamlit as st
-from src.controls import display_controls
-from src.audit_runner import run_audit
+import config
+from src.controls import display_controls, display_dataset_controls
+from src.datasets import content_hash, load_dataset
+from src.jobs import (
+    ACTIVE_STATES,
+    DONE,
+    FAILED,
+    QUEUED,
+    find_finished_job,
+    get_job,
+    load_report,
+    prewarm,
+    resume_jobs,
+    submit_job,
+)
 from src.layout import render_layout
+from src.metrics import start_server
+from src.reports import REPORT_FORMATS
 from src.utils import detect_file_type
 
 # Set Streamlit page config
@@ -28,101 +43,204 @@ st.set_page_config(
     page_icon="🧪",
 )
 
+# Serve the per-stage metrics locally if METRICS_PORT is set (once per process)
+start_server()
+
+# Check the backend credentials, then load the audit pipeline and backend client in the background
+# and resume audit jobs interrupted by a restart
+try:
+    config.validate()
+except RuntimeError as e:
+    st.error(f"❌ {e}")
+    st.stop()
+prewarm()
+resume_jobs()
+
 # Display app layout (header, file upload, etc.)
 render_layout()
 
 # Show controls and get user input
-uploaded_file, num_entries, model, system_prompt, user_prompt = display_controls()
+uploaded_file, model, system_prompt, user_prompt, use_cache, dataset_id = display_controls()
 
 # Initialize session state variables
-if "audit_done" not in st.session_state:
-    st.session_state.audit_done = False
-    st.session_state.audit_result = None
-if "audit_running" not in st.session_state:
-    st.session_state.audit_running = False
+# The audit itself runs as a background job; the page only keeps its ID
+# (also in the URL, so a refresh keeps polling the same job)
+if "job_id" not in st.session_state:
+    st.session_state.job_id = st.query_params.get("job")
 if "last_uploaded_file_hash" not in st.session_state:
     st.session_state.last_uploaded_file_hash = None
+if "upload_id" not in st.session_state:
+    st.session_state.upload_id = None
+    st.session_state.upload_hash = None
+
+
+def _clear_job():
+    st.session_state.job_id = None
+    st.query_params.pop("job", None)
+
+
+def _estimate(dataset, record_limit, model, system_prompt, user_prompt, use_cache, dataset_id):
+    # Extrapolated from the preview of the dataset summary, so the upload isn't read
+    # again; reruns reuse the estimate
+    key = (dataset["digest"], record_limit, model, system_prompt, user_prompt, use_cache, dataset_id)
+    if st.session_state.get("estimate_key") != key:
+        from collections import Counter
+
+        from src.audit_pipeline import estimate_audit
+        if use_cache and config.AUDIT_CACHE_ENABLED and find_finished_job(
+            dataset["digest"], dataset["file_type"], record_limit, model, system_prompt, user_prompt,
+            use_cache, dataset_id
+        ):
+            # An identical audit already ran; its chunk results come from the result cache
+            st.session_state.estimate = Counter()
+        else:
+            st.session_state.estimate = estimate_audit(dataset["preview"], record_limit, model, system_prompt,
+                                                       user_prompt, use_cache, dataset_id)
+        st.session_state.estimate_key = key
+    return st.session_state.estimate
+
 
 # 🟢 Clear results if a new file was selected or re-selected
+dataset = None
 if uploaded_file:
-    file_bytes = uploaded_file.read()
-    uploaded_file.seek(0)
-    file_hash = hashlib.md5(file_bytes).hexdigest()
+    # Hash and scan the upload only when it changes; reruns (e.g. slider changes) reuse the cached summary
+    file_type = detect_file_type(uploaded_file.name)
+    with st.spinner("Reading file..."):
+        if st.session_state.upload_id != uploaded_file.file_id:
+            st.session_state.upload_hash = content_hash(uploaded_file)
+            st.session_state.upload_id = uploaded_file.file_id
+        file_hash = st.session_state.upload_hash
+        # Scanned again only if it was evicted from the cache
+        dataset = load_dataset(uploaded_file, file_type, file_hash)
 
     if st.session_state.last_uploaded_file_hash != file_hash:
         # New file or re-upload detected
-        st.session_state.audit_done = False
-        st.session_state.audit_result = None
-        st.session_state.audit_running = False
+        if st.session_state.last_uploaded_file_hash is not None:
+            _clear_job()
         st.session_state.last_uploaded_file_hash = file_hash
 
 # Display Run Audit button if file is uploaded
-if uploaded_file:
-    if st.button("Run Audit"):
-        # 🟢 Clear previous results and set running flag
-        st.session_state.audit_done = False
-        st.session_state.audit_result = None
-        st.session_state.audit_running = True
+if dataset and dataset["error"]:
+    st.error(f"❌ {dataset['error']}")
+elif dataset:
+    num_entries = display_dataset_controls(dataset)
+    record_limit = min(num_entries, config.MAX_ENTRIES)
+
+    # Estimate cost and confirm before auditing the full file
+    confirmed = True
+    if record_limit >= min(dataset["count"], config.MAX_ENTRIES):
+        estimate = _estimate(dataset, record_limit, model, system_prompt, user_prompt, use_cache, dataset_id)
+        skipped = ""
+        if estimate["records"] < record_limit:
+            skipped = (f" for ~{estimate['records']:,} of {record_limit:,} records; the others are settled by the local "
+                       f"checks, deduplicated or reused from earlier audits")
+        confirmed = st.radio(
+            f"Estimated cost: ${estimate['estimated_cost']:.2f} USD (~{estimate['input_tokens']:,} input and ~{estimate['output_tokens']:,} output tokens{skipped}). Please use discretion when running large audits or testing at scale. Though no costs will be charged to you, the cost of this run will be covered from the personal funds of the developer: [GitHub](https://github.com/igorrazumny). Proceed?",
+            ["Yes", "No"],
+            index=1
+        ) == "Yes"
+
+    if st.button("Run Audit", disabled=not confirmed):
+        # 🟢 Clear previous results
+        _clear_job()
 
         try:
-            # Detect file type
-            file_type = detect_file_type(uploaded_file.name)
             logging.info(f"File type: {file_type}")
 
-            # Re-read bytes to get content
-            file_bytes = uploaded_file.read()
-            uploaded_file.seek(0)
-
-            if b'\x00' in file_bytes:
-                st.session_state.audit_running = False
-                st.error("❌ The uploaded file contains binary data or embedded null bytes. Please upload a clean UTF-8 text file.")
-                st.stop()
-
+            # Queue the audit; the job spools the upload and streams it in the background
             try:
-                content_str = file_bytes.decode("utf-8")
-            except UnicodeDecodeError as e:
-                st.session_state.audit_running = False
-                logging.error(f"Unicode decode error: {e}")
-                st.error("❌ The uploaded file is not valid UTF-8 text. Please re-save it as UTF-8 encoding and try again.")
-                st.stop()
-
-            # Run audit
-            result = run_audit(
-                content_str=content_str,
-                file_type=file_type,
-                entry_limit=num_entries,
-                model=model,
-                file_name=uploaded_file.name,
-                system_prompt=system_prompt,
-                user_prompt=user_prompt
-            )
-
-            # Save results
-            st.session_state.audit_result = result
-            st.session_state.audit_done = True
-            st.session_state.audit_running = False
+                job_id = submit_job(
+                    source=uploaded_file,
+                    file_name=uploaded_file.name,
+                    file_type=file_type,
+                    record_limit=record_limit,
+                    model=model,
+                    system_prompt=system_prompt,
+                    user_prompt=user_prompt,
+                    use_cache=use_cache,
+                    digest=file_hash,
+                    dataset_id=dataset_id
+                )
+            finally:
+                uploaded_file.seek(0)
+
+            st.session_state.job_id = job_id
+            st.query_params["job"] = job_id
 
         except Exception as e:
-            st.session_state.audit_running = False
             st.error(f"An error occurred while processing the file: {e}")
 
-# 🟢 Show spinner while running
-if st.session_state.audit_running:
-    st.info("🔄 Running audit with Gemini... Please wait...")
+job = get_job(st.session_state.job_id) if st.session_state.job_id else None
+if st.session_state.job_id and job is None:
+    _clear_job()
+    st.warning("The requested audit job no longer exists.")
+
+# 🟢 Poll the job while it is queued or running
+if job and job["status"] in ACTIVE_STATES:
+    if job["status"] == QUEUED:
+        st.info(f"🕒 Audit queued ({job['position']} job(s) ahead)... Please wait...")
+    else:
+        st.info("🔄 Running audit... Please wait...")
+        st.progress(job["progress"], text=job["message"])
+        live = job["live"]
+        if live.get("records"):
+            st.markdown(
+                f"**Findings so far:** {live['records']:,} records checked — "
+                f"{live.get('critical', 0)} critical, {live.get('moderate', 0)} moderate, {live.get('minor', 0)} minor"
+            )
+    time.sleep(config.JOB_POLL_SECONDS)
+    st.rerun()
+
+elif job and job["status"] == FAILED:
+    st.error(f"❌ The audit failed: {job['error']}")
 
 # 🟢 Show results when done
-elif st.session_state.audit_done and st.session_state.audit_result:
+elif job and job["status"] == DONE:
+    result = job["result"]
     st.success("✅ Audit complete!")
 
-    st.download_button(
-        label="📄 Download Audit Report (PDF)",
-        data=st.session_state.audit_result["pdf_content"],
-        file_name=st.session_state.audit_result["custom_filename"],
-        mime="application/pdf"
-    )
-
-    stats = st.session_state.audit_result["summary_stats"]
+    # Reports are rendered only when a download is requested (and memoised)
+    report_filenames = result.get("report_filenames")
+    if report_filenames:
+        labels = {
+            "pdf": "📄 Download Audit Report (PDF)",
+            "jsonl": "Findings (JSONL)",
+            "csv": "Findings (CSV)",
+            "parquet": "Findings (Parquet)",
+        }
+        for column, (fmt, (_, mime)) in zip(st.columns(len(REPORT_FORMATS)), REPORT_FORMATS.items()):
+            with column:
+                st.download_button(
+                    label=labels[fmt],
+                    data=lambda fmt=fmt: load_report(job["id"], fmt),
+                    file_name=report_filenames[fmt],
+                    mime=mime,
+                    on_click="ignore"
+                )
+    else:
+        st.warning("The reports of this audit are no longer available. Please run the audit again.")
+
+    stats = result["summary_stats"]
     st.write("**Compliance Rate:**", stats["compliance_rate"])
     st.write("**Critical Deviations:**", stats["critical"])
     st.write("**Moderate Deviations:**", stats["moderate"])
-    st.write("**Minor Deviations:**", stats["minor"])
\ No newline at end of file
+    st.write("**Minor Deviations:**", stats["minor"])
+
+    changes = result.get("changes")
+    if changes:
+        st.caption(
+            f"Since the last audit of this file ({changes['previous_audit']}): {changes['added']} added, "
+            f"{changes['changed']} changed, {changes['removed']} removed and {changes['unchanged']} unchanged records."
+        )
+
+    prompt_stats = result.get("prompt_stats")
+    if prompt_stats:
+        st.caption(
+            f"Prompt encoding '{prompt_stats['encoding']}' saved ~{prompt_stats['tokens_saved']:,} "
+            f"of {prompt_stats['legacy_data_tokens']:,} estimated data tokens."
+        )
+        if prompt_stats.get("cached_tokens"):
+            st.caption(
+                f"Provider prompt cache: {prompt_stats['cached_tokens']:,} of "
+                f"{prompt_stats['provider_input_tokens']:,} input tokens were cached."
+            )
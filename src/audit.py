@@ -7,108 +7,378 @@
 
 import json
 import logging
-import os
-from typing import Any
-
-from dotenv import load_dotenv
+import queue
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import config
-from src.utils import extract_json_from_text
+from src.backends import get_backend
+from src.cache import cache_stats, get_cached_result, make_cache_key, store_result
+from src.checkpoints import get_checkpoint, save_checkpoint
+from src.chunking import (
+    effective_model,
+    estimate_output_tokens,
+    merge_chunk_results,
+    split_into_chunks,
+)
+from src.metrics import observe, span
+from src.prompt_encoding import encode_records
+from src.rate_limit import get_limiter, is_rate_limited
+from src.stream_parser import RecordStreamParser, salvage_response
+from src.tokens import count_tokens
+from src.utils import estimate_cost, extract_json_from_text
+
+# How often streamed records are handed to record_callback while chunks run
+STREAM_POLL_SECONDS = 0.25
 
-# Load environment variables
-load_dotenv()
+# Guards the provider token counts that chunk threads add up
+_usage_lock = threading.Lock()
 
 
-def analyze_recipe(recipe_entries, model="gpt-4o", system_prompt="", user_prompt=""):
+def plan_audit(recipe_entries, model="gpt-4o", system_prompt="", user_prompt=""):
     """
-    Analyze recipe entries using the selected backend (OpenAI, Gemini or Internal).
+    Split recipe entries into encoded, token-budgeted chunks and estimate
+    the input tokens, output tokens and cost of auditing them.
     """
     max_entries = config.MAX_ENTRIES
 
     # Truncate recipe entries if exceeding the limit
     if len(recipe_entries) > max_entries:
         truncated = recipe_entries[:max_entries]
-        logging.warning(f"Truncated to first {max_entries} entries to stay within context limits.")
+        logging.warning(f"Truncated to first {max_entries} entries (MAX_ENTRIES).")
     else:
         truncated = recipe_entries
 
-    full_prompt = (
-        f"{user_prompt}\n\n"
-        "Recipe data:\n"
-        f"{json.dumps(truncated, indent=2, sort_keys=True)}"
+    llm_model = effective_model(config.LLM_BACKEND, model)
+    with span("serialize", records=len(truncated), model=llm_model) as fields:
+        fixed_prompt_tokens = count_tokens(f"{system_prompt}\n\n{user_prompt}\n\nRecipe data:\n", llm_model)
+        chunks = split_into_chunks(truncated, config.LLM_BACKEND, model, fixed_prompt_tokens)
+        encoded_chunks = [encode_records(chunk["records"], model=llm_model) for chunk in chunks]
+        data_tokens = sum(encoded["tokens"] for encoded in encoded_chunks)
+        fields.update(
+            chunks=len(chunks),
+            input_tokens=data_tokens,
+            bytes=sum(len(encoded["text"].encode("utf-8")) for encoded in encoded_chunks),
+        )
+
+    legacy_data_tokens = sum(encoded["legacy_tokens"] for encoded in encoded_chunks)
+    input_tokens = data_tokens + fixed_prompt_tokens * len(chunks)
+    output_tokens = sum(
+        estimate_output_tokens(len(chunk["records"]), config.LLM_BACKEND, model) for chunk in chunks
     )
 
-    # Determine backend and make the appropriate API call
-    if config.LLM_BACKEND == "OPENAI":
-        from openai import OpenAI
-        client = OpenAI(api_key=config.OPENAI_API_KEY)
-        messages: list[dict[str, Any]] = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": full_prompt},
-        ]
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0,
-            top_p=1,
+    return {
+        "chunks": chunks,
+        "encoded_chunks": encoded_chunks,
+        "model": llm_model,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "estimated_cost": estimate_cost(input_tokens, output_tokens, llm_model),
+        "prompt_stats": {
+            "encoding": encoded_chunks[0]["mode"] if encoded_chunks else config.PROMPT_ENCODING,
+            "data_tokens": data_tokens,
+            "legacy_data_tokens": legacy_data_tokens,
+            "tokens_saved": legacy_data_tokens - data_tokens,
+            # Input tokens reported by the provider and the share served from its prompt cache
+            "provider_input_tokens": 0,
+            "cached_tokens": 0,
+        },
+    }
+
+
+def analyze_recipe(recipe_entries, model="gpt-4o", system_prompt="", user_prompt="", progress_callback=None,
+                   use_cache=True, plan=None, record_callback=None, checkpoint_key=None):
+    """
+    Analyze recipe entries using the selected backend (OpenAI, Gemini or Internal).
+    Entries are split into token-budgeted chunks, the chunks are audited concurrently
+    (up to AUDIT_CONCURRENCY at a time) and the results are merged in record order.
+    progress_callback(completed_chunks, total_chunks) is called from the calling thread.
+    record_callback(records) is also called from the calling thread with lists of
+    per-record results as they stream in, before their chunk has finished.
+    Chunk results are served from the persistent result cache unless use_cache is False.
+    plan is the result of plan_audit for the same arguments; it is computed if not given.
+    With a checkpoint_key (see checkpoints.make_run_key), completed chunks are
+    checkpointed and chunks checkpointed by an earlier failed run are restored.
+    """
+    if plan is None:
+        plan = plan_audit(recipe_entries, model, system_prompt, user_prompt)
+    chunks = plan["chunks"]
+    encoded_chunks = plan["encoded_chunks"]
+    logging.info(f"Auditing {sum(len(chunk['records']) for chunk in chunks)} entries in {len(chunks)} chunk(s).")
+    logging.info(f"Prompt encoding stats: {plan['prompt_stats']}")
+
+    chunk_results = [None] * len(chunks)
+    if progress_callback:
+        progress_callback(0, len(chunks))
+
+    # Token counts reported by the provider for the chunks sent
+    usage_totals = Counter()
+
+    # Worker threads queue streamed records; callbacks run in this thread
+    record_queue = queue.SimpleQueue() if record_callback else None
+    on_record = record_queue.put if record_queue else None
+
+    def drain_records():
+        if record_queue is None:
+            return
+        streamed = []
+        while not record_queue.empty():
+            streamed.append(record_queue.get())
+        if streamed:
+            record_callback(streamed)
+
+    max_workers = max(1, min(config.AUDIT_CONCURRENCY, len(chunks)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                analyze_chunk, chunk["records"], model, system_prompt, user_prompt, use_cache, encoded, on_record,
+                checkpoint_key, usage_totals=usage_totals
+            ): index
+            for index, (chunk, encoded) in enumerate(zip(chunks, encoded_chunks))
+        }
+        try:
+            pending = set(futures)
+            completed = 0
+            while pending:
+                done, pending = wait(pending, timeout=STREAM_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                drain_records()
+                for future in done:
+                    chunk_results[futures[future]] = future.result()
+                    completed += 1
+                    if progress_callback:
+                        progress_callback(completed, len(chunks))
+        except Exception:
+            # Don't start chunks that are still queued once one has failed
+            for future in futures:
+                future.cancel()
+            raise
+
+    logging.info(f"Audit cache stats: {cache_stats()}")
+    if usage_totals["input_tokens"]:
+        logging.info(
+            f"Prompt cache: {usage_totals['cached_tokens']} of {usage_totals['input_tokens']} input tokens cached"
         )
-        content = response.choices[0].message.content.strip()
-
-    elif config.LLM_BACKEND == "INTERNAL":
-        from portkey_ai import Portkey
-        portkey = Portkey(
-            api_key=os.getenv("PORTKEY_AZURE_API_KEY"),
-            base_url=os.getenv("PORTKEY_BASE_URL"),
-            debug=True,
-            provider="azure-openai"
+    merged = merge_chunk_results(chunks, chunk_results)
+    merged["prompt_stats"] = dict(
+        plan["prompt_stats"],
+        provider_input_tokens=usage_totals["input_tokens"],
+        cached_tokens=usage_totals["cached_tokens"],
+    )
+    return merged
+
+
+def analyze_chunk(chunk_entries, model="gpt-4o", system_prompt="", user_prompt="", use_cache=True, encoded=None,
+                  on_record=None, checkpoint_key=None, followups=None, usage_totals=None):
+    """
+    Audit a single chunk of recipe entries with one call to the selected backend.
+    encoded is the chunk serialised by encode_records; it is computed if not given.
+    If on_record is given, the response is streamed and on_record is called with
+    each per-record result as soon as it is complete.
+    Failed calls are retried up to CHUNK_MAX_ATTEMPTS times with exponential backoff and jitter.
+    Calls wait for the backend's rate limiter (see rate_limit.py); rate-limited (429) calls are
+    retried after the provider's Retry-After, up to RATE_LIMIT_MAX_RETRIES times.
+    Complete records are salvaged from truncated or malformed responses and only the
+    missing ones are re-requested, in up to followups (SALVAGE_MAX_FOLLOWUPS) smaller calls.
+    The system and user prompts are sent as a stable prefix ahead of the chunk's data (see
+    backends.py); the provider's token counts, including cached tokens, are added to usage_totals.
+    """
+    if followups is None:
+        followups = config.SALVAGE_MAX_FOLLOWUPS
+    if encoded is None:
+        encoded = encode_records(chunk_entries, model=effective_model(config.LLM_BACKEND, model))
+
+    use_cache = use_cache and config.AUDIT_CACHE_ENABLED
+    chunk_key = None
+    if use_cache or checkpoint_key:
+        chunk_key = make_cache_key(
+            config.LLM_BACKEND,
+            effective_model(config.LLM_BACKEND, model),
+            system_prompt,
+            user_prompt,
+            {"encoding": encoded["mode"], "dictionary": encoded["dictionary"], "records": chunk_entries},
         )
-        messages: list[dict[str, Any]] = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": full_prompt},
-        ]
-        try:
-            response = portkey.chat.completions.create(
-                messages=messages,
-                model="gpt-35-turbo",
-                max_tokens=500,
-                temperature=0.7,
-                stream=True
-            )
-            full_content = ""
-            for chunk in response:
-                if chunk.choices and hasattr(chunk.choices[0].delta, "content") and chunk.choices[0].delta.content:
-                    content_chunk = chunk.choices[0].delta.content
-                    full_content += content_chunk
-                    print(content_chunk, end="", flush=True)
-            content = full_content
-        except Exception as e:
-            logging.error(f"Portkey API call failed: {str(e)}")
-            raise ValueError("Portkey API call failed; check logs for details.")
 
-    elif config.LLM_BACKEND == "GEMINI":  # <-- ADD THIS ENTIRE BLOCK
-        import google.generativeai as genai
-        genai.configure(api_key=config.GEMINI_API_KEY)
+    stored = None
+    if checkpoint_key:
+        stored = get_checkpoint(checkpoint_key, chunk_key)
+    if stored is None and use_cache:
+        stored = get_cached_result(chunk_key)
+    if stored is not None:
+        if on_record:
+            for record in stored.get("records", []):
+                on_record(record)
+        if checkpoint_key:
+            save_checkpoint(checkpoint_key, chunk_key, stored)
+        return stored
 
-        # Gemini uses a different prompt structure (no system prompt)
-        # We combine the system and user prompts into a single prompt.
-        combined_prompt = f"{system_prompt}\n\n{full_prompt}"
+    # Only the data differs between chunks; the prompts stay a cacheable prefix
+    data_prompt = (
+        f"Recipe data ({encoded['description']}):\n"
+        f"{encoded['text']}"
+    )
+    llm_model = effective_model(config.LLM_BACKEND, model)
+    input_tokens = encoded["tokens"] + count_tokens(f"{system_prompt}\n\n{user_prompt}", llm_model)
+    reserved_tokens = input_tokens + estimate_output_tokens(len(chunk_entries), config.LLM_BACKEND, model)
 
-        gemini_model = genai.GenerativeModel('gemini-1.5-pro')
-        response = gemini_model.generate_content(combined_prompt)
-        content = response.text.strip()
+    # Records already streamed by a failed attempt are not reported again
+    emitted = 0
+    salvaged = False
 
-    else:
-        raise ValueError(f"Unsupported LLM backend: {config.LLM_BACKEND}")
+    def request_chunk():
+        nonlocal emitted, salvaged
+        seen = 0
+
+        def forward(record):
+            nonlocal seen, emitted
+            seen += 1
+            if seen > emitted:
+                emitted = seen
+                on_record(record)
+
+        # Send the prompt through the pooled client of the selected backend
+        parser = None
+        usage = {}
+        # Wait for the backend's rate limits and a slot of its concurrency window
+        with get_limiter().slot(reserved_tokens) as permit:
+            observe("llm_wait", permit["waited"], model=llm_model)
+            with span("llm", model=llm_model, records=len(chunk_entries), input_tokens=input_tokens) as fields:
+                if on_record:
+                    parser = RecordStreamParser(forward)
+                    started = time.perf_counter()
+                    first_text = True
+
+                    def on_text(text):
+                        nonlocal first_text
+                        if first_text:
+                            first_text = False
+                            observe("llm_ttft", time.perf_counter() - started, model=llm_model)
+                        parser.feed(text)
+
+                    content = get_backend().complete(
+                        system_prompt, user_prompt, data_prompt, model, on_text=on_text, usage=usage
+                    )
+                else:
+                    content = get_backend().complete(system_prompt, user_prompt, data_prompt, model, usage=usage)
+                fields["bytes"] = len(content.encode("utf-8"))
+                fields["output_tokens"] = usage.get("output_tokens") or count_tokens(content, llm_model)
+                if usage.get("input_tokens"):
+                    fields["input_tokens"] = usage["input_tokens"]
+                    fields["cached_tokens"] = usage.get("cached_tokens") or 0
+                    if usage_totals is not None:
+                        with _usage_lock:
+                            usage_totals.update(usage)
+            permit["tokens"] = fields["input_tokens"] + fields["output_tokens"]
 
-    # ✅ Clean Markdown fences or extra text
-    clean_content = extract_json_from_text(content)
+        with span("response_parse", bytes=fields["bytes"]) as parse_fields:
+            # ✅ Clean Markdown fences or extra text
+            clean_content = extract_json_from_text(content)
 
-    # Parse response content
-    try:
-        parsed = json.loads(clean_content)
+            # Parse response content
+            try:
+                parsed = json.loads(clean_content)
+                salvaged = False
+            except json.JSONDecodeError:
+                parsed = salvage_response(content)
+                if not parsed["records"]:
+                    logging.error(f"Failed to parse JSON output. Raw content:\n{content}")
+                    raise ValueError("Failed to parse JSON output from the selected backend.")
+                logging.warning(
+                    f"Malformed JSON output; salvaged {len(parsed['records'])} of {len(chunk_entries)} record(s)."
+                )
+                salvaged = True
+            parse_fields["records"] = len(parsed.get("records") or [])
+            parse_fields["salvaged"] = salvaged
         if "summary_text" not in parsed:
             parsed["summary_text"] = ""
+        if parser:
+            # Records the stream parser could not pick up are reported now
+            for record in parsed.get("records", [])[len(parser.records):]:
+                forward(record)
+        return parsed
+
+    attempt = 0
+    rate_limited = 0
+    while True:
+        try:
+            parsed = request_chunk()
+            break
+        except Exception as e:
+            if config.RATE_LIMIT_ENABLED and is_rate_limited(e) and rate_limited < config.RATE_LIMIT_MAX_RETRIES:
+                # The limiter pauses calls for the Retry-After; 429s don't use up attempts
+                rate_limited += 1
+                logging.warning(f"Chunk rate limited ({rate_limited}/{config.RATE_LIMIT_MAX_RETRIES}); retrying")
+                continue
+            attempt += 1
+            if attempt >= config.CHUNK_MAX_ATTEMPTS:
+                logging.error(f"Chunk failed after {attempt} attempt(s): {e}")
+                raise
+            # Full jitter: sleep a random time up to the exponential backoff
+            backoff = min(config.CHUNK_RETRY_MAX_SECONDS, config.CHUNK_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+            delay = random.uniform(0, backoff)
+            logging.warning(f"Chunk attempt {attempt} failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    if salvaged:
+        parsed = _complete_salvaged(
+            parsed, chunk_entries, model, system_prompt, user_prompt, use_cache, on_record, followups, usage_totals
+        )
+
+    if use_cache:
+        store_result(chunk_key, parsed)
+    if checkpoint_key:
+        save_checkpoint(checkpoint_key, chunk_key, parsed)
+    return parsed
+
+
+def _entry_id(entry):
+    if isinstance(entry, dict):
+        return entry.get("id", entry.get("recipe_id"))
+    return None
+
+
+def _complete_salvaged(parsed, chunk_entries, model, system_prompt, user_prompt, use_cache, on_record, followups,
+                       usage_totals=None):
+    """
+    Re-request the entries whose results are missing from a salvaged response
+    and merge them with the salvaged records, in chunk order.
+    """
+    records = parsed["records"]
+    entry_ids = [_entry_id(entry) for entry in chunk_entries]
+    if all(entry_id is not None for entry_id in entry_ids):
+        returned = {str(rec.get("id")) for rec in records if isinstance(rec, dict)}
+        missing = [entry for entry, entry_id in zip(chunk_entries, entry_ids) if str(entry_id) not in returned]
+    else:
+        # Without ids, records are assumed to come back in order
+        missing = chunk_entries[len(records):]
+    if not missing:
         return parsed
-    except json.JSONDecodeError:
-        logging.error(f"Failed to parse JSON output. Raw content:\n{content}")
-        raise ValueError("Failed to parse JSON output from the selected backend.")
\ No newline at end of file
+    if followups <= 0:
+        raise ValueError(f"{len(missing)} record(s) are missing from the output of the selected backend.")
+
+    logging.info(f"Re-requesting {len(missing)} record(s) missing from a malformed response.")
+    followup = analyze_chunk(
+        missing, model, system_prompt, user_prompt, use_cache, on_record=on_record, followups=followups - 1,
+        usage_totals=usage_totals
+    )
+    followup_records = followup.get("records", [])
+
+    merged = {
+        "summary_text": parsed.get("summary_text") or followup.get("summary_text", ""),
+        "records": records + followup_records,
+    }
+    scores = [
+        (result["data_quality_score"], len(result_records))
+        for result, result_records in ((parsed, records), (followup, followup_records))
+        if isinstance(result.get("data_quality_score"), (int, float)) and result_records
+    ]
+    if scores:
+        merged["data_quality_score"] = round(
+            sum(score * count for score, count in scores) / sum(count for _, count in scores)
+        )
+    if all(entry_id is not None for entry_id in entry_ids):
+        order = {str(entry_id): position for position, entry_id in enumerate(entry_ids)}
+        merged["records"].sort(key=lambda rec: order.get(str(rec.get("id")), len(order)))
+    return merged
@@ -0,0 +1,540 @@
+# =====================================
+# File: audit_pipeline.py
+# Description:
+#   UI-independent audit pipeline shared by the Streamlit app
+#   and the batch CLI: streaming ingestion, pre-screening,
+#   chunked LLM analysis, severity re-mapping and summary stats.
+# =====================================
+
+import logging
+import time
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytz
+
+import config
+from src.audit import analyze_recipe, plan_audit
+from src.checkpoints import clear_checkpoints, count_checkpoints, make_run_key
+from src.dedup import expand_results, group_records
+from src.deviation_store import (
+    build_store,
+    findings_summary,
+    record_deviation_counts,
+    remap_severities,
+    severity_counts,
+    top_types,
+    write_severities,
+)
+from src.ingest import iter_record_batches
+from src.metrics import observe, span
+from src.record_history import (
+    finish_run,
+    load_previous,
+    make_lineage_key,
+    previous_run,
+    record_fingerprint,
+    save_records,
+)
+from src.rules import applies_to, combine_results, screen_records, select_for_llm
+from src.severity import SEVERITY_LEVELS, UNKNOWN_SEVERITY, severity_code
+
+
+def _screen_batch(batch, seen_ids, start=0):
+    """
+    Run the local rule engine on a batch of flat records starting at record index start
+    of the file (records without an id are labelled by their row in the file).
+    Returns (findings, llm_indices, record_ids), or None if the rules don't apply.
+    """
+    if not (config.RULES_ENABLED and batch and isinstance(batch[0], dict)):
+        return None
+    frame = pd.DataFrame.from_records(batch)
+    if not applies_to(frame):
+        return None
+    findings = screen_records(frame, seen_ids)
+    llm_indices = select_for_llm(findings)
+    record_ids = [
+        f"row {start + index + 1}" if pd.isna(rec_id) else rec_id
+        for index, rec_id in enumerate(frame["id"].tolist())
+    ]
+    return findings, llm_indices, record_ids
+
+
+def _iter_limited_batches(source, file_type, record_limit, counts):
+    """
+    Yield (start index, batch) for the first record_limit records of the source.
+    The rest of the file is still read so counts["total_entries"] covers the whole file.
+    """
+    audited = 0
+    batches = iter_record_batches(source, file_type, config.INGEST_BATCH_SIZE)
+    while True:
+        start = time.perf_counter()
+        position = _tell(source)
+        batch = next(batches, None)
+        if batch is None:
+            break
+        fields = {"records": len(batch)}
+        if position is not None:
+            fields["bytes"] = _tell(source) - position
+        observe("parse", time.perf_counter() - start, **fields)
+
+        counts["total_entries"] += len(batch)
+        batch = batch[:record_limit - audited]
+        if batch:
+            yield audited, batch
+            audited += len(batch)
+
+
+def _tell(source):
+    # Read position of a binary source (bytes consumed by parsing), if it has one
+    try:
+        return source.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def estimate_audit(sample, record_count, model, system_prompt, user_prompt, use_cache=True, dataset_id=None):
+    """
+    Estimate tokens and cost of auditing record_count records from a sample of the
+    first ones (e.g. the preview of a dataset summary), without reading the file.
+    Records the audit won't send are left out as they are in the sample: those
+    settled by the local rules, near-duplicates and, with INCREMENTAL_AUDIT, a
+    dataset_id and use_cache, records unchanged since the last audit.
+    Returns a Counter of input_tokens, output_tokens, estimated_cost and the
+    records expected to be sent to the LLM.
+    """
+    estimate = Counter()
+    sample = sample[:record_count]
+    if not sample:
+        return estimate
+
+    screening = _screen_batch(sample, set())
+    llm_positions = range(len(sample)) if screening is None else set(screening[1])
+    to_send = [record for position, record in enumerate(sample) if position in llm_positions]
+    if config.INCREMENTAL_AUDIT and dataset_id and use_cache and to_send:
+        history = _start_history(dataset_id, dataset_id, model, system_prompt, user_prompt, use_cache)
+        to_send, _, _ = _split_unchanged(history, sample, llm_positions)
+    if config.DEDUP_ENABLED and to_send:
+        to_send, _ = group_records(to_send)
+    if not to_send:
+        return estimate
+
+    # Every batch of the file is assumed to look like the sample
+    share = len(to_send) / len(sample)
+    full_batches, rest = divmod(record_count, config.INGEST_BATCH_SIZE)
+    for batches, size in ((full_batches, config.INGEST_BATCH_SIZE), (1, rest)):
+        count = round(size * share)
+        if not (batches and count):
+            continue
+        records = [to_send[index % len(to_send)] for index in range(count)]
+        plan = plan_audit(records, model, system_prompt, user_prompt)
+        estimate["input_tokens"] += batches * plan["input_tokens"]
+        estimate["output_tokens"] += batches * plan["output_tokens"]
+        estimate["estimated_cost"] += batches * plan["estimated_cost"]
+        estimate["records"] += batches * count
+    return estimate
+
+
+def _start_history(dataset_id, file_name, model, system_prompt, user_prompt, use_cache):
+    """
+    State of an incremental audit against the last audit of the same dataset lineage.
+    """
+    lineage = make_lineage_key(dataset_id, model, system_prompt, user_prompt)
+    previous = previous_run(lineage)
+    return {
+        "lineage": lineage,
+        "file_name": file_name,
+        "previous": previous,
+        # Unchanged records reuse their previous result only if cached results may be reused
+        "reuse": use_cache,
+        "occurrences": Counter(),
+        "seen_keys": set(),
+        "rows": [],
+        "added": [],
+        "changed": [],
+        "unchanged": 0,
+    }
+
+
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp, pytz.timezone("Europe/Zurich")).strftime("%Y-%m-%d %H:%M:%S %Z")
+
+
+def _split_unchanged(history, batch, llm_positions):
+    """
+    Fingerprint a batch against the last audit and split the records bound for
+    the LLM (at llm_positions) into those that must be sent (added, changed or
+    without id) and the previous results of unchanged ones.
+    Returns (to_send, reused, sent_keys) where sent_keys maps record ids to
+    (record_key, fingerprint) for storing the new results.
+    """
+    keyed = []
+    for record in batch:
+        rec_id = record.get("id", record.get("recipe_id")) if isinstance(record, dict) else None
+        if rec_id is None or (isinstance(rec_id, float) and rec_id != rec_id):
+            keyed.append((record, None, None, None))
+            continue
+        # Repeated ids are told apart by their occurrence
+        history["occurrences"][str(rec_id)] += 1
+        occurrence = history["occurrences"][str(rec_id)]
+        record_key = str(rec_id) if occurrence == 1 else f"{rec_id}#{occurrence}"
+        history["seen_keys"].add(record_key)
+        keyed.append((record, rec_id, record_key, record_fingerprint(record)))
+
+    previous = load_previous(history["lineage"], [key for _, _, key, _ in keyed if key is not None])
+    to_send = []
+    reused = []
+    sent_keys = {}
+    for position, (record, rec_id, record_key, fingerprint) in enumerate(keyed):
+        for_llm = position in llm_positions
+        if record_key is None:
+            if for_llm:
+                to_send.append(record)
+            continue
+
+        stored = previous.get(record_key)
+        if stored is None:
+            history["added"].append(record_key)
+        elif stored[0] != fingerprint:
+            history["changed"].append(record_key)
+        else:
+            history["unchanged"] += 1
+
+        if not for_llm:
+            # Settled by the local rules; only the fingerprint is kept
+            history["rows"].append((record_key, fingerprint, None))
+        elif history["reuse"] and stored and stored[0] == fingerprint and stored[1] is not None:
+            reused.append({**stored[1], "id": rec_id})
+        else:
+            to_send.append(record)
+            sent_keys.setdefault(str(rec_id), (record_key, fingerprint))
+    return to_send, reused, sent_keys
+
+
+def _finish_history(history, result_json, complete):
+    """
+    Store the new record results and return the changes since the last audit
+    (None for the first audit of a lineage).
+    """
+    save_records(history["lineage"], history["rows"])
+    removed = finish_run(
+        history["lineage"], history["file_name"], history["seen_keys"],
+        result_json.get("data_quality_score"), result_json.get("summary_text"), complete
+    )
+    previous = history["previous"]
+    if previous is None:
+        return None
+    return {
+        "previous_audit": _format_time(previous["audited_at"]),
+        "added": history["added"],
+        "changed": history["changed"],
+        "removed": removed,
+        "unchanged": history["unchanged"],
+        "complete": complete,
+    }
+
+
+def summarize_changes(changes):
+    """
+    Counts of added, changed, removed and unchanged records since the last audit, or None.
+    """
+    if not changes:
+        return None
+    return {
+        "previous_audit": changes["previous_audit"],
+        "added": len(changes["added"]),
+        "changed": len(changes["changed"]),
+        "removed": len(changes["removed"]),
+        "unchanged": changes["unchanged"],
+    }
+
+
+def tally_findings(live, records):
+    """
+    Add streamed per-record results to the running severity counters.
+    """
+    for rec in records:
+        live["records"] += 1
+        for dev in rec.get("deviations") or []:
+            code = severity_code(dev.get("type"), dev.get("severity"))
+            if code < UNKNOWN_SEVERITY:
+                live[SEVERITY_LEVELS[code].lower()] += 1
+
+
+def _merge_batch_results(batch_results):
+    """
+    Merge per-batch results (records, data_quality_score, summary_text) in file order.
+    The summary of several batches is built from the merged findings.
+    """
+    records = []
+    weighted_score = 0.0
+    scored_records = 0
+    for size, result in batch_results:
+        records.extend(result.get("records", []))
+        score = result.get("data_quality_score")
+        if isinstance(score, (int, float)):
+            weighted_score += score * size
+            scored_records += size
+
+    if len(batch_results) > 1:
+        summary_text = findings_summary(records)
+    else:
+        summary_text = "".join((result.get("summary_text") or "").strip() for _, result in batch_results)
+    merged = {"summary_text": summary_text, "records": records}
+    if scored_records:
+        merged["data_quality_score"] = round(weighted_score / scored_records)
+    return merged
+
+
+def audit_source(source, file_type, record_limit, model, system_prompt, user_prompt, use_cache=True,
+                 progress_callback=None, record_callback=None, file_name=None, dataset_id=None):
+    """
+    Audit the first record_limit records of a JSON or CSV source
+    (binary file-like object, text stream or string).
+    Records are streamed in batches of INGEST_BATCH_SIZE through pre-screening
+    and the chunked LLM audit, so memory stays flat regardless of file size.
+
+    progress_callback(start, size, completed_chunks, total_chunks) reports the
+    progress of the batch starting at record index start.
+    record_callback(records) receives per-record results as soon as they are known.
+
+    With CHECKPOINT_ENABLED, completed chunks are checkpointed under the hash of
+    the file and settings; rerunning a failed audit only sends the remaining chunks.
+
+    With INCREMENTAL_AUDIT and a dataset_id (the dataset the file is a version of),
+    records are fingerprinted by id and content; unchanged records of a new version
+    reuse their previous results (if use_cache) and result_json["changes"] lists
+    what changed.
+
+    Returns (result_json, counts, prompt_stats, estimated_cost).
+    """
+    run_key = None
+    if config.CHECKPOINT_ENABLED:
+        run_key = make_run_key(source, _run_settings(record_limit, model, system_prompt, user_prompt))
+        restored = count_checkpoints(run_key)
+        if restored:
+            logging.info(f"Resuming audit: {restored} chunk(s) restored from checkpoints")
+
+    history = None
+    if config.INCREMENTAL_AUDIT and dataset_id:
+        history = _start_history(dataset_id, file_name or dataset_id, model, system_prompt, user_prompt, use_cache)
+        if history["previous"]:
+            logging.info(
+                f"Incremental audit of {dataset_id} against its audit from "
+                f"{_format_time(history['previous']['audited_at'])}"
+            )
+
+    try:
+        result_json, counts, prompt_stats, estimated_cost = _audit_batches(
+            source, file_type, record_limit, model, system_prompt, user_prompt, use_cache,
+            progress_callback, record_callback, run_key, history
+        )
+    except Exception:
+        if run_key:
+            logging.warning(
+                f"Audit failed; {count_checkpoints(run_key)} completed chunk(s) are checkpointed "
+                f"and will be reused when the same file is audited again"
+            )
+        raise
+
+    if run_key:
+        clear_checkpoints(run_key)
+    if history is not None:
+        changes = _finish_history(history, result_json, counts["total_entries"] <= record_limit)
+        if changes is not None:
+            result_json["changes"] = changes
+    return result_json, counts, prompt_stats, estimated_cost
+
+
+def _run_settings(record_limit, model, system_prompt, user_prompt):
+    # Everything besides the file content that determines which chunks are sent
+    return {
+        "backend": config.LLM_BACKEND,
+        "model": model,
+        "system_prompt": system_prompt,
+        "user_prompt": user_prompt,
+        "record_limit": record_limit,
+        "prompt_encoding": config.PROMPT_ENCODING,
+        "prompt_dictionary": config.PROMPT_DICTIONARY,
+        "rules_enabled": config.RULES_ENABLED,
+        "rules_llm_scope": config.RULES_LLM_SCOPE,
+        "dedup_enabled": config.DEDUP_ENABLED,
+        "dedup_volatile_fields": config.DEDUP_VOLATILE_FIELDS,
+    }
+
+
+def _audit_batches(source, file_type, record_limit, model, system_prompt, user_prompt, use_cache,
+                   progress_callback, record_callback, run_key, history):
+    counts = Counter()
+    seen_ids = set()
+    batch_results = []
+    prompt_stats = None
+    estimated_cost = 0.0
+    screened = False
+
+    for start, batch in _iter_limited_batches(source, file_type, record_limit, counts):
+        # Deterministic pre-screening of flat records
+        screening = _screen_batch(batch, seen_ids, start)
+        llm_batch = batch if screening is None else [batch[index] for index in screening[1]]
+        if screening is not None:
+            screened = True
+            counts["flagged"] += sum(1 for devs in screening[0] if devs)
+            # Records settled by the rules are known before the LLM runs
+            if record_callback:
+                llm_set = set(screening[1])
+                record_callback([
+                    {"deviations": devs} for index, devs in enumerate(screening[0])
+                    if index not in llm_set
+                ])
+
+        # Unchanged records of a re-audited file keep their previous results
+        reused = []
+        sent_keys = {}
+        if history is not None:
+            batch_order = {
+                str(rec.get("id", rec.get("recipe_id"))): position
+                for position, rec in reversed(list(enumerate(llm_batch))) if isinstance(rec, dict)
+            }
+            llm_positions = range(len(batch)) if screening is None else set(screening[1])
+            llm_batch, reused, sent_keys = _split_unchanged(history, batch, llm_positions)
+            if reused and record_callback:
+                record_callback(reused)
+        counts["reviewed"] += len(llm_batch)
+        counts["reused"] += len(reused)
+
+        # Near-identical records are audited once through a representative
+        groups = {}
+        representatives = llm_batch
+        batch_record_callback = record_callback
+        if config.DEDUP_ENABLED and llm_batch:
+            representatives, groups = group_records(llm_batch)
+            counts["deduplicated"] += len(llm_batch) - len(representatives)
+            if record_callback and groups:
+                batch_record_callback = lambda records: record_callback(expand_results(records, groups))
+
+        def update_progress(completed, total, start=start, size=len(batch)):
+            if progress_callback:
+                progress_callback(start, size, completed, total)
+
+        result = {}
+        if llm_batch:
+            plan = plan_audit(representatives, model, system_prompt, user_prompt)
+            estimated_cost += plan["estimated_cost"]
+            result = analyze_recipe(
+                representatives, model, system_prompt, user_prompt,
+                progress_callback=update_progress,
+                record_callback=batch_record_callback,
+                use_cache=use_cache,
+                plan=plan,
+                checkpoint_key=run_key
+            )
+            batch_prompt_stats = result["prompt_stats"]
+            if prompt_stats is None:
+                prompt_stats = dict(batch_prompt_stats)
+            else:
+                for key in ("data_tokens", "legacy_data_tokens", "tokens_saved", "provider_input_tokens",
+                            "cached_tokens"):
+                    prompt_stats[key] += batch_prompt_stats[key]
+            if groups:
+                result["records"] = expand_results(result.get("records", []), groups)
+        if history is not None:
+            for rec in result.get("records", []):
+                if str(rec.get("id")) in sent_keys:
+                    history["rows"].append((*sent_keys.pop(str(rec.get("id"))), rec))
+            if reused:
+                result = _with_reused(result, reused, len(llm_batch), history["previous"], batch_order)
+        if screening is not None:
+            findings, llm_indices, record_ids = screening
+            result = combine_results(record_ids, findings, llm_indices, result)
+        batch_results.append((len(batch), result))
+
+    result_json = _merge_batch_results(batch_results)
+    del batch_results
+    if screened:
+        result_json["summary_text"] = (
+            f"{result_json['summary_text']}\n\n"
+            f"Deterministic pre-screening flagged {counts['flagged']} records; "
+            f"{counts['reviewed']} records were reviewed by the LLM."
+        ).strip()
+    if counts["deduplicated"]:
+        result_json["summary_text"] = (
+            f"{result_json['summary_text']}\n\n"
+            f"{counts['deduplicated']} near-identical records share the findings of a representative record."
+        ).strip()
+    if counts["reused"]:
+        result_json["summary_text"] = (
+            f"{result_json['summary_text']}\n\n"
+            f"{counts['reused']} records unchanged since the last audit kept their previous results."
+        ).strip()
+    return result_json, counts, prompt_stats, estimated_cost
+
+
+def _with_reused(result, reused, sent_count, previous, batch_order):
+    """
+    Add the previous results of unchanged records to the LLM result of a batch,
+    in batch order. The score is weighted with the previous score for the unchanged records.
+    """
+    records = result.get("records", []) + reused
+    records.sort(key=lambda rec: batch_order.get(str(rec.get("id")), len(batch_order)))
+    merged = {
+        "summary_text": result.get("summary_text") or (previous or {}).get("summary_text", ""),
+        "records": records,
+    }
+    scores = []
+    if sent_count and isinstance(result.get("data_quality_score"), (int, float)):
+        scores.append((result["data_quality_score"], sent_count))
+    if previous and previous.get("data_quality_score") is not None:
+        scores.append((previous["data_quality_score"], len(reused)))
+    if scores:
+        merged["data_quality_score"] = round(
+            sum(score * count for score, count in scores) / sum(count for _, count in scores)
+        )
+    return merged
+
+
+def summarize_results(result_json, total_entries):
+    """
+    Re-apply the severity mapping to the audited records and compute summary stats.
+    """
+    records = result_json.get("records", [])
+    with span("stats", records=len(records)):
+        return _summary_stats(result_json, records, total_entries)
+
+
+def _summary_stats(result_json, records, total_entries):
+    # Re-apply severity mapping for consistency (vectorised over the columnar store)
+    store = build_store(records)
+    write_severities(store, records, remap_severities(store))
+
+    # Compute compliance summary
+    total_records = len(records)
+    deviation_counts = record_deviation_counts(store)
+    records_with_deviations = int(np.count_nonzero(deviation_counts))
+    records_with_multiple_deviations = int(np.count_nonzero(deviation_counts > 1))
+
+    records_fully_compliant = total_records - records_with_deviations
+    compliance_rate = round((records_fully_compliant / total_records) * 100, 1)
+
+    return {
+        "data_quality_score": result_json.get("data_quality_score", 5),
+        "total_records": total_records,
+        "total_entries_in_file": total_entries,
+        "records_with_deviations": records_with_deviations,
+        "records_with_multiple_deviations": records_with_multiple_deviations,
+        "records_fully_compliant": records_fully_compliant,
+        "compliance_rate": compliance_rate,
+        **severity_counts(store),
+        "critical_types": top_types(store, "Critical"),
+        "moderate_types": top_types(store, "Moderate")
+    }
+
+
+def report_filename(file_name, suffix="audit_report.pdf"):
+    """
+    Timestamped file name of a report (PDF by default) for an audited file.
+    """
+    timestamp = datetime.now(pytz.timezone("Europe/Zurich")).strftime("%Y-%m-%d %H:%M:%S %Z")
+    safe_file_name = file_name.replace(" ", "_").replace(".json", "").replace(".csv", "")
+    return f"{timestamp}_{safe_file_name}_{suffix}"
@@ -0,0 +1,326 @@
+# =====================================
+# File: backends.py
+# Description:
+#   Pluggable LLM backends, one class per LLM_BACKEND.
+#   Each backend keeps a single long-lived, connection-pooled client
+#   per process, shared across Streamlit reruns, sessions and threads.
+#   The system prompt and audit instructions are sent as a stable prefix
+#   ahead of each chunk's data, so providers can serve them from their
+#   prompt cache (OpenAI prefix caching, Gemini cached content).
+# =====================================
+
+import hashlib
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Any
+
+import config
+from src.tokens import count_tokens
+
+_registry = {}
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def register_backend(name):
+    """
+    Class decorator registering a backend under an LLM_BACKEND name.
+    """
+    def decorator(cls):
+        cls.name = name
+        _registry[name] = cls
+        return cls
+    return decorator
+
+
+def backend_class(name):
+    """
+    Return the registered backend class for a name, or None.
+    """
+    return _registry.get((name or "").upper())
+
+
+def get_backend(name=None):
+    """
+    Return the process-wide backend instance for a name (default: LLM_BACKEND).
+    The instance and its client are created on first use (see prewarm).
+    """
+    name = (name or config.LLM_BACKEND).upper()
+    with _instances_lock:
+        if name not in _instances:
+            cls = backend_class(name)
+            if cls is None:
+                raise ValueError(f"Unsupported LLM backend: {name}")
+            config.validate(name)
+            _instances[name] = cls()
+        return _instances[name]
+
+
+def _http_client():
+    # Shared keep-alive connection pool sized for concurrent chunk requests
+    import httpx
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=config.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=config.LLM_MAX_CONNECTIONS,
+            keepalive_expiry=config.LLM_KEEPALIVE_SECONDS,
+        ),
+        timeout=config.LLM_TIMEOUT_SECONDS,
+    )
+
+
+def prefix_key(*parts) -> str:
+    """
+    Short hash identifying a prompt prefix (e.g. model, system prompt and instructions).
+    """
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def _messages(system_prompt, instructions, data):
+    # The static prefix (system prompt, instructions) comes first and unchanged in every request
+    messages: list[dict[str, Any]] = [{"role": "system", "content": system_prompt}]
+    if instructions:
+        messages.append({"role": "user", "content": instructions})
+    messages.append({"role": "user", "content": data})
+    return messages
+
+
+def _openai_usage(reported, usage):
+    # Token counts of an OpenAI-style usage object
+    if reported is None or usage is None:
+        return
+    details = getattr(reported, "prompt_tokens_details", None)
+    usage["input_tokens"] = reported.prompt_tokens or 0
+    usage["output_tokens"] = reported.completion_tokens or 0
+    usage["cached_tokens"] = getattr(details, "cached_tokens", None) or 0
+
+
+def _collect_stream(response, on_text=None, usage=None) -> str:
+    # Join the content deltas of an OpenAI-style chat completion stream
+    # (with stream_options include_usage, the token counts arrive in the last chunk)
+    pieces = []
+    for chunk in response:
+        if getattr(chunk, "usage", None):
+            _openai_usage(chunk.usage, usage)
+        if chunk.choices and getattr(chunk.choices[0].delta, "content", None):
+            piece = chunk.choices[0].delta.content
+            pieces.append(piece)
+            if on_text:
+                on_text(piece)
+    return "".join(pieces)
+
+
+class LLMBackend:
+    """
+    Base class of an LLM backend.
+    """
+    name = None
+    # Model that is always called, regardless of the requested one
+    fixed_model = None
+    # Hard completion cap of the backend call
+    max_output_tokens = None
+
+    def resolve_model(self, model):
+        return self.fixed_model or model
+
+    def complete(self, system_prompt, instructions, data, model, on_text=None, usage=None) -> str:
+        """
+        Send one audit prompt and return the raw text of the response.
+        system_prompt and instructions are the static part of the prompt, sent as a
+        byte-identical prefix ahead of the chunk's data.
+        If on_text is given, the response is streamed and on_text is called
+        with each piece of text as it arrives.
+        usage, if given, is updated with the token counts reported by the provider
+        (input_tokens, cached_tokens, output_tokens).
+        """
+        raise NotImplementedError
+
+
+@register_backend("OPENAI")
+class OpenAIBackend(LLMBackend):
+
+    def __init__(self):
+        from openai import OpenAI
+        self.client = OpenAI(
+            api_key=config.OPENAI_API_KEY,
+            base_url=config.OPENAI_BASE_URL,
+            timeout=config.LLM_TIMEOUT_SECONDS,
+            # With the rate limiter, 429s are retried by the audit (after Retry-After), not hidden in the SDK
+            max_retries=0 if config.RATE_LIMIT_ENABLED else config.LLM_MAX_RETRIES,
+            http_client=_http_client(),
+        )
+
+    def complete(self, system_prompt, instructions, data, model, on_text=None, usage=None) -> str:
+        options = {}
+        if config.PROMPT_CACHE_ENABLED:
+            # Routes requests sharing the prefix to the same prompt cache
+            options["prompt_cache_key"] = prefix_key(system_prompt, instructions)
+        if on_text is not None:
+            options["stream_options"] = {"include_usage": True}
+        response = self.client.chat.completions.create(
+            model=self.resolve_model(model),
+            messages=_messages(system_prompt, instructions, data),
+            temperature=0,
+            top_p=1,
+            stream=on_text is not None,
+            **options,
+        )
+        if on_text is None:
+            _openai_usage(response.usage, usage)
+            return response.choices[0].message.content.strip()
+        return _collect_stream(response, on_text, usage).strip()
+
+
+@register_backend("INTERNAL")
+class PortkeyBackend(LLMBackend):
+    fixed_model = "gpt-35-turbo"
+    max_output_tokens = 500
+
+    def __init__(self):
+        from portkey_ai import Portkey
+        self.client = Portkey(
+            api_key=config.PORTKEY_AZURE_API_KEY,
+            base_url=config.PORTKEY_BASE_URL,
+            provider="azure-openai",
+            request_timeout=config.LLM_TIMEOUT_SECONDS,
+            http_client=_http_client(),
+        )
+
+    def complete(self, system_prompt, instructions, data, model, on_text=None, usage=None) -> str:
+        try:
+            response = self.client.chat.completions.create(
+                messages=_messages(system_prompt, instructions, data),
+                model=self.resolve_model(model),
+                max_tokens=self.max_output_tokens,
+                temperature=0.7,
+                stream=True
+            )
+            return _collect_stream(response, on_text, usage)
+        except Exception as e:
+            logging.error(f"Portkey API call failed: {str(e)}")
+            raise ValueError("Portkey API call failed; check logs for details.")
+
+
+@register_backend("GEMINI")
+class GeminiBackend(LLMBackend):
+    fixed_model = "gemini-1.5-pro"
+
+    def __init__(self):
+        import google.generativeai as genai
+        if config.GEMINI_API_ENDPOINT:
+            # Custom endpoints are only reachable over REST
+            genai.configure(
+                api_key=config.GEMINI_API_KEY,
+                transport="rest",
+                client_options={"api_endpoint": config.GEMINI_API_ENDPOINT},
+            )
+        else:
+            genai.configure(api_key=config.GEMINI_API_KEY)
+        self.genai = genai
+        self.models = {}
+        self.models_lock = threading.Lock()
+        # Prefix key -> cached content handle, its model and expiry (model None: not cacheable),
+        # with a lock per prefix so only one call creates or refreshes its handle
+        self.caches = {}
+        self.caches_lock = threading.Lock()
+
+    def _model(self, name, system_prompt):
+        with self.models_lock:
+            if (name, system_prompt) not in self.models:
+                self.models[(name, system_prompt)] = self.genai.GenerativeModel(
+                    name, system_instruction=system_prompt or None
+                )
+            return self.models[(name, system_prompt)]
+
+    def _cached_model(self, name, system_prompt, instructions):
+        """
+        Model bound to a cached content handle of the prompt prefix, or None if the
+        prefix isn't cached (disabled, shorter than GEMINI_CACHE_MIN_TOKENS or the
+        handle could not be created). Handles are created on first use, their TTL
+        is extended while they are in use and expired handles are re-created.
+        """
+        if not config.PROMPT_CACHE_ENABLED or not instructions:
+            return None
+        key = prefix_key(name, system_prompt, instructions)
+        ttl = config.PROMPT_CACHE_TTL_SECONDS
+        with self.caches_lock:
+            entry = self.caches.get(key)
+            if entry is None:
+                entry = self.caches[key] = {"lock": threading.Lock(), "handle": None, "model": None, "expires_at": 0.0}
+
+        now = time.time()
+        if now < entry["expires_at"] - ttl / 2:
+            return entry["model"]
+        # The network calls run under the prefix's own lock: other prefixes never wait,
+        # and while a still valid handle is refreshed other calls keep using it
+        valid = now < entry["expires_at"] - 60
+        if not entry["lock"].acquire(blocking=not valid):
+            return entry["model"]
+        try:
+            now = time.time()
+            if now < entry["expires_at"] - ttl / 2:
+                return entry["model"]
+            if entry["handle"] is None and (
+                    count_tokens(f"{system_prompt}\n\n{instructions}", name) < config.GEMINI_CACHE_MIN_TOKENS):
+                entry["expires_at"] = float("inf")
+                return None
+            try:
+                if entry["handle"] is not None and now < entry["expires_at"] - 60:
+                    entry["handle"].update(ttl=timedelta(seconds=ttl))
+                else:
+                    handle = self.genai.caching.CachedContent.create(
+                        model=name,
+                        display_name=f"recipe-audit-{key[:12]}",
+                        system_instruction=system_prompt or None,
+                        contents=[instructions],
+                        ttl=timedelta(seconds=ttl),
+                    )
+                    entry["model"] = self.genai.GenerativeModel.from_cached_content(handle)
+                    entry["handle"] = handle
+                    logging.info(f"Created Gemini cached content {handle.name} for the audit instructions")
+            except Exception as e:
+                logging.warning(f"Gemini prompt caching unavailable for {name}; sending the full prompt: {e}")
+                entry["model"] = None
+                entry["expires_at"] = float("inf")
+                return None
+            entry["expires_at"] = now + ttl
+            return entry["model"]
+        finally:
+            entry["lock"].release()
+
+    def complete(self, system_prompt, instructions, data, model, on_text=None, usage=None) -> str:
+        name = self.resolve_model(model)
+        cached = self._cached_model(name, system_prompt, instructions)
+        if cached is not None:
+            # The system prompt and instructions are part of the cached content
+            generative_model, contents = cached, data
+        else:
+            generative_model, contents = self._model(name, system_prompt), [part for part in (instructions, data) if part]
+        response = generative_model.generate_content(
+            contents,
+            stream=on_text is not None,
+            request_options={"timeout": config.LLM_TIMEOUT_SECONDS},
+        )
+        if on_text is None:
+            text = response.text.strip()
+        else:
+            pieces = []
+            for chunk in response:
+                if chunk.parts:
+                    pieces.append(chunk.text)
+                    on_text(chunk.text)
+            text = "".join(pieces).strip()
+        _gemini_usage(response, usage)
+        return text
+
+
+def _gemini_usage(response, usage):
+    # Token counts of a (streamed) Gemini response
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is None or usage is None:
+        return
+    usage["input_tokens"] = metadata.prompt_token_count
+    usage["output_tokens"] = metadata.candidates_token_count
+    usage["cached_tokens"] = metadata.cached_content_token_count
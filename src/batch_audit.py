@@ -0,0 +1,229 @@
+# =====================================
+# File: batch_audit.py
+# Description:
+#   Headless command-line entry point for nightly/pipeline audits.
+#   Audits every JSON/CSV file of a directory or glob across a process
+#   pool and writes PDF reports (and optionally JSONL/CSV/Parquet findings)
+#   and JSON summaries to an output directory, with the per-stage
+#   metrics of all workers in metrics.prom (Prometheus text format).
+#   Exits non-zero when critical deviations are found.
+#
+#   Usage: python src/batch_audit.py <dir or glob> [<dir or glob> ...] -o reports/
+# =====================================
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import glob
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import config
+from src import metrics
+from src.audit_pipeline import audit_source, summarize_changes, summarize_results
+from src.ingest import contains_null_bytes
+from src.reports import REPORT_FORMATS, write_report
+from src.prompts import DEFAULT_SYSTEM_PROMPT, DEFAULT_USER_PROMPT
+from src.rate_limit import set_process_share
+from src.utils import detect_file_type
+
+# Exit codes for pipeline gating
+EXIT_OK = 0
+EXIT_FINDINGS = 1
+EXIT_ERRORS = 2
+
+SEVERITY_LEVELS = ("critical", "moderate", "minor")
+
+
+def collect_files(patterns):
+    """
+    Expand directories (searched recursively) and glob patterns into a sorted
+    list of JSON and CSV files.
+    """
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "**", "*"), recursive=True)
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        files.update(
+            os.path.abspath(path) for path in matches
+            if os.path.isfile(path) and detect_file_type(path) != "unknown"
+        )
+    return sorted(files)
+
+
+def _output_stem(path, used):
+    # Unique, readable output name per input file (same names in different folders get a suffix)
+    stem = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+    name = stem
+    index = 2
+    while name in used:
+        name = f"{stem}_{index}"
+        index += 1
+    used.add(name)
+    return name
+
+
+def audit_file(path, output_stem, output_dir, record_limit, model, system_prompt, user_prompt, use_cache,
+               formats=("pdf",)):
+    """
+    Audit one file in a worker process and write its reports and JSON summary.
+    Returns the summary dict; failures are reported in it instead of raised.
+    """
+    file_name = os.path.basename(path)
+    summary = {"file": path, "status": "ok"}
+    try:
+        with open(path, "rb") as source:
+            if contains_null_bytes(source):
+                raise ValueError("File contains binary data or embedded null bytes.")
+            result_json, counts, prompt_stats, estimated_cost = audit_source(
+                source, detect_file_type(path), record_limit, model, system_prompt, user_prompt,
+                use_cache=use_cache,
+                file_name=path,
+                dataset_id=path
+            )
+        audited_at = time.time()
+        summary_stats = summarize_results(result_json, counts["total_entries"])
+
+        reports = {
+            fmt: write_report(
+                result_json, file_name, summary_stats, fmt,
+                os.path.join(output_dir, f"{output_stem}_{REPORT_FORMATS[fmt][0]}"),
+                audited_at
+            )
+            for fmt in formats
+        }
+
+        summary.update({
+            "reports": reports,
+            "summary_text": result_json.get("summary_text", ""),
+            "summary_stats": summary_stats,
+            "prompt_stats": prompt_stats,
+            "estimated_cost": estimated_cost,
+            "changes": summarize_changes(result_json.get("changes")),
+        })
+    except UnicodeDecodeError as e:
+        summary.update({"status": "error", "error": f"File is not valid UTF-8 text: {e}"})
+    except Exception as e:
+        summary.update({"status": "error", "error": str(e)})
+
+    with open(os.path.join(output_dir, f"{output_stem}_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, default=str)
+    return summary
+
+
+def _audit_in_worker(*args):
+    # Worker processes are reused across files: hand back the metrics of this file only
+    metrics.reset()
+    summary = audit_file(*args)
+    return summary, metrics.snapshot()
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Audit recipe files (JSON/CSV) without the Streamlit UI."
+    )
+    parser.add_argument("inputs", nargs="+", help="Directories (searched recursively) or glob patterns.")
+    parser.add_argument("-o", "--output-dir", default="audit_reports", help="Where PDFs and summaries are written.")
+    parser.add_argument("-w", "--workers", type=int, default=config.BATCH_WORKERS,
+                        help="Files audited in parallel; each file also uses AUDIT_CONCURRENCY LLM calls.")
+    parser.add_argument("-n", "--limit", type=int, default=config.MAX_ENTRIES,
+                        help="Records audited per file (capped by MAX_ENTRIES).")
+    parser.add_argument("-m", "--model", default="gpt-4o")
+    parser.add_argument("--system-prompt-file", help="Text file replacing the default system prompt.")
+    parser.add_argument("--user-prompt-file", help="Text file replacing the default user prompt.")
+    parser.add_argument("--no-cache", action="store_true", help="Don't reuse cached audit results.")
+    parser.add_argument("-f", "--formats", nargs="+", choices=list(REPORT_FORMATS), default=["pdf"],
+                        help="Reports written per file: PDF and/or findings as JSONL, CSV or Parquet.")
+    parser.add_argument("--fail-on", choices=SEVERITY_LEVELS + ("none",), default="critical",
+                        help="Exit with code 1 if any deviation of this severity or worse is found.")
+    return parser.parse_args(argv)
+
+
+def _read_prompt(path, default):
+    if not path:
+        return default
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _exit_code(summaries, fail_on):
+    if any(summary["status"] != "ok" for summary in summaries):
+        return EXIT_ERRORS
+    if fail_on != "none":
+        levels = SEVERITY_LEVELS[:SEVERITY_LEVELS.index(fail_on) + 1]
+        if any(summary["summary_stats"][level] for summary in summaries for level in levels):
+            return EXIT_FINDINGS
+    return EXIT_OK
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = _parse_args(argv)
+    try:
+        config.validate()
+    except RuntimeError as e:
+        logging.error(str(e))
+        return EXIT_ERRORS
+
+    files = collect_files(args.inputs)
+    if not files:
+        logging.error("No JSON or CSV files matched the given inputs.")
+        return EXIT_ERRORS
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    system_prompt = _read_prompt(args.system_prompt_file, DEFAULT_SYSTEM_PROMPT)
+    user_prompt = _read_prompt(args.user_prompt_file, DEFAULT_USER_PROMPT)
+    record_limit = min(args.limit, config.MAX_ENTRIES)
+    use_cache = config.AUDIT_CACHE_ENABLED and not args.no_cache
+
+    used_stems = set()
+    jobs = [(path, _output_stem(path, used_stems)) for path in files]
+    summaries = []
+    workers = max(1, min(args.workers, len(jobs)))
+    logging.info(f"Auditing {len(jobs)} file(s) with {workers} worker process(es)")
+    metrics.start_server()
+
+    # Each worker process gets an equal share of the backend's RPM/TPM budgets
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_process_share, initargs=(1 / workers,)) as executor:
+        futures = [
+            executor.submit(
+                _audit_in_worker, path, stem, args.output_dir, record_limit, args.model,
+                system_prompt, user_prompt, use_cache, args.formats
+            )
+            for path, stem in jobs
+        ]
+        for future in as_completed(futures):
+            summary, worker_metrics = future.result()
+            metrics.merge(worker_metrics)
+            summaries.append(summary)
+            if summary["status"] == "ok":
+                stats = summary["summary_stats"]
+                logging.info(
+                    f"{summary['file']}: {stats['total_records']} records, {stats['critical']} critical, "
+                    f"{stats['moderate']} moderate, {stats['minor']} minor"
+                )
+            else:
+                logging.error(f"{summary['file']}: {summary['error']}")
+
+    summaries.sort(key=lambda summary: summary["file"])
+    metrics.write_textfile(os.path.join(args.output_dir, "metrics.prom"))
+    exit_code = _exit_code(summaries, args.fail_on)
+    with open(os.path.join(args.output_dir, "batch_summary.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "files": len(summaries),
+            "failed": sum(1 for summary in summaries if summary["status"] != "ok"),
+            "critical": sum(summary.get("summary_stats", {}).get("critical", 0) for summary in summaries),
+            "exit_code": exit_code,
+            "results": summaries,
+        }, f, indent=2, default=str)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# =====================================
+# File: cache.py
+# Description:
+#   Persistent, content-addressed cache of LLM audit results.
+#   Results are stored in SQLite and evicted by age and total size (LRU).
+# =====================================
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import config
+
+_lock = threading.Lock()
+_stats = Counter()
+_initialized_paths = set()
+
+
+def make_cache_key(backend, model, system_prompt, user_prompt, records) -> str:
+    """
+    Build a content hash of everything that determines the LLM result of a chunk.
+    """
+    payload = json.dumps(
+        [backend, model, system_prompt, user_prompt, records],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _connect():
+    path = os.path.join(config.AUDIT_CACHE_DIR, "audit_cache.sqlite3")
+    if path not in _initialized_paths:
+        os.makedirs(config.AUDIT_CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    if path not in _initialized_paths:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS audit_results ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON audit_results (last_access)")
+        conn.commit()
+        _initialized_paths.add(path)
+    return conn
+
+
+def get_cached_result(key):
+    """
+    Return the cached result for a key, or None on a miss.
+    """
+    now = time.time()
+    min_created = now - config.AUDIT_CACHE_MAX_AGE_DAYS * 86400
+    try:
+        with _lock:
+            conn = _connect()
+            try:
+                row = conn.execute(
+                    "SELECT value FROM audit_results WHERE key = ? AND created_at >= ?",
+                    (key, min_created),
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE audit_results SET last_access = ? WHERE key = ?", (now, key))
+                    conn.commit()
+            finally:
+                conn.close()
+    except sqlite3.Error as e:
+        logging.warning(f"Audit cache read failed: {e}")
+        row = None
+
+    with _lock:
+        _stats["hits" if row is not None else "misses"] += 1
+    return json.loads(row[0]) if row is not None else None
+
+
+def store_result(key, result):
+    """
+    Store a result under a key and evict old or least recently used entries.
+    """
+    value = json.dumps(result, ensure_ascii=False, default=str)
+    now = time.time()
+    try:
+        with _lock:
+            conn = _connect()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO audit_results (key, value, size, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value.encode("utf-8")), now, now),
+                )
+                _evict(conn, now)
+                conn.commit()
+            finally:
+                conn.close()
+            _stats["stores"] += 1
+    except sqlite3.Error as e:
+        logging.warning(f"Audit cache write failed: {e}")
+
+
+def _evict(conn, now):
+    expired = conn.execute(
+        "DELETE FROM audit_results WHERE created_at < ?",
+        (now - config.AUDIT_CACHE_MAX_AGE_DAYS * 86400,),
+    ).rowcount
+
+    total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM audit_results").fetchone()[0]
+    evicted = 0
+    if total_size > config.AUDIT_CACHE_MAX_BYTES:
+        for key, size in conn.execute(
+            "SELECT key, size FROM audit_results ORDER BY last_access ASC"
+        ).fetchall():
+            if total_size <= config.AUDIT_CACHE_MAX_BYTES:
+                break
+            conn.execute("DELETE FROM audit_results WHERE key = ?", (key,))
+            total_size -= size
+            evicted += 1
+
+    _stats["evictions"] += expired + evicted
+
+
+def cache_stats() -> dict:
+    """
+    Return hit/miss/store/eviction counters for this process.
+    """
+    with _lock:
+        return {name: _stats[name] for name in ("hits", "misses", "stores", "evictions")}
+
+
+def clear_cache():
+    """
+    Delete all cached results.
+    """
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute("DELETE FROM audit_results")
+            conn.commit()
+        finally:
+            conn.close()
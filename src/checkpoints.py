@@ -0,0 +1,123 @@
+# =====================================
+# File: checkpoints.py
+# Description:
+#   Chunk-level checkpoints of an audit run, keyed by file hash and
+#   audit settings. A rerun of a failed audit restores the chunks that
+#   already completed and only sends the failed or missing ones.
+# =====================================
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import config
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+_lock = threading.Lock()
+_initialized_paths = set()
+
+
+def make_run_key(source, settings) -> str:
+    """
+    Hash the content of a source (binary/text file-like object or string)
+    together with the settings of the audit. File objects are rewound.
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, str):
+        digest.update(source.encode("utf-8"))
+    else:
+        while block := source.read(READ_BLOCK_SIZE):
+            digest.update(block.encode("utf-8") if isinstance(block, str) else block)
+        source.seek(0)
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _connect():
+    path = os.path.join(config.AUDIT_CACHE_DIR, "checkpoints.sqlite3")
+    if path not in _initialized_paths:
+        os.makedirs(config.AUDIT_CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    if path not in _initialized_paths:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_checkpoints ("
+            " run_key TEXT NOT NULL,"
+            " chunk_key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (run_key, chunk_key))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_checkpoint_created ON chunk_checkpoints (created_at)")
+        conn.commit()
+        _initialized_paths.add(path)
+    return conn
+
+
+def _execute(sql, args=()):
+    with _lock:
+        conn = _connect()
+        try:
+            rows = conn.execute(sql, args).fetchall()
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+
+def count_checkpoints(run_key) -> int:
+    """
+    Number of chunks already checkpointed for a run.
+    """
+    try:
+        return _execute("SELECT COUNT(*) FROM chunk_checkpoints WHERE run_key = ?", (run_key,))[0][0]
+    except sqlite3.Error as e:
+        logging.warning(f"Checkpoint read failed: {e}")
+        return 0
+
+
+def get_checkpoint(run_key, chunk_key):
+    """
+    Return the checkpointed result of a chunk, or None.
+    """
+    try:
+        rows = _execute(
+            "SELECT value FROM chunk_checkpoints WHERE run_key = ? AND chunk_key = ?", (run_key, chunk_key)
+        )
+    except sqlite3.Error as e:
+        logging.warning(f"Checkpoint read failed: {e}")
+        return None
+    return json.loads(rows[0][0]) if rows else None
+
+
+def save_checkpoint(run_key, chunk_key, result):
+    """
+    Checkpoint the result of a chunk and drop checkpoints older than CHECKPOINT_MAX_AGE_DAYS.
+    """
+    now = time.time()
+    try:
+        _execute(
+            "INSERT OR REPLACE INTO chunk_checkpoints (run_key, chunk_key, value, created_at) VALUES (?, ?, ?, ?)",
+            (run_key, chunk_key, json.dumps(result, ensure_ascii=False, default=str), now),
+        )
+        _execute(
+            "DELETE FROM chunk_checkpoints WHERE created_at < ?",
+            (now - config.CHECKPOINT_MAX_AGE_DAYS * 86400,),
+        )
+    except sqlite3.Error as e:
+        logging.warning(f"Checkpoint write failed: {e}")
+
+
+def clear_checkpoints(run_key):
+    """
+    Delete the checkpoints of a run once it has completed.
+    """
+    try:
+        _execute("DELETE FROM chunk_checkpoints WHERE run_key = ?", (run_key,))
+    except sqlite3.Error as e:
+        logging.warning(f"Checkpoint cleanup failed: {e}")
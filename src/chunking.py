@@ -0,0 +1,133 @@
+# =====================================
+# File: chunking.py
+# Description:
+#   Splits recipe records into token-budgeted chunks
+#   and merges per-chunk audit results back together.
+# =====================================
+
+import config
+from src.backends import backend_class
+from src.deviation_store import findings_summary
+from src.prompt_encoding import encode_record_for_estimate
+from src.tokens import count_tokens
+
+# Context window and maximum completion size per model (in tokens)
+MODEL_TOKEN_LIMITS = {
+    "gpt-4o": {"context": 128000, "output": 16384},
+    "gpt-4o-mini": {"context": 128000, "output": 16384},
+    "gpt-35-turbo": {"context": 16385, "output": 4096},
+    "gpt-3.5-turbo": {"context": 16385, "output": 4096},
+    "gemini-1.5-pro": {"context": 2097152, "output": 8192},
+    "gemini-1.5-flash": {"context": 1048576, "output": 8192},
+}
+DEFAULT_TOKEN_LIMITS = {"context": 16385, "output": 4096}
+
+
+def effective_model(backend: str, model: str) -> str:
+    """
+    Return the model that is actually called for the given backend.
+    """
+    cls = backend_class(backend)
+    return (cls.fixed_model if cls else None) or model
+
+
+def get_token_budget(backend: str, model: str) -> dict:
+    """
+    Compute the input and output token budget of a single chunk.
+    """
+    limits = MODEL_TOKEN_LIMITS.get(effective_model(backend, model), DEFAULT_TOKEN_LIMITS)
+
+    output_budget = min(limits["output"], config.CHUNK_MAX_OUTPUT_TOKENS)
+    cls = backend_class(backend)
+    if cls and cls.max_output_tokens:
+        output_budget = min(output_budget, cls.max_output_tokens)
+
+    input_budget = min(limits["context"] - output_budget, config.CHUNK_MAX_INPUT_TOKENS)
+
+    return {"input": input_budget, "output": output_budget}
+
+
+def _summary_reserve(output_budget: int) -> int:
+    # Part of the completion reserved for summary_text and the JSON envelope
+    return min(config.CHUNK_SUMMARY_TOKENS, output_budget // 4)
+
+
+def estimate_output_tokens(record_count: int, backend: str, model: str) -> int:
+    """
+    Predict the completion tokens of auditing one chunk of record_count records.
+    """
+    output_budget = get_token_budget(backend, model)["output"]
+    expected = record_count * config.OUTPUT_TOKENS_PER_RECORD + _summary_reserve(output_budget)
+    return min(expected, output_budget)
+
+
+def split_into_chunks(records, backend, model, fixed_prompt_tokens=0):
+    """
+    Split records into consecutive chunks that fit the token budget of the backend and model.
+    Each chunk is a dict with its 'start' index in the original list and its 'records'.
+    """
+    budget = get_token_budget(backend, model)
+    llm_model = effective_model(backend, model)
+    input_budget = max(budget["input"] - fixed_prompt_tokens, 1)
+    output_budget = budget["output"] - _summary_reserve(budget["output"])
+    per_record_output = config.OUTPUT_TOKENS_PER_RECORD
+    max_records = config.CHUNK_MAX_RECORDS
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    start = 0
+
+    for index, record in enumerate(records):
+        record_tokens = count_tokens(encode_record_for_estimate(record), llm_model)
+        fits = (
+            current_tokens + record_tokens <= input_budget
+            and (len(current) + 1) * per_record_output <= output_budget
+            and len(current) < max_records
+        )
+        if current and not fits:
+            chunks.append({"start": start, "records": current})
+            current = []
+            current_tokens = 0
+            start = index
+        current.append(record)
+        current_tokens += record_tokens
+
+    if current:
+        chunks.append({"start": start, "records": current})
+
+    return chunks
+
+
+def merge_chunk_results(chunks, chunk_results):
+    """
+    Merge per-chunk audit results into a single result with the same shape
+    as a single-call audit: records, data_quality_score and summary_text.
+    The summary of several chunks is built from the merged findings.
+    """
+    records = []
+    weighted_score = 0.0
+    scored_records = 0
+
+    for chunk, result in zip(chunks, chunk_results):
+        records.extend(result.get("records", []))
+        size = len(chunk["records"])
+
+        score = result.get("data_quality_score")
+        if isinstance(score, (int, float)):
+            weighted_score += score * size
+            scored_records += size
+
+    if len(chunks) == 1:
+        summary_text = (chunk_results[0].get("summary_text") or "").strip()
+    else:
+        summary_text = findings_summary(records)
+
+    merged = {
+        "summary_text": summary_text,
+        "records": records,
+    }
+    if scored_records:
+        merged["data_quality_score"] = round(weighted_score / scored_records)
+
+    return merged
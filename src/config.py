@@ -3,20 +3,17 @@
 # Description:
 #   Manages configuration via environment variables.
 #   Dynamically loads the correct .env file based on ENV_MODE.
-#   Validates correct setup for the selected LLM backend.
-# =====================================
-
-# =====================================
-# File: config.py
-# Description:
-#   Manages configuration via environment variables.
-#   Dynamically loads the correct .env file based on ENV_MODE.
-#   Validates correct setup for the selected LLM backend.
+#   Settings are read once per process into a typed, immutable Settings
+#   object (also exposed as module constants, e.g. config.MAX_ENTRIES);
+#   validate() checks the setup of the selected LLM backend.
 # =====================================
 
+import logging
 import os
+from dataclasses import asdict, dataclass, field
+from typing import Optional, Tuple
 
-from dotenv import load_dotenv, find_dotenv
+from dotenv import find_dotenv, load_dotenv
 
 # =========================
 # Load .env based on ENV_MODE
@@ -26,64 +23,274 @@ dotenv_filename = f".env.{env_mode}"
 dotenv_path = find_dotenv(filename=dotenv_filename)
 
 if dotenv_path:
-    print(f"[DEBUG] Loading environment from {dotenv_filename}")
     load_dotenv(dotenv_path)
+    logging.debug(f"Loaded environment from {dotenv_path}")
 else:
-    print(f"[DEBUG] No {dotenv_filename} file found. Environment variables must be set externally.")
+    logging.debug(f"No {dotenv_filename} file found. Environment variables must be set externally.")
+# A plain .env fills in anything not set yet
+load_dotenv(find_dotenv())
+
+def _str(name, default=None):
+    return os.getenv(name, default)
+
+
+def _optional(name, default=None):
+    return os.getenv(name) or default
+
+
+def _int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+def _float(name, default):
+    return float(os.getenv(name, str(default)))
+
+
+def _bool(name, default):
+    return os.getenv(name, str(default).lower()).lower() in ("1", "true", "yes")
+
+
+def _tuple(name, default):
+    return tuple(item.strip() for item in os.getenv(name, default).split(",") if item.strip())
+
+
+def _setting(parse, name, default=None):
+    # Field whose value is read from the environment when Settings is created
+    return field(default_factory=lambda: parse(name, default))
+
+
+def _cache_dir():
+    return os.getenv("AUDIT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "recipe-validator"))
 
-print("[DEBUG] Current working directory:", os.getcwd())
 
 # =========================
 # Load environment variables
 # =========================
-LLM_BACKEND = os.getenv("LLM_BACKEND", "GEMINI").upper()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-PORTKEY_AZURE_API_KEY = os.getenv("PORTKEY_AZURE_API_KEY")
-PORTKEY_BASE_URL = os.getenv("PORTKEY_BASE_URL")
-GEMINI_API_KEY = os.getenv("GEMINI_STUDIO_API_KEY")  # <-- ADD THIS LINE
-MAX_ENTRIES = int(os.getenv("MAX_ENTRIES", "5000"))
+@dataclass(frozen=True)
+class Settings:
+    llm_backend: str = field(default_factory=lambda: os.getenv("LLM_BACKEND", "GEMINI").upper())
+    openai_api_key: Optional[str] = _setting(_str, "OPENAI_API_KEY")
+    portkey_azure_api_key: Optional[str] = _setting(_str, "PORTKEY_AZURE_API_KEY")
+    portkey_base_url: Optional[str] = _setting(_str, "PORTKEY_BASE_URL")
+    gemini_api_key: Optional[str] = _setting(_str, "GEMINI_STUDIO_API_KEY")
+    # Alternative API endpoints (e.g. a proxy or the local mock server of benchmarks/)
+    openai_base_url: Optional[str] = _setting(_optional, "OPENAI_BASE_URL")
+    gemini_api_endpoint: Optional[str] = _setting(_optional, "GEMINI_API_ENDPOINT")
+    max_entries: int = _setting(_int, "MAX_ENTRIES", 5000)
 
-# =========================
-# Validation
-# =========================
-if LLM_BACKEND == "OPENAI":
-    if not OPENAI_API_KEY:
-        raise RuntimeError(
-            "Missing OPENAI_API_KEY. Please set it before running in OPENAI mode."
-        )
-elif LLM_BACKEND == "INTERNAL":
-    if not PORTKEY_AZURE_API_KEY or not PORTKEY_BASE_URL:
-        raise RuntimeError(
-            "Missing PORTKEY_AZURE_API_KEY or PORTKEY_BASE_URL. Please set both before running in INTERNAL mode."
-        )
-elif LLM_BACKEND == "GEMINI":  # <-- ADD THIS BLOCK
-    if not GEMINI_API_KEY:
-        raise RuntimeError(
-            "Missing GEMINI_STUDIO_API_KEY. Please set it before running in GEMINI mode."
-        )
-else:
-    raise RuntimeError(
-        f"Invalid LLM_BACKEND '{LLM_BACKEND}'. Must be 'OPENAI', 'INTERNAL', or 'GEMINI'."
+    # Chunked auditing: per-chunk token budgets and size limits
+    chunk_max_input_tokens: int = _setting(_int, "CHUNK_MAX_INPUT_TOKENS", 30000)
+    chunk_max_output_tokens: int = _setting(_int, "CHUNK_MAX_OUTPUT_TOKENS", 8192)
+    chunk_max_records: int = _setting(_int, "CHUNK_MAX_RECORDS", 100)
+    chunk_summary_tokens: int = _setting(_int, "CHUNK_SUMMARY_TOKENS", 400)
+    output_tokens_per_record: int = _setting(_int, "OUTPUT_TOKENS_PER_RECORD", 80)
+    audit_concurrency: int = _setting(_int, "AUDIT_CONCURRENCY", 8)
+
+    # Backend HTTP clients: request timeout, SDK retries and keep-alive connection pool
+    llm_timeout_seconds: float = _setting(_float, "LLM_TIMEOUT_SECONDS", 120)
+    llm_max_retries: int = _setting(_int, "LLM_MAX_RETRIES", 2)
+    llm_max_connections: int = _setting(_int, "LLM_MAX_CONNECTIONS", 32)
+    llm_keepalive_seconds: float = _setting(_float, "LLM_KEEPALIVE_SECONDS", 60)
+    # Create the backend client in the background when the app starts
+    llm_prewarm: bool = _setting(_bool, "LLM_PREWARM", True)
+
+    # Provider prompt caching of the static audit instructions
+    prompt_cache_enabled: bool = _setting(_bool, "PROMPT_CACHE_ENABLED", True)
+    prompt_cache_ttl_seconds: int = _setting(_int, "PROMPT_CACHE_TTL_SECONDS", 3600)
+    gemini_cache_min_tokens: int = _setting(_int, "GEMINI_CACHE_MIN_TOKENS", 4096)
+
+    # Adaptive rate limiting of LLM calls per backend: requests/tokens per minute (0 = no budget),
+    # ceiling of the AIMD concurrency window, latency trigger and 429 retries per chunk
+    rate_limit_enabled: bool = _setting(_bool, "RATE_LIMIT_ENABLED", True)
+    openai_rpm: int = _setting(_int, "OPENAI_RPM", 0)
+    openai_tpm: int = _setting(_int, "OPENAI_TPM", 0)
+    internal_rpm: int = _setting(_int, "INTERNAL_RPM", 0)
+    internal_tpm: int = _setting(_int, "INTERNAL_TPM", 0)
+    gemini_rpm: int = _setting(_int, "GEMINI_RPM", 0)
+    gemini_tpm: int = _setting(_int, "GEMINI_TPM", 0)
+    llm_max_concurrency: int = _setting(_int, "LLM_MAX_CONCURRENCY", 16)
+    rate_limit_latency_factor: float = _setting(_float, "RATE_LIMIT_LATENCY_FACTOR", 2.0)
+    rate_limit_max_retries: int = _setting(_int, "RATE_LIMIT_MAX_RETRIES", 8)
+
+    # Number of records parsed from the upload and audited per streaming batch
+    ingest_batch_size: int = _setting(_int, "INGEST_BATCH_SIZE", 2000)
+
+    # Files audited in parallel by the batch CLI (one process each)
+    batch_workers: int = _setting(_int, "BATCH_WORKERS", 4)
+
+    # Prompt serialisation of records: json (indented), minified or tabular
+    prompt_encoding: str = field(default_factory=lambda: os.getenv("PROMPT_ENCODING", "tabular").lower())
+    prompt_dictionary: bool = _setting(_bool, "PROMPT_DICTIONARY", False)
+
+    # JSON file with per-model prices in USD per 1M tokens, e.g. {"gpt-4o": {"input": 2.5, "output": 10}}
+    llm_price_table: Optional[str] = _setting(_str, "LLM_PRICE_TABLE")
+
+    # Deterministic pre-screening before the LLM
+    rules_enabled: bool = _setting(_bool, "RULES_ENABLED", True)
+    rules_llm_scope: str = field(default_factory=lambda: os.getenv("RULES_LLM_SCOPE", "unflagged").lower())
+
+    # Persistent LLM result cache
+    audit_cache_enabled: bool = _setting(_bool, "AUDIT_CACHE_ENABLED", True)
+    audit_cache_dir: str = field(default_factory=_cache_dir)
+    audit_cache_max_bytes: int = field(default_factory=lambda: _int("AUDIT_CACHE_MAX_MB", 500) * 1024 * 1024)
+    audit_cache_max_age_days: float = _setting(_float, "AUDIT_CACHE_MAX_AGE_DAYS", 30)
+
+    # Audit one representative of records that differ only in ids and volatile (timestamp) fields
+    dedup_enabled: bool = _setting(_bool, "DEDUP_ENABLED", True)
+    dedup_volatile_fields: Tuple[str, ...] = _setting(
+        _tuple, "DEDUP_VOLATILE_FIELDS", "start_time,end_time,timestamp,created_at,updated_at"
     )
 
+    # Record-level fingerprints: re-audits of a file only send added or changed records
+    incremental_audit: bool = _setting(_bool, "INCREMENTAL_AUDIT", True)
+
+    # Chunk checkpoints for resuming failed audits, and retries of failed chunks
+    checkpoint_enabled: bool = _setting(_bool, "CHECKPOINT_ENABLED", True)
+    checkpoint_max_age_days: float = _setting(_float, "CHECKPOINT_MAX_AGE_DAYS", 7)
+    chunk_max_attempts: int = field(default_factory=lambda: max(1, _int("CHUNK_MAX_ATTEMPTS", 3)))
+    chunk_retry_base_seconds: float = _setting(_float, "CHUNK_RETRY_BASE_SECONDS", 2)
+    chunk_retry_max_seconds: float = _setting(_float, "CHUNK_RETRY_MAX_SECONDS", 30)
+
+    # Follow-up calls re-requesting records missing from a truncated or malformed response
+    salvage_max_followups: int = _setting(_int, "SALVAGE_MAX_FOLLOWUPS", 2)
+
+    # Background audit jobs of the Streamlit app: worker threads, persisted state and polling
+    job_workers: int = _setting(_int, "JOB_WORKERS", 2)
+    job_dir: str = field(default_factory=lambda: os.getenv("JOB_DIR", os.path.join(_cache_dir(), "jobs")))
+    job_retention_days: float = _setting(_float, "JOB_RETENTION_DAYS", 7)
+    job_poll_seconds: float = _setting(_float, "JOB_POLL_SECONDS", 1)
+
+    # Records listed under "Detailed Findings" of the PDF report, most severe first (0 = all)
+    pdf_max_findings: int = _setting(_int, "PDF_MAX_FINDINGS", 2000)
+
+    # Reports (PDF and exports) are rendered on demand and memoised here by a hash of the results
+    report_dir: str = field(default_factory=lambda: os.getenv("REPORT_DIR", os.path.join(_cache_dir(), "reports")))
+    report_retention_days: float = _setting(_float, "REPORT_RETENTION_DAYS", 7)
+
+    # Per-stage timing spans: JSON span logs and a local Prometheus endpoint (port 0 = off)
+    metrics_log: bool = _setting(_bool, "METRICS_LOG", True)
+    metrics_port: int = _setting(_int, "METRICS_PORT", 0)
+    metrics_host: str = _setting(_str, "METRICS_HOST", "127.0.0.1")
+
+
+# Read once per process; Streamlit reruns reuse the imported module
+SETTINGS = Settings()
+
 # =========================
 # Centralized config object
 # =========================
-CONFIG = {
-    "llm_backend": LLM_BACKEND,
-    "openai_api_key": OPENAI_API_KEY,
-    "portkey_azure_api_key": PORTKEY_AZURE_API_KEY,
-    "portkey_base_url": PORTKEY_BASE_URL,
-    "gemini_api_key": GEMINI_API_KEY,  # <-- ADD THIS LINE
-    "max_entries": MAX_ENTRIES,
-}
+CONFIG = asdict(SETTINGS)
+
+# Module constants (config.MAX_ENTRIES, ...) for the rest of the code base
+LLM_BACKEND: str = SETTINGS.llm_backend
+OPENAI_API_KEY: Optional[str] = SETTINGS.openai_api_key
+PORTKEY_AZURE_API_KEY: Optional[str] = SETTINGS.portkey_azure_api_key
+PORTKEY_BASE_URL: Optional[str] = SETTINGS.portkey_base_url
+GEMINI_API_KEY: Optional[str] = SETTINGS.gemini_api_key
+
+OPENAI_BASE_URL: Optional[str] = SETTINGS.openai_base_url
+GEMINI_API_ENDPOINT: Optional[str] = SETTINGS.gemini_api_endpoint
+MAX_ENTRIES: int = SETTINGS.max_entries
+
+CHUNK_MAX_INPUT_TOKENS: int = SETTINGS.chunk_max_input_tokens
+CHUNK_MAX_OUTPUT_TOKENS: int = SETTINGS.chunk_max_output_tokens
+CHUNK_MAX_RECORDS: int = SETTINGS.chunk_max_records
+CHUNK_SUMMARY_TOKENS: int = SETTINGS.chunk_summary_tokens
+OUTPUT_TOKENS_PER_RECORD: int = SETTINGS.output_tokens_per_record
+AUDIT_CONCURRENCY: int = SETTINGS.audit_concurrency
+
+LLM_TIMEOUT_SECONDS: float = SETTINGS.llm_timeout_seconds
+LLM_MAX_RETRIES: int = SETTINGS.llm_max_retries
+LLM_MAX_CONNECTIONS: int = SETTINGS.llm_max_connections
+LLM_KEEPALIVE_SECONDS: float = SETTINGS.llm_keepalive_seconds
+
+LLM_PREWARM: bool = SETTINGS.llm_prewarm
+
+PROMPT_CACHE_ENABLED: bool = SETTINGS.prompt_cache_enabled
+PROMPT_CACHE_TTL_SECONDS: int = SETTINGS.prompt_cache_ttl_seconds
+GEMINI_CACHE_MIN_TOKENS: int = SETTINGS.gemini_cache_min_tokens
+
+RATE_LIMIT_ENABLED: bool = SETTINGS.rate_limit_enabled
+OPENAI_RPM: int = SETTINGS.openai_rpm
+OPENAI_TPM: int = SETTINGS.openai_tpm
+INTERNAL_RPM: int = SETTINGS.internal_rpm
+INTERNAL_TPM: int = SETTINGS.internal_tpm
+GEMINI_RPM: int = SETTINGS.gemini_rpm
+GEMINI_TPM: int = SETTINGS.gemini_tpm
+LLM_MAX_CONCURRENCY: int = SETTINGS.llm_max_concurrency
+RATE_LIMIT_LATENCY_FACTOR: float = SETTINGS.rate_limit_latency_factor
+RATE_LIMIT_MAX_RETRIES: int = SETTINGS.rate_limit_max_retries
+
+INGEST_BATCH_SIZE: int = SETTINGS.ingest_batch_size
+
+BATCH_WORKERS: int = SETTINGS.batch_workers
+
+PROMPT_ENCODING: str = SETTINGS.prompt_encoding
+PROMPT_DICTIONARY: bool = SETTINGS.prompt_dictionary
+
+LLM_PRICE_TABLE: Optional[str] = SETTINGS.llm_price_table
+
+RULES_ENABLED: bool = SETTINGS.rules_enabled
+RULES_LLM_SCOPE: str = SETTINGS.rules_llm_scope
+
+AUDIT_CACHE_ENABLED: bool = SETTINGS.audit_cache_enabled
+AUDIT_CACHE_DIR: str = SETTINGS.audit_cache_dir
+AUDIT_CACHE_MAX_BYTES: int = SETTINGS.audit_cache_max_bytes
+AUDIT_CACHE_MAX_AGE_DAYS: float = SETTINGS.audit_cache_max_age_days
+
+DEDUP_ENABLED: bool = SETTINGS.dedup_enabled
+DEDUP_VOLATILE_FIELDS: Tuple[str, ...] = SETTINGS.dedup_volatile_fields
+
+INCREMENTAL_AUDIT: bool = SETTINGS.incremental_audit
+
+CHECKPOINT_ENABLED: bool = SETTINGS.checkpoint_enabled
+CHECKPOINT_MAX_AGE_DAYS: float = SETTINGS.checkpoint_max_age_days
+CHUNK_MAX_ATTEMPTS: int = SETTINGS.chunk_max_attempts
+CHUNK_RETRY_BASE_SECONDS: float = SETTINGS.chunk_retry_base_seconds
+CHUNK_RETRY_MAX_SECONDS: float = SETTINGS.chunk_retry_max_seconds
+
+SALVAGE_MAX_FOLLOWUPS: int = SETTINGS.salvage_max_followups
+
+JOB_WORKERS: int = SETTINGS.job_workers
+JOB_DIR: str = SETTINGS.job_dir
+JOB_RETENTION_DAYS: float = SETTINGS.job_retention_days
+JOB_POLL_SECONDS: float = SETTINGS.job_poll_seconds
+
+PDF_MAX_FINDINGS: int = SETTINGS.pdf_max_findings
+
+REPORT_DIR: str = SETTINGS.report_dir
+REPORT_RETENTION_DAYS: float = SETTINGS.report_retention_days
+
+METRICS_LOG: bool = SETTINGS.metrics_log
+METRICS_PORT: int = SETTINGS.metrics_port
+METRICS_HOST: str = SETTINGS.metrics_host
+
 
 # =========================
-# Debug output
+# Validation
 # =========================
-print(f"[DEBUG] Config loaded from mode: {env_mode.upper()}")
-print(f"[DEBUG] LLM_BACKEND = {LLM_BACKEND}")
-print(f"[DEBUG] OPENAI_API_KEY present: {bool(OPENAI_API_KEY)}")
-print(f"[DEBUG] PORTKEY_AZURE_API_KEY present: {bool(PORTKEY_AZURE_API_KEY)}")
-print(f"[DEBUG] GEMINI_API_KEY present: {bool(GEMINI_API_KEY)}")  # <-- ADD THIS LINE
-print(f"[DEBUG] CONFIG = {CONFIG}")
\ No newline at end of file
+def validate(backend=None):
+    """
+    Check that the credentials of an LLM backend (default: LLM_BACKEND) are set.
+    Raises RuntimeError with instructions otherwise.
+    """
+    backend = (backend or SETTINGS.llm_backend).upper()
+    if backend == "OPENAI":
+        if not SETTINGS.openai_api_key:
+            raise RuntimeError(
+                "Missing OPENAI_API_KEY. Please set it before running in OPENAI mode."
+            )
+    elif backend == "INTERNAL":
+        if not SETTINGS.portkey_azure_api_key or not SETTINGS.portkey_base_url:
+            raise RuntimeError(
+                "Missing PORTKEY_AZURE_API_KEY or PORTKEY_BASE_URL. Please set both before running in INTERNAL mode."
+            )
+    elif backend == "GEMINI":
+        if not SETTINGS.gemini_api_key:
+            raise RuntimeError(
+                "Missing GEMINI_STUDIO_API_KEY. Please set it before running in GEMINI mode."
+            )
+    else:
+        raise RuntimeError(
+            f"Invalid LLM_BACKEND '{backend}'. Must be 'OPENAI', 'INTERNAL', or 'GEMINI'."
+        )
@@ -1,139 +1,35 @@
-import textwrap
-
 import streamlit as st
 
 import config
+from src.prompts import DEFAULT_SYSTEM_PROMPT, DEFAULT_USER_PROMPT
 
 
 def display_controls():
 
     # Default model
     model = "gpt-4o"
-    # Default number of entries evaluated from the file
-    # num_entries = config.MAX_ENTRIES
 
-    num_entries = st.slider(
-      "🔢 Number of records to process from file:",
-      min_value=10,
-      max_value=10000,
-        value=config.MAX_ENTRIES,
-      step=10,
-      help="Controls how many records to evaluate in this run."
+    use_cache = st.checkbox(
+        "♻️ Reuse cached audit results",
+        value=config.AUDIT_CACHE_ENABLED,
+        disabled=not config.AUDIT_CACHE_ENABLED,
+        help="Skip the LLM call for chunks that were already audited with the same prompts and model."
     )
 
-    # Default system prompt
-    default_system_prompt = textwrap.dedent("""\
-    You are a healthcare recipe quality validation assistant.
-    """)
-
-    # Default user prompt
-    default_user_prompt = textwrap.dedent("""\
-    You are an expert Quality Assurance auditor specializing in pharmaceutical manufacturing processes.
-    
-    You will receive a list of structured JSON records describing recipe execution steps, including process parameters,
-    operator information, timestamps, and status codes.
-
-    For each record, please perform a thorough validation and deviation analysis as follows:
-
-    1. **Completeness Check**
-       - Identify any missing, null, or inconsistent fields (e.g., missing quantity_kg, incomplete operator name).
-
-    2. **Format and Consistency Check**
-       - Verify that timestamps follow ISO 8601 format and that start_time is earlier than end_time.
-       - Confirm that status values conform to the allowed set: "in progress", "completed".
-
-    3. **Logical Plausibility Check**
-       - Validate that quantities are within realistic operational ranges (e.g., 0.01–1000 kg).
-       - Identify any conflicting process steps or status codes.
-
-    4. **Deviation Classification**
-       - For each detected issue, assign:
-         - a **Deviation Type** (e.g., Missing Data, Format Error, Value Out of Range, Status Conflict, Timestamp Error, Data Conflict, Invalid Status, Incomplete Record)
-         - a **Severity Level** according to the definitions below (**Critical**, **Moderate**, or **Minor**)
-
-       **Severity Definitions**
-
-       - **Critical:**  
-         Issues that pose a serious risk to patient safety, regulatory compliance, or process integrity.  
-         Examples include:  
-           - Missing required process steps (e.g., no sterilization step recorded)  
-           - Grossly incorrect quantities (e.g., 5000 kg where the process allows max 1000 kg)  
-           - Conflicting or invalid status codes (e.g., “completed” with no start time)  
-           - Data that could indicate potential fraud or falsification  
-           - Steps that contradict the approved recipe version  
-           - Negative quantities in required positive fields  
-
-       - **Moderate:**  
-         Issues that could impact product quality, data integrity, or operational efficiency but do not immediately endanger safety or compliance.  
-         Examples include:  
-           - Quantities slightly outside expected ranges (e.g., 1001 kg where the limit is 1000)  
-           - Incomplete operator names (e.g., “J.”)  
-           - Non-standard or inconsistent timestamps (e.g., using DD/MM/YYYY when ISO format is required)  
-           - Inconsistent sequencing of steps  
-           - Duplicate records for the same step  
-           - Use of deprecated process codes  
-           - Missing optional but recommended fields  
-
-       - **Minor:**  
-         Issues that are unlikely to materially affect the process or outcomes but should still be corrected.  
-         Examples include:  
-           - Minor formatting errors (e.g., extra spaces, inconsistent casing)  
-           - Non-critical typos in descriptive fields  
-           - Timestamps missing seconds if not strictly required  
-           - Slight deviations from naming conventions  
-           - Use of alternative terminology that is still understandable
-
-    5. **Summary Text**
-       - After evaluating all records, produce a **verbal executive summary** describing the overall data quality, key trends, and any significant risks.
-       - Your summary should **generally be short (5–6 sentences)** if the data are mostly compliant or have simple issues.
-       - If the data contain numerous or severe deviations, expand the summary as needed to clearly communicate important details. You may use **up to 15 sentences** if necessary.
-       - The goal is to ensure the recipient understands the criticality and context of the findings without reviewing all individual deviations.
-
-    6. **Deviation Type Severity Mapping**
-       - For known deviation types, **always assign the following severity**, overriding other definitions if there is any conflict:
-           - Missing Required Step: Critical
-           - Grossly Incorrect Quantity: Critical
-           - Conflicting Status Code: Critical
-           - Negative Quantity: Critical
-           - Slightly Out of Range Quantity: Moderate
-           - Incomplete Operator Name: Moderate
-           - Non-Standard Timestamp: Moderate
-           - Duplicate Record: Moderate
-           - Minor Formatting Error: Minor
-           - Non-Critical Typo: Minor
-       - If a deviation does not fit these mappings, classify it using your best judgment.
-
-    7. **Structured Output Format**
-       - Return a single valid JSON object with the following schema:
-
-    {
-        "summary_text": "<short verbal summary here>",
-        "data_quality_score": <integer from 1 to 10>,
-        "records": [
-            {
-                "id": "<record id>",
-                "deviations": [
-                    {
-                        "type": "<Deviation Type>",
-                        "severity": "<Severity Level>",
-                        "description": "<Detailed explanation>"
-                    }
-                    ...
-                ]
-            },
-            ...
-        ]
-    }
-
-    - If no deviations are found for a record, include the record in the array with an empty deviations list.
-    - Do not include any additional commentary or explanation outside this JSON.
-    """)
+    dataset_id = ""
+    if config.INCREMENTAL_AUDIT:
+        dataset_id = st.text_input(
+            "🗂️ Dataset ID (optional)",
+            help="Name of the dataset this file is a version of. Re-audits under the same ID (shared by all "
+                 "users of this app) only send added or changed records and list the changes since the last "
+                 "audit. Leave empty to audit the file on its own."
+        ).strip()
 
     # Expander for System Prompt
     with st.expander("🛠️ Advanced Settings – System Prompt"):
         system_prompt = st.text_area(
             "System Prompt:",
-            value=default_system_prompt,
+            value=DEFAULT_SYSTEM_PROMPT,
             height=68
         )
 
@@ -141,7 +37,7 @@ def display_controls():
     with st.expander("📝 Advanced Settings – User Prompt"):
         user_prompt = st.text_area(
             "User Prompt:",
-            value=default_user_prompt,
+            value=DEFAULT_USER_PROMPT,
             height=700
         )
 
@@ -151,4 +47,33 @@ def display_controls():
         help="Click to upload a file. Only .json or .csv formats are supported."
     )
 
-    return uploaded_file, num_entries, model, system_prompt, user_prompt
\ No newline at end of file
+    return uploaded_file, model, system_prompt, user_prompt, use_cache, dataset_id or None
+
+
+def display_dataset_controls(dataset):
+    """
+    Show the preview of a parsed upload and return the number of records to audit.
+    Both work off the cached dataset summary, so reruns don't touch the file.
+    """
+    count = min(dataset["count"], config.MAX_ENTRIES)
+    st.caption(f"{dataset['count']:,} records, {dataset['size'] / 1024 / 1024:.1f} MB")
+
+    with st.expander(f"🔎 Preview (first {len(dataset['preview'])} records)"):
+        preview = dataset["preview"]
+        if all(isinstance(record, dict) and not any(isinstance(value, (dict, list)) for value in record.values())
+               for record in preview):
+            st.dataframe(preview)
+        else:
+            st.json(preview, expanded=False)
+
+    if count <= 1:
+        return count
+
+    # Default number of entries evaluated from the file
+    return st.slider(
+        "🔢 Number of records to process from file:",
+        min_value=1,
+        max_value=count,
+        value=count,
+        help="Controls how many records to evaluate in this run."
+    )
\ No newline at end of file
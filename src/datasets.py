@@ -0,0 +1,106 @@
+# =====================================
+# File: datasets.py
+# Description:
+#   Summaries of uploaded datasets (record count, preview rows, parse
+#   errors), memoised per process by a streaming BLAKE2 hash of the file
+#   content. The app hashes and scans an upload once; Streamlit reruns and
+#   other sessions uploading the same file reuse the summary. Records are
+#   streamed, never kept: audits stream the file again (see ingest.py).
+# =====================================
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import config
+from src.ingest import READ_BLOCK_SIZE, contains_null_bytes, iter_record_batches
+from src.metrics import span
+
+# Records shown in the preview of an upload
+PREVIEW_ROWS = 20
+# Dataset summaries kept, least recently used first out
+MAX_DATASETS = 256
+
+_lock = threading.Lock()
+_datasets = OrderedDict()
+
+
+def content_hash(source) -> str:
+    """
+    BLAKE2b hash of a binary file-like object, read block by block. The source is rewound.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    try:
+        while block := source.read(READ_BLOCK_SIZE):
+            digest.update(block)
+    finally:
+        source.seek(0)
+    return digest.hexdigest()
+
+
+def cached_dataset(digest):
+    """
+    Return the cached dataset summary of a content hash, or None.
+    """
+    with _lock:
+        dataset = _datasets.get(digest)
+        if dataset is not None:
+            _datasets.move_to_end(digest)
+        return dataset
+
+
+def load_dataset(source, file_type, digest=None):
+    """
+    Return the summary of a binary file-like source (JSON or CSV) as a dict:
+    digest, file_type, size (bytes), count, preview and error.
+    The file is streamed once per content hash, so memory stays flat regardless
+    of its size; files that can't be parsed are cached with their error message.
+    The source is rewound.
+    """
+    digest = digest or content_hash(source)
+    dataset = cached_dataset(digest)
+    if dataset is not None and dataset["file_type"] == file_type:
+        return dataset
+
+    dataset = {"digest": digest, "file_type": file_type, "size": 0, "count": 0,
+               "preview": [], "error": None}
+    try:
+        if contains_null_bytes(source):
+            dataset["error"] = ("The uploaded file contains binary data or embedded null bytes. "
+                                "Please upload a clean UTF-8 text file.")
+        else:
+            dataset["count"], dataset["preview"] = _scan(source, file_type)
+    except UnicodeDecodeError:
+        dataset["error"] = "The uploaded file is not valid UTF-8 text. Please re-save it as UTF-8 encoding and try again."
+    except Exception as e:
+        dataset["error"] = f"The uploaded file could not be parsed: {e}"
+    finally:
+        dataset["size"] = source.seek(0, 2)
+        source.seek(0)
+
+    _store(dataset)
+    logging.info(f"Parsed dataset {digest[:12]}: {dataset['count']} records, {dataset['size']} bytes")
+    return dataset
+
+
+def _scan(source, file_type):
+    # Count the records batch by batch, keeping only the first PREVIEW_ROWS
+    count = 0
+    preview = []
+    with span("parse", records=0, bytes=0) as fields:
+        for batch in iter_record_batches(source, file_type, config.INGEST_BATCH_SIZE):
+            if len(preview) < PREVIEW_ROWS:
+                preview.extend(batch[:PREVIEW_ROWS - len(preview)])
+            count += len(batch)
+        fields["records"] = count
+        fields["bytes"] = source.tell()
+    return count, preview
+
+
+def _store(dataset):
+    with _lock:
+        _datasets[dataset["digest"]] = dataset
+        _datasets.move_to_end(dataset["digest"])
+        while len(_datasets) > MAX_DATASETS:
+            _datasets.popitem(last=False)
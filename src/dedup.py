@@ -0,0 +1,155 @@
+# =====================================
+# File: dedup.py
+# Description:
+#   Groups identical and near-identical records before the LLM audit.
+#   Records that differ only in their id and volatile (timestamp) values
+#   share a signature; one representative per group is audited and its
+#   findings are expanded back to every member with the ids rewritten.
+# =====================================
+
+import hashlib
+import json
+import re
+from datetime import datetime
+
+import config
+
+ID_FIELDS = ("id", "recipe_id")
+_DIGITS = str.maketrans("0123456789", "9999999999")
+
+
+def _record_id(record):
+    rec_id = next((record[field] for field in ID_FIELDS if field in record), None)
+    if rec_id is None or (isinstance(rec_id, float) and rec_id != rec_id):
+        return None
+    return rec_id
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+
+def _mask(value, volatile_fields):
+    if isinstance(value, dict):
+        masked = {}
+        times = []
+        validity = []
+        for key, item in value.items():
+            if key in ID_FIELDS:
+                continue
+            if key in volatile_fields and not isinstance(item, (dict, list)):
+                # Keep the format (digits masked) so format findings still group correctly
+                masked[key] = None if item is None else str(item).translate(_DIGITS)
+                parsed = _parse_time(item) if item is not None else None
+                if parsed is not None:
+                    times.append((parsed.replace(tzinfo=None), key))
+                # Which values parse, so an invalid start and an invalid end don't group
+                validity.append([key, parsed is not None])
+            else:
+                masked[key] = _mask(item, volatile_fields)
+        if validity:
+            masked["~valid"] = sorted(validity)
+        if len(times) > 1:
+            # Keep the order of the timestamps so sequence findings still group correctly
+            ordered = sorted(times)
+            masked["~order"] = [
+                [key, ordered[index - 1][0] == moment if index else False]
+                for index, (moment, key) in enumerate(ordered)
+            ]
+        return masked
+    if isinstance(value, list):
+        return [_mask(item, volatile_fields) for item in value]
+    return value
+
+
+def record_signature(record, volatile_fields=None) -> str:
+    """
+    Normalised signature of a record with ids and volatile values masked.
+    """
+    if volatile_fields is None:
+        volatile_fields = config.DEDUP_VOLATILE_FIELDS
+    payload = json.dumps(_mask(record, set(volatile_fields)), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def group_records(records):
+    """
+    Group records by signature.
+    Returns (representatives, groups) where groups maps the id of each
+    representative to its members as (position, record), representative first.
+    Records without an id, or whose id occurs more than once, are never grouped.
+    """
+    id_counts = {}
+    for record in records:
+        if isinstance(record, dict):
+            rec_id = _record_id(record)
+            if rec_id is not None:
+                id_counts[str(rec_id)] = id_counts.get(str(rec_id), 0) + 1
+
+    representatives = []
+    groups = {}
+    by_signature = {}
+    for position, record in enumerate(records):
+        rec_id = _record_id(record) if isinstance(record, dict) else None
+        if rec_id is None or id_counts[str(rec_id)] > 1:
+            representatives.append(record)
+            continue
+        signature = record_signature(record)
+        rep_id = by_signature.get(signature)
+        if rep_id is None:
+            by_signature[signature] = str(rec_id)
+            groups[str(rec_id)] = [(position, record)]
+            representatives.append(record)
+        else:
+            groups[rep_id].append((position, record))
+    return representatives, groups
+
+
+def _rewrite(result_record, representative, member, volatile_fields):
+    member_id = _record_id(member)
+    replacements = [(str(_record_id(representative)), str(member_id))]
+    replacements.extend(
+        (str(representative[key]), str(member[key]))
+        for key in volatile_fields
+        if key in representative and key in member and representative[key] is not None
+        and str(representative[key]) and representative[key] != member[key]
+    )
+
+    def rewrite_text(text):
+        for old, new in replacements:
+            # Whole values only, so rewriting R1 doesn't touch R10
+            text = re.sub(rf"(?<![\w.:-]){re.escape(old)}(?!\w|[.:-]\w)", lambda _: new, text)
+        return text
+
+    deviations = [
+        {**dev, "description": rewrite_text(dev["description"])} if isinstance(dev.get("description"), str) else dict(dev)
+        for dev in result_record.get("deviations") or []
+    ]
+    return {**result_record, "id": member_id, "deviations": deviations}
+
+
+def expand_results(result_records, groups):
+    """
+    Expand the results of representatives to every member of their group,
+    with ids (and the representative's volatile values in descriptions)
+    rewritten, in original record order.
+    """
+    volatile_fields = config.DEDUP_VOLATILE_FIELDS
+    expanded = []
+    ungrouped = []
+    for rec in result_records:
+        members = groups.get(str(rec.get("id")))
+        if not members:
+            ungrouped.append(rec)
+            continue
+        representative = members[0][1]
+        expanded.append((members[0][0], rec))
+        expanded.extend(
+            (position, _rewrite(rec, representative, member, volatile_fields))
+            for position, member in members[1:]
+        )
+    expanded.sort(key=lambda item: item[0])
+    return [rec for _, rec in expanded] + ungrouped
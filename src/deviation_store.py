@@ -0,0 +1,176 @@
+# =====================================
+# File: deviation_store.py
+# Description:
+#   Compact columnar form of the deviations of audited records.
+#   One row per deviation with its record index, position in the record,
+#   interned deviation-type code and severity code (numpy arrays), so
+#   severity re-mapping, counts, top types and severity sorting run
+#   vectorised instead of walking the nested records.
+# =====================================
+
+import numpy as np
+import pandas as pd
+
+from src.severity import (
+    SEVERITY_LEVELS,
+    UNKNOWN_SEVERITY,
+    canonical_types,
+    normalize_label,
+    severity_codes,
+    type_severity_codes,
+)
+
+# Deviation types listed per severity in the summary stats
+TOP_TYPES_LIMIT = 10
+# Deviation types named in the summary text of a merged audit
+SUMMARY_TYPES_LIMIT = 5
+
+
+def _factorize(values):
+    # Codes and unique values of a column of labels; non-string labels count as missing
+    try:
+        return pd.factorize(np.array(values, dtype=object), use_na_sentinel=False)
+    except TypeError:
+        values = [value if isinstance(value, str) else None for value in values]
+        return pd.factorize(np.array(values, dtype=object), use_na_sentinel=False)
+
+
+def build_store(records) -> dict:
+    """
+    Build the columnar store of the deviations of records.
+    Texts (descriptions) stay in the records; row i is
+    records[store["record"][i]]["deviations"][store["position"][i]].
+    """
+    deviation_lists = [rec.get("deviations") or [] for rec in records]
+    deviations = [dev for devs in deviation_lists for dev in devs]
+    lengths = np.fromiter(map(len, deviation_lists), dtype=np.int64, count=len(deviation_lists))
+    record_index = np.repeat(np.arange(len(deviation_lists), dtype=np.int32), lengths)
+    starts = np.cumsum(lengths) - lengths
+    position = (np.arange(len(record_index)) - np.repeat(starts, lengths)).astype(np.int32)
+
+    # Intern raw types, then merge those with the same normalised label
+    raw_codes, raw_types = _factorize([dev.get("type") for dev in deviations])
+    type_names = []
+    type_severity = []
+    codes_by_label = {}
+    raw_to_code = np.empty(len(raw_types), dtype=np.int32)
+    for index, raw_type in enumerate(raw_types):
+        label = normalize_label(raw_type) if isinstance(raw_type, str) else ""
+        code = codes_by_label.get(label)
+        if code is None:
+            code = codes_by_label[label] = len(type_names)
+            type_names.append(canonical_types.get(label) or (raw_type.strip() if label else "Unknown"))
+            type_severity.append(type_severity_codes.get(label, -1))
+        raw_to_code[index] = code
+
+    raw_codes_severity, raw_severities = _factorize([dev.get("severity") for dev in deviations])
+    severity_of_raw = []
+    canonical_of_raw = []
+    for raw_severity in raw_severities:
+        if isinstance(raw_severity, str):
+            code = severity_codes.get(normalize_label(raw_severity), UNKNOWN_SEVERITY)
+        else:
+            code = UNKNOWN_SEVERITY
+        severity_of_raw.append(code)
+        canonical_of_raw.append(code < UNKNOWN_SEVERITY and raw_severity == SEVERITY_LEVELS[code])
+
+    return {
+        "record_count": len(deviation_lists),
+        "record": record_index,
+        "position": position,
+        "type": raw_to_code[raw_codes],
+        "severity": np.array(severity_of_raw, dtype=np.int8)[raw_codes_severity],
+        "canonical": np.array(canonical_of_raw, dtype=bool)[raw_codes_severity],
+        "type_names": type_names,
+        # Severity code of each interned type from severity_mapping, -1 if unmapped
+        "type_severity": np.array(type_severity, dtype=np.int8),
+    }
+
+
+def remap_severities(store):
+    """
+    Re-apply the severity mapping of deviation types to the store.
+    Returns the rows whose severity label must be rewritten in the records.
+    """
+    mapped = store["type_severity"][store["type"]]
+    severity = np.where(mapped >= 0, mapped, store["severity"]).astype(np.int8)
+    changed = np.flatnonzero(
+        (severity < UNKNOWN_SEVERITY) & ((severity != store["severity"]) | ~store["canonical"])
+    )
+    store["severity"] = severity
+    store["canonical"] = store["canonical"] | (severity < UNKNOWN_SEVERITY)
+    return changed
+
+
+def write_severities(store, records, rows):
+    """
+    Write the canonical severity labels of the given rows back to the records.
+    """
+    for rec_index, position, code in zip(
+        store["record"][rows].tolist(), store["position"][rows].tolist(), store["severity"][rows].tolist()
+    ):
+        records[rec_index]["deviations"][position]["severity"] = SEVERITY_LEVELS[code]
+
+
+def severity_counts(store) -> dict:
+    """
+    Number of deviations per severity ("critical", "moderate", "minor").
+    """
+    counts = np.bincount(store["severity"], minlength=UNKNOWN_SEVERITY + 1)
+    return {level.lower(): int(counts[code]) for code, level in enumerate(SEVERITY_LEVELS)}
+
+
+def record_deviation_counts(store):
+    """
+    Number of deviations of every record, as an array indexed by record.
+    """
+    return np.bincount(store["record"], minlength=store["record_count"])
+
+
+def top_types(store, severity, limit=TOP_TYPES_LIMIT) -> dict:
+    """
+    The most common deviation types of a severity, as {type: count} in
+    descending order (ties in order of first appearance).
+    """
+    code = SEVERITY_LEVELS.index(severity)
+    counts = np.bincount(store["type"][store["severity"] == code], minlength=len(store["type_names"]))
+    present = np.flatnonzero(counts)
+    ranked = present[np.argsort(-counts[present], kind="stable")][:limit]
+    return {store["type_names"][index]: int(counts[index]) for index in ranked.tolist()}
+
+
+def findings_summary(records, limit=SUMMARY_TYPES_LIMIT) -> str:
+    """
+    Summary text of audited records built from their counts: records with
+    deviations, deviations per severity and the most common deviation types.
+    """
+    store = build_store(records)
+    remap_severities(store)
+    total = store["record_count"]
+    flagged = int(np.count_nonzero(record_deviation_counts(store)))
+    if not flagged:
+        return f"All {total} audited records are fully compliant."
+
+    counts = np.bincount(store["type"], minlength=len(store["type_names"]))
+    present = np.flatnonzero(counts)
+    ranked = present[np.argsort(-counts[present], kind="stable")][:limit]
+    common = ", ".join(f"{store['type_names'][index]} ({int(counts[index])})" for index in ranked.tolist())
+    severities = severity_counts(store)
+    return (
+        f"{flagged} of {total} audited records have deviations: {severities['critical']} critical, "
+        f"{severities['moderate']} moderate and {severities['minor']} minor. "
+        f"Most common deviation types: {common}."
+    )
+
+
+def records_by_severity(store):
+    """
+    Indices of the records with deviations, sorted by their most severe
+    deviation (stable, so records of equal severity keep their order).
+    """
+    records = store["record"]
+    if not len(records):
+        return records
+    starts = np.flatnonzero(np.r_[True, records[1:] != records[:-1]])
+    most_severe = np.minimum.reduceat(store["severity"], starts)
+    return records[starts][np.argsort(most_severe, kind="stable")]
@@ -1,32 +1,322 @@
+# =====================================
+# File: generate_test_recipes.py
+# Description:
+#   Synthetic test data generator for throughput and detection-accuracy
+#   benchmarks. Streams any number of records of the recipe/steps schema
+#   or the flat test_data schema to JSON, JSONL or CSV, in parallel
+#   shards across processes and reproducibly from a seed. Deviations of
+#   every severity_mapping type are injected at configurable rates and
+#   listed in a ground-truth label file (JSONL, one line per deviation).
+#
+#   Usage: python src/generate_test_recipes.py --schema flat --count 1000000 --format csv \
+#              --rate 0.005 --type-rate "Negative Quantity=0.02" -o flat_1m.csv
+# =====================================
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import argparse
+import csv
 import json
 import random
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from src.severity import severity_mapping
+
+SCHEMAS = ("recipe", "flat")
+FORMATS = ("json", "jsonl", "csv")
+# Records per shard; shards (not workers) are seeded, so output doesn't depend on --workers
+SHARD_SIZE = 20000
 
-def generate_recipe(i):
+FLAT_COLUMNS = [
+    "id", "material_code", "process_step", "quantity_kg", "start_time", "end_time", "status", "notes", "operator",
+]
+PROCESS_STEPS = ["weighing", "mixing", "heating", "filtering", "filling", "cooling"]
+# Clean values stay within what the rule pre-screening accepts (src/rules.py, which needs config to import)
+ALLOWED_STATUSES = ["in progress", "completed"]
+QUANTITY_MAX_KG = 1000.0
+QUANTITY_TOLERANCE = 1.1
+OPERATORS = ["John Doe", "Jane Smith", "Alice Brown", "Bob Johnson", "Michael Ruiz"]
+QUANTITY_RANGE = (1.0, QUANTITY_MAX_KG)
+TEMPERATURE_RANGE = (20, 100)
+BASE_TIME = datetime(2025, 1, 1)
+
+
+def generate_recipe(i, rng=random):
+    """
+    A clean record of the recipe/steps schema.
+    """
     return {
         "recipe_id": f"RCP-{i:06d}",
-        "product_name": f"Product {random.randint(1, 500)}",
-        "batch_size": f"{random.randint(50, 1000)} L",
+        "product_name": f"Product {rng.randint(1, 500)}",
+        "batch_size": f"{rng.randint(50, 1000)} L",
         "steps": [
             {
                 "step_number": s,
-                "description": f"Step {s} description with details about operation {random.randint(1, 10)}.",
-                "duration_minutes": random.randint(5, 120)
+                "description": f"Step {s} description with details about operation {rng.randint(1, 10)}.",
+                "duration_minutes": rng.randint(5, 120)
             }
-            for s in range(1, random.randint(3, 6))
+            for s in range(1, rng.randint(3, 6))
         ],
         "parameters": {
-            "target_temperature_celsius": random.randint(20, 100),
-            "ph_range": f"{round(random.uniform(6.0, 7.5),1)} - {round(random.uniform(7.6,8.5),1)}",
-            "operator": random.choice(["John Doe", "Jane Smith", "Alice Brown", "Bob Johnson"])
+            "target_temperature_celsius": rng.randint(*TEMPERATURE_RANGE),
+            "ph_range": f"{round(rng.uniform(6.0, 7.5), 1)} - {round(rng.uniform(7.6, 8.5), 1)}",
+            "operator": rng.choice(OPERATORS)
         },
         "notes": f"This is a test recipe record #{i} for cost estimation."
     }
 
-def main():
-    records = [generate_recipe(i) for i in range(1, 1001)]
-    with open("test_recipes_1000.json", "w") as f:
-        json.dump(records, f, indent=2)
+
+def generate_flat_record(i, rng=random):
+    """
+    A clean record of the flat test_data schema.
+    """
+    start = BASE_TIME + timedelta(seconds=rng.randint(0, 365 * 86400))
+    return {
+        "id": f"REC-{i:07d}",
+        "material_code": f"MAT{rng.randint(0, 9999):04d}",
+        "process_step": rng.choice(PROCESS_STEPS),
+        "quantity_kg": round(rng.uniform(*QUANTITY_RANGE), 1),
+        "start_time": start.isoformat(timespec="seconds"),
+        "end_time": (start + timedelta(minutes=rng.randint(10, 180))).isoformat(timespec="seconds"),
+        "status": rng.choice(ALLOWED_STATUSES),
+        "notes": f"Batch record #{i}.",
+        "operator": rng.choice(OPERATORS),
+    }
+
+
+def _time(value):
+    return datetime.fromisoformat(value)
+
+
+# Deviation injectors per schema: type -> function(record, rng, previous) returning the affected field.
+# Types without a matching field in a schema are not injected into it.
+FLAT_INJECTORS = {
+    # Critical
+    "Missing Required Step": lambda r, g, p: r.update(
+        process_step="filling", notes="Mixing was not performed before filling."
+    ) or "process_step",
+    "Grossly Incorrect Quantity": lambda r, g, p: r.update(
+        quantity_kg=round(QUANTITY_MAX_KG * g.uniform(5, 1000), 1)
+    ) or "quantity_kg",
+    "Conflicting Status Code": lambda r, g, p: r.update(status="completed", end_time=None) or "status",
+    "Negative Quantity": lambda r, g, p: r.update(quantity_kg=-r["quantity_kg"]) or "quantity_kg",
+    "Data Conflict": lambda r, g, p: r.update(notes=f"Quantity recorded as 0 kg; {r['notes']}") or "notes",
+    "Invalid Status": lambda r, g, p: r.update(status=f"status_{g.randint(10, 99)}") or "status",
+    "Step Contradicts Approved Recipe": lambda r, g, p: r.update(process_step="unapproved rework") or "process_step",
+    "Potential Falsification": lambda r, g, p: r.update(notes="Backdated entry; values copied from the previous batch.") or "notes",
+    "Timestamp Sequence Error": lambda r, g, p: r.update(
+        end_time=(_time(r["start_time"]) - timedelta(minutes=g.randint(10, 120))).isoformat(timespec="seconds")
+    ) or "end_time",
+    "Missing Mandatory Field": lambda r, g, p: r.update(material_code=None) or "material_code",
+    # Moderate
+    "Slightly Out of Range Quantity": lambda r, g, p: r.update(
+        quantity_kg=round(QUANTITY_MAX_KG * g.uniform(1.01, QUANTITY_TOLERANCE), 1)
+    ) or "quantity_kg",
+    "Incomplete Operator Name": lambda r, g, p: r.update(operator=r["operator"].split()[0]) or "operator",
+    "Non-Standard Timestamp": lambda r, g, p: r.update(
+        start_time=_time(r["start_time"]).strftime("%Y/%m/%d %H:%M:%S")
+    ) or "start_time",
+    "Duplicate Record": lambda r, g, p: (r.clear() or r.update(p)) or "id",
+    "Use of Deprecated Process Code": lambda r, g, p: r.update(
+        material_code=f"OLD-{r['material_code'] or 'MAT0000'}"
+    ) or "material_code",
+    "Inconsistent Sequencing": lambda r, g, p: r.update(process_step="filling before mixing") or "process_step",
+    "Missing Recommended Field": lambda r, g, p: r.update(notes=None) or "notes",
+    "Format Error": lambda r, g, p: r.update(quantity_kg=f"{r['quantity_kg']:.1f} kg".replace(".", ",")) or "quantity_kg",
+    "Value Out of Range": lambda r, g, p: r.update(quantity_kg=0.0) or "quantity_kg",
+    "Invalid Date Format": lambda r, g, p: r.update(start_time=f"2025-02-{g.randint(30, 31)}T10:00:00") or "start_time",
+    "Partial Data Entry": lambda r, g, p: r.update(end_time=None, operator=None) or "end_time",
+    "Data Inconsistency": lambda r, g, p: r.update(
+        notes=f"Operator on shift: {g.choice([o for o in OPERATORS if o != r['operator']])}."
+    ) or "notes",
+    # Minor
+    "Minor Formatting Error": lambda r, g, p: r.update(material_code=f"{r['material_code'][:3]}-{r['material_code'][3:]}") or "material_code",
+    "Non-Critical Typo": lambda r, g, p: r.update(notes=r["notes"].replace("Batch", "Bacth")) or "notes",
+    "Slight Naming Deviation": lambda r, g, p: r.update(process_step=f"{r['process_step']} step") or "process_step",
+    "Extra Spaces": lambda r, g, p: r.update(operator=f" {r['operator'].replace(' ', '  ')} ") or "operator",
+    "Alternative Terminology": lambda r, g, p: r.update(status="done" if r["status"] == "completed" else "ongoing") or "status",
+    "Timestamps Missing Seconds": lambda r, g, p: r.update(end_time=r["end_time"][:16]) or "end_time",
+    "Inconsistent Casing": lambda r, g, p: r.update(status=r["status"].upper()) or "status",
+}
+
+RECIPE_INJECTORS = {
+    # Critical
+    "Missing Required Step": lambda r, g, p: r["steps"].pop(1) and "steps",
+    "Grossly Incorrect Quantity": lambda r, g, p: r.update(batch_size=f"{int(r['batch_size'].split()[0]) * 1000} L") or "batch_size",
+    "Negative Quantity": lambda r, g, p: r["steps"][0].update(duration_minutes=-r["steps"][0]["duration_minutes"]) or "steps",
+    "Data Conflict": lambda r, g, p: r.update(notes=f"Batch size confirmed as 5 L. {r['notes']}") or "notes",
+    "Step Contradicts Approved Recipe": lambda r, g, p: r["steps"][-1].update(
+        description="Skip filtration and proceed directly to filling."
+    ) or "steps",
+    "Potential Falsification": lambda r, g, p: [s.update(duration_minutes=60) for s in r["steps"]] and r.update(
+        notes="Values copied from the previous batch record."
+    ) or "steps",
+    "Missing Mandatory Field": lambda r, g, p: r.pop("product_name") and "product_name",
+    # Moderate
+    "Slightly Out of Range Quantity": lambda r, g, p: r["parameters"].update(
+        target_temperature_celsius=TEMPERATURE_RANGE[1] + g.randint(1, 5)
+    ) or "parameters.target_temperature_celsius",
+    "Incomplete Operator Name": lambda r, g, p: r["parameters"].update(
+        operator=r["parameters"]["operator"][0] + "."
+    ) or "parameters.operator",
+    "Duplicate Record": lambda r, g, p: (r.clear() or r.update(json.loads(json.dumps(p)))) or "recipe_id",
+    "Use of Deprecated Process Code": lambda r, g, p: r["steps"][0].update(
+        description="Run legacy process code PRC-OLD-07."
+    ) or "steps",
+    "Inconsistent Sequencing": lambda r, g, p: r["steps"].reverse() or "steps",
+    "Missing Recommended Field": lambda r, g, p: r.pop("notes") and "notes",
+    "Format Error": lambda r, g, p: r.update(batch_size=f"{r['batch_size'].split()[0]}L") or "batch_size",
+    "Value Out of Range": lambda r, g, p: r["parameters"].update(ph_range="3.1 - 12.8") or "parameters.ph_range",
+    "Partial Data Entry": lambda r, g, p: r["steps"][-1].update(description="", duration_minutes=None) or "steps",
+    "Data Inconsistency": lambda r, g, p: r.update(batch_size=f"{r['batch_size'].split()[0]} kg") or "batch_size",
+    # Minor
+    "Minor Formatting Error": lambda r, g, p: r["parameters"].update(
+        ph_range=r["parameters"]["ph_range"].replace(" - ", "-")
+    ) or "parameters.ph_range",
+    "Non-Critical Typo": lambda r, g, p: r["steps"][0].update(
+        description=r["steps"][0]["description"].replace("description", "descripton")
+    ) or "steps",
+    "Slight Naming Deviation": lambda r, g, p: r.update(product_name=r["product_name"].replace("Product", "Prod.")) or "product_name",
+    "Extra Spaces": lambda r, g, p: r.update(product_name=f" {r['product_name'].replace(' ', '  ')} ") or "product_name",
+    "Alternative Terminology": lambda r, g, p: r.update(batch_size=r["batch_size"].replace(" L", " litres")) or "batch_size",
+    "Inconsistent Casing": lambda r, g, p: r.update(product_name=r["product_name"].upper()) or "product_name",
+}
+
+SCHEMA_SPECS = {
+    "recipe": (generate_recipe, RECIPE_INJECTORS, "recipe_id"),
+    "flat": (generate_flat_record, FLAT_INJECTORS, "id"),
+}
+
+
+def _serialize(record, fmt):
+    if fmt == "csv":
+        return [("" if record.get(column) is None else record.get(column)) for column in FLAT_COLUMNS]
+    return json.dumps(record, ensure_ascii=False)
+
+
+def generate_shard(schema, fmt, seed, shard, start, count, rates, part_dir):
+    """
+    Generate records start..start+count-1 (one shard) into a part file and a label file.
+    Each record gets at most one injected deviation, drawn with the configured rates.
+    Returns (data path, labels path, number of injected deviations).
+    """
+    make_record, injectors, id_field = SCHEMA_SPECS[schema]
+    rng = random.Random(f"{seed}-{schema}-{shard}")
+    types = [dev_type for dev_type in injectors if rates.get(dev_type, 0) > 0]
+    weights = [rates[dev_type] for dev_type in types]
+    total_rate = sum(weights)
+
+    data_path = os.path.join(part_dir, f"part-{shard:06d}.data")
+    labels_path = os.path.join(part_dir, f"part-{shard:06d}.labels")
+    injected = 0
+    previous = None
+    with open(data_path, "w", encoding="utf-8", newline="") as data, open(labels_path, "w", encoding="utf-8") as labels:
+        writer = csv.writer(data, lineterminator="\n") if fmt == "csv" else None
+        for index in range(start, start + count):
+            record = make_record(index + 1, rng)
+            if types and rng.random() < total_rate:
+                dev_type = rng.choices(types, weights)[0]
+                if dev_type != "Duplicate Record" or previous is not None:
+                    field = injectors[dev_type](record, rng, previous)
+                    labels.write(json.dumps({
+                        "index": index,
+                        "id": record.get(id_field),
+                        "type": dev_type,
+                        "severity": severity_mapping[dev_type],
+                        "field": field,
+                    }, ensure_ascii=False) + "\n")
+                    injected += 1
+            previous = record
+            if writer:
+                writer.writerow(_serialize(record, fmt))
+            elif fmt == "json":
+                data.write(("" if index == start else ",\n") + _serialize(record, fmt))
+            else:
+                data.write(_serialize(record, fmt) + "\n")
+    return data_path, labels_path, injected
+
+
+def generate(schema, count, fmt, output, labels_output, seed=0, rates=None, workers=1, shard_size=SHARD_SIZE):
+    """
+    Generate count records into output and their ground-truth labels into labels_output.
+    Shards are generated in parallel and streamed into the output in order.
+    Returns the number of injected deviations.
+    """
+    if fmt == "csv" and schema != "flat":
+        raise ValueError("CSV output needs the flat schema (recipes have nested steps).")
+    rates = rates or {}
+    shards = [(shard, start, min(shard_size, count - start)) for shard, start in enumerate(range(0, count, shard_size))]
+    injected = 0
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output))) as part_dir, \
+            open(output, "w", encoding="utf-8", newline="") as out, \
+            open(labels_output, "w", encoding="utf-8") as labels_out, \
+            ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        if fmt == "json":
+            out.write("[\n")
+        elif fmt == "csv":
+            csv.writer(out, lineterminator="\n").writerow(FLAT_COLUMNS)
+        futures = [
+            executor.submit(generate_shard, schema, fmt, seed, shard, start, size, rates, part_dir)
+            for shard, start, size in shards
+        ]
+        for position, future in enumerate(futures):
+            data_path, labels_path, shard_injected = future.result()
+            injected += shard_injected
+            if fmt == "json" and position:
+                out.write(",\n")
+            for path, target in ((data_path, out), (labels_path, labels_out)):
+                with open(path, encoding="utf-8", newline="") as part:
+                    shutil.copyfileobj(part, target)
+                os.remove(path)
+        if fmt == "json":
+            out.write("\n]\n")
+    return injected
+
+
+def _parse_rates(default_rate, overrides):
+    rates = {dev_type: default_rate for dev_type in severity_mapping}
+    for override in overrides or []:
+        dev_type, _, rate = override.rpartition("=")
+        if dev_type not in severity_mapping:
+            raise ValueError(f"Unknown deviation type '{dev_type}'. Must be one of: {', '.join(severity_mapping)}.")
+        rates[dev_type] = float(rate)
+    return rates
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Generate synthetic recipe data with injected deviations.")
+    parser.add_argument("--schema", choices=SCHEMAS, default="recipe")
+    parser.add_argument("-n", "--count", type=int, default=1000)
+    parser.add_argument("-f", "--format", choices=FORMATS, default="json")
+    parser.add_argument("-o", "--output", help="Data file (default: test_<schema>_<count>.<format>).")
+    parser.add_argument("--labels", help="Ground-truth label file (default: <output>.labels.jsonl).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate", type=float, default=0.005,
+                        help="Share of records receiving each deviation type (0 for clean data).")
+    parser.add_argument("--type-rate", action="append", metavar="TYPE=RATE",
+                        help="Rate of one deviation type, e.g. \"Negative Quantity=0.02\" (repeatable).")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    output = args.output or f"test_{args.schema}_{args.count}.{args.format}"
+    labels_output = args.labels or f"{os.path.splitext(output)[0]}.labels.jsonl"
+    try:
+        rates = _parse_rates(args.rate, args.type_rate)
+        injected = generate(args.schema, args.count, args.format, output, labels_output, args.seed, rates, args.workers)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    print(f"Wrote {args.count} {args.schema} records to {output} ({injected} injected deviations in {labels_output})")
+    return 0
+
 
 if __name__ == "__main__":
-    main()
-    
\ No newline at end of file
+    sys.exit(main())
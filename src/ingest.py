@@ -0,0 +1,163 @@
+# =====================================
+# File: ingest.py
+# Description:
+#   Streaming ingestion of uploaded JSON and CSV files.
+#   Parses JSON arrays incrementally and reads CSVs in chunks,
+#   yielding batches of records without materialising the whole file.
+# =====================================
+
+import io
+import json
+from contextlib import contextmanager
+
+from src.metrics import span
+
+READ_BLOCK_SIZE = 1024 * 1024
+_WHITESPACE = " \t\r\n"
+# Characters that may continue a JSON number
+_NUMBER_CHARS = "0123456789+-.eE"
+
+
+@contextmanager
+def _text_stream(source):
+    """
+    Wrap a binary file-like object as a strict UTF-8 text stream.
+    Text streams and strings are accepted as they are.
+    The wrapper is detached afterwards so the caller's file stays open.
+    """
+    if isinstance(source, str):
+        yield io.StringIO(source)
+    elif isinstance(source, io.TextIOBase):
+        yield source
+    else:
+        wrapper = io.TextIOWrapper(source, encoding="utf-8", errors="strict", newline="")
+        try:
+            yield wrapper
+        finally:
+            wrapper.detach()
+
+
+def contains_null_bytes(binary_file) -> bool:
+    """
+    Scan a binary file-like object for null bytes block by block and rewind it.
+    """
+    with span("decode", bytes=0) as fields:
+        try:
+            while True:
+                block = binary_file.read(READ_BLOCK_SIZE)
+                if not block:
+                    return False
+                fields["bytes"] += len(block)
+                if b"\x00" in block:
+                    return True
+        finally:
+            binary_file.seek(0)
+
+
+def iter_json_records(source):
+    """
+    Yield the elements of a top-level JSON array one at a time.
+    A top-level object is yielded as a single record.
+    """
+    with _text_stream(source) as stream:
+        yield from _iter_json_stream(stream)
+
+
+def _iter_json_stream(stream):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        block = stream.read(READ_BLOCK_SIZE)
+        if not block:
+            eof = True
+        buffer = buffer[position:] + block
+        position = 0
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    fill()
+    skip_whitespace()
+    if position >= len(buffer):
+        return
+
+    if buffer[position] != "[":
+        # Not an array: parse the whole document as a single record
+        while not eof:
+            fill()
+        yield json.loads(buffer[position:])
+        return
+
+    position += 1
+    expect_value = True
+    allow_close = True
+    while True:
+        skip_whitespace()
+        if position >= len(buffer):
+            raise ValueError("Unexpected end of JSON file: unterminated array.")
+        char = buffer[position]
+        if char == "]" and allow_close:
+            return
+        if not expect_value:
+            if char != ",":
+                raise ValueError(f"Invalid JSON: expected ',' or ']' but found {char!r}.")
+            position += 1
+            expect_value = True
+            allow_close = False
+            continue
+
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+                # A number may continue in the next block ("1." decodes as 1): accept
+                # a value only once a character that can't extend it follows, or at EOF
+                if eof or (end < len(buffer) and buffer[end] not in _NUMBER_CHARS):
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+        position = end
+        expect_value = False
+        allow_close = True
+        yield record
+
+
+def iter_csv_records(source, batch_size):
+    """
+    Yield the rows of a CSV file as record dicts, reading batch_size rows at a time.
+    """
+    import pandas as pd
+    with _text_stream(source) as stream:
+        with pd.read_csv(stream, chunksize=batch_size) as reader:
+            for frame in reader:
+                yield from frame.to_dict(orient="records")
+
+
+def iter_record_batches(source, file_type, batch_size):
+    """
+    Yield lists of at most batch_size records from a JSON or CSV source.
+    """
+    if file_type == "json":
+        records = iter_json_records(source)
+    else:
+        records = iter_csv_records(source, batch_size)
+
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
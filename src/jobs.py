@@ -0,0 +1,359 @@
+# =====================================
+# File: jobs.py
+# Description:
+#   Background audit job queue.
+#   Audits run in a process-wide worker pool, decoupled from Streamlit
+#   reruns; job status, progress and results are persisted in SQLite
+#   so any session (or a refreshed page) can poll them by job ID.
+#   The audit pipeline is imported when the first job runs (or by prewarm),
+#   so polling jobs stays cheap on a cold start.
+# =====================================
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from src.backends import get_backend
+
+# Job states; queued and running jobs are "active"
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+# Progress is written to the job store at most this often
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+_lock = threading.Lock()
+_executor = None
+_initialized_paths = set()
+_prewarm_started = False
+
+
+def _connect():
+    path = os.path.join(config.JOB_DIR, "jobs.sqlite3")
+    if path not in _initialized_paths:
+        os.makedirs(config.JOB_DIR, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if path not in _initialized_paths:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " submission_key TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " file_name TEXT NOT NULL,"
+            " params TEXT NOT NULL,"
+            " progress REAL NOT NULL DEFAULT 0,"
+            " message TEXT NOT NULL DEFAULT '',"
+            " live TEXT NOT NULL DEFAULT '{}',"
+            " result TEXT,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_submission_key ON jobs (submission_key, status)")
+        conn.commit()
+        _initialized_paths.add(path)
+    return conn
+
+
+def _execute(sql, args=()):
+    with _lock:
+        conn = _connect()
+        try:
+            rows = conn.execute(sql, args).fetchall()
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+
+def _input_path(job_id):
+    return os.path.join(config.JOB_DIR, f"{job_id}.input")
+
+
+def _results_path(job_id):
+    return os.path.join(config.JOB_DIR, f"{job_id}.results.json")
+
+
+def _update(job_id, **fields):
+    fields["updated_at"] = time.time()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    _execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+
+def _pool():
+    """
+    Return the process-wide worker pool, re-queueing jobs that were still
+    active when the previous server process stopped.
+    """
+    global _executor
+    with _lock:
+        if _executor is not None:
+            return _executor
+        _executor = ThreadPoolExecutor(max_workers=config.JOB_WORKERS, thread_name_prefix="audit-job")
+
+    _prune()
+    for row in _execute(
+        "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", ACTIVE_STATES
+    ):
+        if os.path.exists(_input_path(row["id"])):
+            logging.info(f"Re-queueing interrupted audit job {row['id']}")
+            _update(row["id"], status=QUEUED, progress=0.0, message="Re-queued after restart")
+            _executor.submit(_run_job, row["id"])
+        else:
+            _update(row["id"], status=FAILED, error="The job was interrupted and its upload is no longer available.")
+    return _executor
+
+
+def resume_jobs():
+    """
+    Start the worker pool once per process, re-queueing jobs that a restart
+    interrupted, without waiting for the next submission.
+    """
+    _pool()
+
+
+def _prune():
+    # Drop finished jobs (and their files) older than JOB_RETENTION_DAYS
+    cutoff = time.time() - config.JOB_RETENTION_DAYS * 86400
+    rows = _execute(
+        "SELECT id FROM jobs WHERE status NOT IN (?, ?) AND updated_at < ?", (*ACTIVE_STATES, cutoff)
+    )
+    for row in rows:
+        for path in (_input_path(row["id"]), _results_path(row["id"])):
+            if os.path.exists(path):
+                os.remove(path)
+    if rows:
+        _execute(
+            "DELETE FROM jobs WHERE status NOT IN (?, ?) AND updated_at < ?", (*ACTIVE_STATES, cutoff)
+        )
+
+
+def prewarm():
+    """
+    Import the audit pipeline and create the LLM_BACKEND client in a background
+    thread (once per process, if LLM_PREWARM), so the first audit doesn't wait for them.
+    """
+    global _prewarm_started
+    with _lock:
+        if _prewarm_started or not config.LLM_PREWARM:
+            return
+        _prewarm_started = True
+    threading.Thread(target=_prewarm, daemon=True, name="prewarm").start()
+
+
+def _prewarm():
+    start = time.time()
+    try:
+        import src.audit_pipeline  # noqa: F401
+        import src.reports  # noqa: F401
+        get_backend()
+    except Exception as e:
+        logging.warning(f"Pre-warming the audit pipeline failed: {e}")
+        return
+    logging.info(f"Pre-warmed the audit pipeline and {config.LLM_BACKEND} client in {time.time() - start:.2f}s")
+
+
+def _job_params(file_type, record_limit, model, system_prompt, user_prompt, use_cache, dataset_id):
+    return {
+        "file_type": file_type,
+        "record_limit": record_limit,
+        "model": model,
+        "system_prompt": system_prompt,
+        "user_prompt": user_prompt,
+        "use_cache": use_cache,
+        "dataset_id": dataset_id,
+    }
+
+
+def _submission_key(params, source=None, digest=None):
+    # Hash of the upload (or its known content hash) and the job settings
+    submission = hashlib.sha256()
+    if digest is None:
+        while block := source.read(1024 * 1024):
+            submission.update(block)
+    else:
+        submission.update(digest.encode("utf-8"))
+    submission.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return submission.hexdigest()
+
+
+def submit_job(source, file_name, file_type, record_limit, model, system_prompt, user_prompt, use_cache=True,
+               digest=None, dataset_id=None):
+    """
+    Queue an audit of a binary file-like source and return its job ID.
+    The upload is spooled to the job directory so the job outlives the session.
+    Re-submitting the same file and settings while a job is active returns that job.
+    digest is the content hash of the upload (see datasets.py), if already known;
+    the upload is then not hashed again. dataset_id names the dataset the file is a
+    version of, for an incremental audit (see audit_pipeline.audit_source).
+    """
+    params = _job_params(file_type, record_limit, model, system_prompt, user_prompt, use_cache, dataset_id)
+    submission_key = _submission_key(params, source, digest)
+
+    pool = _pool()
+    active = _execute(
+        "SELECT id FROM jobs WHERE submission_key = ? AND status IN (?, ?)", (submission_key, *ACTIVE_STATES)
+    )
+    if active:
+        return active[0]["id"]
+
+    job_id = uuid.uuid4().hex
+    source.seek(0)
+    with open(_input_path(job_id), "wb") as f:
+        shutil.copyfileobj(source, f)
+    now = time.time()
+    _execute(
+        "INSERT INTO jobs (id, submission_key, status, file_name, params, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (job_id, submission_key, QUEUED, file_name, json.dumps(params), now, now),
+    )
+    pool.submit(_run_job, job_id)
+    logging.info(f"Queued audit job {job_id} for {file_name}")
+    return job_id
+
+
+def find_finished_job(digest, file_type, record_limit, model, system_prompt, user_prompt, use_cache=True,
+                      dataset_id=None):
+    """
+    Return the ID of the latest finished job that audited an upload with this content
+    hash (see datasets.py) and the same settings, or None. With use_cache, its chunk
+    results are served from the result cache if they haven't been evicted since.
+    """
+    params = _job_params(file_type, record_limit, model, system_prompt, user_prompt, use_cache, dataset_id)
+    rows = _execute(
+        "SELECT id FROM jobs WHERE submission_key = ? AND status = ? ORDER BY updated_at DESC LIMIT 1",
+        (_submission_key(params, digest=digest), DONE),
+    )
+    return rows[0]["id"] if rows else None
+
+
+def get_job(job_id):
+    """
+    Return the status of a job as a dict, or None if it doesn't exist.
+    Finished jobs include their result (without the reports, see load_report).
+    """
+    rows = _execute(
+        "SELECT id, status, file_name, progress, message, live, result, error, created_at, updated_at "
+        "FROM jobs WHERE id = ?", (job_id,)
+    )
+    if not rows:
+        return None
+    job = dict(rows[0])
+    job["live"] = json.loads(job["live"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    if job["status"] == QUEUED:
+        job["position"] = _execute(
+            "SELECT COUNT(*) AS ahead FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, job["created_at"])
+        )[0]["ahead"]
+    return job
+
+
+def load_report(job_id, fmt="pdf"):
+    """
+    Return a report (PDF, JSONL, CSV or Parquet) of a finished job as bytes.
+    Reports are rendered on the first request and memoised by the results hash.
+    """
+    from src.reports import render_report
+    job = get_job(job_id)
+    if job is None or job["status"] != DONE:
+        raise ValueError(f"Audit job {job_id} has no finished result.")
+    result = job["result"]
+
+    def load_results():
+        with open(_results_path(job_id), encoding="utf-8") as f:
+            return json.load(f)
+
+    path = render_report(load_results, job["file_name"], result["summary_stats"], fmt,
+                         digest=result["results_hash"], audited_at=result.get("audited_at"))
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _run_job(job_id):
+    from src.audit_pipeline import (
+        audit_source,
+        report_filename,
+        summarize_changes,
+        summarize_results,
+        tally_findings,
+    )
+    from src.reports import REPORT_FORMATS, results_hash
+    rows = _execute("SELECT file_name, params FROM jobs WHERE id = ?", (job_id,))
+    if not rows:
+        return
+    file_name = rows[0]["file_name"]
+    params = json.loads(rows[0]["params"])
+    _update(job_id, status=RUNNING, message="Starting audit...")
+
+    live = Counter()
+    last_write = 0.0
+    record_limit = params["record_limit"]
+
+    def update_progress(start, size, completed, total):
+        nonlocal last_write
+        now = time.time()
+        if now - last_write < PROGRESS_INTERVAL_SECONDS and completed < total:
+            return
+        last_write = now
+        done = start + (size * completed / total if total else size)
+        _update(
+            job_id,
+            progress=min(done / record_limit, 1.0),
+            message=f"Records {start + 1}-{start + size}: audited {completed} of {total} chunk(s)",
+            live=json.dumps(live),
+        )
+
+    try:
+        with open(_input_path(job_id), "rb") as source:
+            result_json, counts, prompt_stats, estimated_cost = audit_source(
+                source, params["file_type"], record_limit, params["model"],
+                params["system_prompt"], params["user_prompt"],
+                use_cache=params["use_cache"],
+                progress_callback=update_progress,
+                record_callback=lambda results: tally_findings(live, results),
+                file_name=file_name,
+                dataset_id=params.get("dataset_id")
+            )
+        audited_at = time.time()
+        summary_stats = summarize_results(result_json, counts["total_entries"])
+        # Reports are rendered when first downloaded (see load_report)
+        with open(_results_path(job_id), "w", encoding="utf-8") as f:
+            json.dump(result_json, f, ensure_ascii=False, default=str)
+        result = {
+            "report_filenames": {
+                fmt: report_filename(file_name, suffix) for fmt, (suffix, _) in REPORT_FORMATS.items()
+            },
+            "audited_at": audited_at,
+            "results_hash": results_hash(result_json, file_name, summary_stats, audited_at),
+            "summary_stats": summary_stats,
+            "prompt_stats": prompt_stats,
+            "estimated_cost": estimated_cost,
+            "changes": summarize_changes(result_json.get("changes")),
+        }
+        _update(job_id, status=DONE, progress=1.0, message="Audit complete", live=json.dumps(live),
+                result=json.dumps(result, default=str))
+        logging.info(f"Audit job {job_id} finished")
+    except UnicodeDecodeError as e:
+        logging.error(f"Unicode decode error in audit job {job_id}: {e}")
+        _update(job_id, status=FAILED,
+                error="The uploaded file is not valid UTF-8 text. Please re-save it as UTF-8 encoding and try again.")
+    except Exception as e:
+        logging.error(f"❌ Audit job {job_id} failed: {e}")
+        _update(job_id, status=FAILED, error=str(e))
+    finally:
+        if os.path.exists(_input_path(job_id)):
+            os.remove(_input_path(job_id))
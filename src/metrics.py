@@ -0,0 +1,196 @@
+# =====================================
+# File: metrics.py
+# Description:
+#   Per-stage timing spans of the audit (upload decode, parse, prompt
+#   serialisation, LLM time to first token and latency, response parse,
+#   stats pass, report rendering) with their token, byte and record counts.
+#   Spans are aggregated in-process into latency histograms and counters
+#   per stage and backend, logged as JSON lines (logger "metrics") and
+#   exposed in the Prometheus text format on a local HTTP endpoint.
+# =====================================
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# Span fields summed into counters; other fields only appear in the logs
+COUNTED_FIELDS = ("records", "bytes", "input_tokens", "output_tokens", "cached_tokens")
+
+logger = logging.getLogger("metrics")
+
+_lock = threading.Lock()
+_series = {}
+_server = None
+
+
+def _new_series():
+    return {"count": 0, "sum": 0.0, "errors": 0, "buckets": [0] * len(LATENCY_BUCKETS),
+            **{field: 0 for field in COUNTED_FIELDS}}
+
+
+def observe(stage, seconds, error=None, **fields):
+    """
+    Record one finished span of a stage (see span) and log it.
+    """
+    backend = fields.pop("backend", None) or config.LLM_BACKEND
+    with _lock:
+        series = _series.setdefault((stage, backend), _new_series())
+        series["count"] += 1
+        series["sum"] += seconds
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                series["buckets"][index] += 1
+                break
+        if error:
+            series["errors"] += 1
+        for field in COUNTED_FIELDS:
+            if isinstance(fields.get(field), (int, float)):
+                series[field] += fields[field]
+
+    if config.METRICS_LOG and logger.isEnabledFor(logging.INFO):
+        event = {"stage": stage, "backend": backend, "seconds": round(seconds, 6), **fields}
+        if error:
+            event["error"] = error
+        logger.info(json.dumps(event, default=str))
+
+
+@contextmanager
+def span(stage, **fields):
+    """
+    Time the enclosed block as one span of a stage. Yields the span's fields
+    so the block can add counts (records, bytes, input_tokens, output_tokens, cached_tokens)
+    or labels once they are known. Exceptions are recorded and re-raised.
+    """
+    error = None
+    start = time.perf_counter()
+    try:
+        yield fields
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start, error=error, **fields)
+
+
+def snapshot():
+    """
+    Copy of the aggregated series, e.g. to hand them from a worker process to its parent.
+    """
+    with _lock:
+        return {key: {**series, "buckets": list(series["buckets"])} for key, series in _series.items()}
+
+
+def merge(other):
+    """
+    Add the series of a snapshot (of another process) to this process.
+    """
+    with _lock:
+        for key, theirs in other.items():
+            series = _series.setdefault(tuple(key), _new_series())
+            for name, value in theirs.items():
+                if name == "buckets":
+                    series["buckets"] = [mine + add for mine, add in zip(series["buckets"], value)]
+                else:
+                    series[name] += value
+
+
+def reset():
+    with _lock:
+        _series.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render_prometheus(series=None) -> str:
+    """
+    The aggregated series in the Prometheus text exposition format.
+    """
+    series = snapshot() if series is None else series
+    ordered = sorted(series.items())
+    lines = [
+        "# HELP audit_stage_duration_seconds Duration of audit stages.",
+        "# TYPE audit_stage_duration_seconds histogram",
+    ]
+    for (stage, backend), values in ordered:
+        labels = f'stage="{_escape(stage)}",backend="{_escape(backend)}"'
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, values["buckets"]):
+            cumulative += count
+            lines.append(f'audit_stage_duration_seconds_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+        lines.append(f'audit_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {values["count"]}')
+        lines.append(f"audit_stage_duration_seconds_sum{{{labels}}} {values['sum']:.6f}")
+        lines.append(f"audit_stage_duration_seconds_count{{{labels}}} {values['count']}")
+
+    counters = [
+        ("audit_stage_errors_total", "Failed audit stage spans.", "errors"),
+        ("audit_stage_records_total", "Records processed by audit stages.", "records"),
+        ("audit_stage_bytes_total", "Bytes processed by audit stages.", "bytes"),
+        ("audit_stage_input_tokens_total", "Input tokens of audit stages.", "input_tokens"),
+        ("audit_stage_output_tokens_total", "Output tokens of audit stages.", "output_tokens"),
+        ("audit_stage_cached_tokens_total", "Input tokens served from provider prompt caches.", "cached_tokens"),
+    ]
+    for name, help_text, field in counters:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (stage, backend), values in ordered:
+            lines.append(f'{name}{{stage="{_escape(stage)}",backend="{_escape(backend)}"}} {values[field]:g}')
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    """
+    Write the metrics in the Prometheus text format to a file (e.g. for a textfile collector).
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+    return path
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_server(port=None, host=None):
+    """
+    Serve /metrics on METRICS_HOST:METRICS_PORT in a daemon thread, once per process.
+    Returns the server, or None if the endpoint is disabled (port 0) or the port is taken.
+    """
+    global _server
+    port = config.METRICS_PORT if port is None else port
+    host = config.METRICS_HOST if host is None else host
+    with _lock:
+        if _server is not None or not port:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            logging.warning(f"Metrics endpoint not started on {host}:{port}: {e}")
+            return None
+        _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, daemon=True, name="metrics").start()
+    logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return _server
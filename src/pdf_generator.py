@@ -1,30 +1,75 @@
+import time
 from datetime import datetime
 
 import pytz
 from fpdf import FPDF
 
+import config
+from src.deviation_store import build_store, records_by_severity
 
-def clean_nested_text(obj):
+# Record ids listed per change type in "Changes Since Last Audit"
+CHANGES_LIST_LIMIT = 50
+
+
+class _Buffer:
     """
-    Recursively clean all string values in nested dicts and lists.
+    Append-only replacement for FPDF's document string, which is rebuilt on
+    every line written and makes large reports quadratic in their size.
     """
-    if isinstance(obj, dict):
-        return {k: clean_nested_text(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [clean_nested_text(item) for item in obj]
-    elif isinstance(obj, str):
-        return obj.encode("latin-1", "ignore").decode("latin-1")
-    else:
-        return obj
 
-def generate_audit_report(audit_results, original_filename, file_contents, summary_stats):
-    pdf = FPDF()
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def __iadd__(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        return self
+
+    def __len__(self):
+        return self.size
+
+
+class _ReportPDF(FPDF):
+    def __init__(self):
+        super().__init__()
+        self.buffer = _Buffer()
+
+    def write_to(self, f):
+        """
+        Finish the document and write it to a binary file object part by part.
+        """
+        if self.state < 3:
+            self.close()
+        for part in self.buffer.parts:
+            f.write(part.encode("latin1"))
+
+    def to_bytes(self) -> bytes:
+        if self.state < 3:
+            self.close()
+        return "".join(self.buffer.parts).encode("latin1")
+
+
+def _text(value) -> str:
+    # The core fonts are latin-1 only; strings are cleaned as they are written
+    return str(value).encode("latin-1", "ignore").decode("latin-1")
+
+
+def generate_audit_report(audit_results, original_filename, summary_stats, output_path=None, max_findings=None,
+                          audited_at=None):
+    """
+    Render the audit report as PDF bytes, or write it to output_path and return the path.
+    audited_at is the time (epoch seconds) the audit finished, default now.
+    At most max_findings records (default PDF_MAX_FINDINGS, 0 = all) are listed under
+    "Detailed Findings", most severe first.
+    """
+    if max_findings is None:
+        max_findings = config.PDF_MAX_FINDINGS
+
+    pdf = _ReportPDF()
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
 
-    audit_results = clean_nested_text(audit_results)
-    file_contents = clean_nested_text(file_contents)
-
     # Title
     pdf.set_font("Arial", "B", 16)
     pdf.cell(0, 10, "Healthcare Recipe Data Audit Report", ln=True)
@@ -32,8 +77,9 @@ def generate_audit_report(audit_results, original_filename, file_contents, summa
     # File info
     pdf.set_font("Arial", "", 12)
     pdf.ln(5)
-    pdf.multi_cell(0, 8, f"Audited File: {original_filename}")
-    timestamp = datetime.now(pytz.timezone("Europe/Zurich")).strftime("%Y-%m-%d %H:%M:%S %Z")
+    pdf.multi_cell(0, 8, _text(f"Audited File: {original_filename}"))
+    audited_at = time.time() if audited_at is None else audited_at
+    timestamp = datetime.fromtimestamp(audited_at, pytz.timezone("Europe/Zurich")).strftime("%Y-%m-%d %H:%M:%S %Z")
     pdf.multi_cell(0, 8, f"Audit performed: {timestamp}")
 
     pdf.ln(5)
@@ -46,7 +92,7 @@ def generate_audit_report(audit_results, original_filename, file_contents, summa
     pdf.ln(2)
 
     if "summary_text" in audit_results:
-        pdf.multi_cell(0, 8, audit_results["summary_text"])
+        pdf.multi_cell(0, 8, _text(audit_results["summary_text"]))
         pdf.ln(4)
 
     lines = [
@@ -66,6 +112,27 @@ def generate_audit_report(audit_results, original_filename, file_contents, summa
 
     pdf.ln(4)
 
+    # Changes since the last audit of the same file (incremental re-audit)
+    changes = audit_results.get("changes")
+    if changes:
+        pdf.set_font("Arial", "B", 12)
+        pdf.cell(0, 8, f"Changes since last audit ({changes['previous_audit']}):", ln=True)
+        pdf.set_font("Arial", "", 12)
+        pdf.multi_cell(
+            0, 8,
+            f"- Added: {len(changes['added'])}, changed: {len(changes['changed'])}, "
+            f"removed: {len(changes['removed'])}, unchanged: {changes['unchanged']}"
+        )
+        for label in ("added", "changed", "removed"):
+            ids = changes[label]
+            if ids:
+                listed = ", ".join(_text(rec_id) for rec_id in ids[:CHANGES_LIST_LIMIT])
+                more = f" and {len(ids) - CHANGES_LIST_LIMIT} more" if len(ids) > CHANGES_LIST_LIMIT else ""
+                pdf.multi_cell(0, 6, f"  {label.capitalize()} records: {listed}{more}")
+        if not changes["complete"]:
+            pdf.multi_cell(0, 6, "  Removed records are only detected when the whole file is audited.")
+        pdf.ln(4)
+
     # Most common critical deviations
     pdf.set_font("Arial", "B", 12)
     pdf.cell(0, 8, "Most common critical deviations:", ln=True)
@@ -73,7 +140,7 @@ def generate_audit_report(audit_results, original_filename, file_contents, summa
     crit_counts = summary_stats.get("critical_types", {})
     if crit_counts:
         for t, count in crit_counts.items():
-            pdf.multi_cell(0, 8, f"- {t}: {count}")
+            pdf.multi_cell(0, 8, _text(f"- {t}: {count}"))
     else:
         pdf.multi_cell(0, 8, "- None")
 
@@ -86,7 +153,7 @@ def generate_audit_report(audit_results, original_filename, file_contents, summa
     mod_counts = summary_stats.get("moderate_types", {})
     if mod_counts:
         for t, count in mod_counts.items():
-            pdf.multi_cell(0, 8, f"- {t}: {count}")
+            pdf.multi_cell(0, 8, _text(f"- {t}: {count}"))
     else:
         pdf.multi_cell(0, 8, "- None")
 
@@ -114,40 +181,37 @@ def generate_audit_report(audit_results, original_filename, file_contents, summa
     pdf.set_font("Arial", "", 12)
     pdf.ln(2)
 
-    severity_order = {"critical": 1, "moderate": 2, "minor": 3}
-
     records = audit_results.get("records", [])
-    # Filter to records with deviations
-    records_with_devs = [r for r in records if r.get("deviations")]
-    # Sort records by most severe deviation in each record
-    def record_severity(rec):
-        if not rec.get("deviations"):
-            return 4
-        severities = [severity_order.get(d.get("severity", "").lower(), 4) for d in rec["deviations"]]
-        return min(severities)
-
-    records_with_devs.sort(key=record_severity)
-
-    for rec in records_with_devs:
+    # Records with deviations, sorted by the most severe deviation of each record (stable)
+    ordered = records_by_severity(build_store(records))
+    omitted = 0
+    if max_findings and len(ordered) > max_findings:
+        omitted = len(ordered) - max_findings
+        ordered = ordered[:max_findings]
+
+    for rec in (records[index] for index in ordered.tolist()):
         pdf.set_font("Arial", "B", 12)
-        pdf.multi_cell(0, 8, f"Record ID: {rec.get('id')}")
+        pdf.multi_cell(0, 8, _text(f"Record ID: {rec.get('id')}"))
         pdf.set_font("Arial", "", 12)
-        deviations = rec.get("deviations", [])
-        for dev in deviations:
-            pdf.multi_cell(0, 6, f"- Deviation Type: {dev.get('type')}")
-            pdf.multi_cell(0, 6, f"  Severity: {dev.get('severity')}")
-            pdf.multi_cell(0, 6, f"  Description: {dev.get('description')}")
+        # One text block per record instead of one cell per line
+        pdf.multi_cell(0, 6, _text("\n".join(
+            f"- Deviation Type: {dev.get('type')}\n"
+            f"  Severity: {dev.get('severity')}\n"
+            f"  Description: {dev.get('description')}"
+            for dev in rec["deviations"]
+        )))
         pdf.ln(2)
 
-    # Appendix
-    # pdf.add_page()
-    # pdf.set_font("Arial", "B", 14)
-    # pdf.cell(0, 10, "Appendix: Full File Content", ln=True)
-    # pdf.ln(3)
-    #
-    # pdf.set_font("Courier", "", 8)
-    # file_json = json.dumps(file_contents, indent=2, ensure_ascii=False, sort_keys=True)
-    # for line in file_json.splitlines():
-    #     pdf.multi_cell(0, 4, line)
-
-    return pdf.output(dest="S").encode("latin1")
\ No newline at end of file
+    if omitted:
+        pdf.set_font("Arial", "I", 11)
+        pdf.multi_cell(
+            0, 6,
+            f"{omitted} further record(s) with deviations are not listed (limit PDF_MAX_FINDINGS = {max_findings}). "
+            "They are included in the statistics above."
+        )
+
+    if output_path:
+        with open(output_path, "wb") as f:
+            pdf.write_to(f)
+        return output_path
+    return pdf.to_bytes()
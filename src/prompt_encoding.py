@@ -0,0 +1,149 @@
+# =====================================
+# File: prompt_encoding.py
+# Description:
+#   Serialises recipe records for the LLM prompt.
+#   Supports the legacy indented JSON, minified JSON and a compact
+#   header-once tabular (CSV) format with an optional value dictionary.
+# =====================================
+
+import csv
+import io
+import json
+import math
+from collections import Counter
+
+import config
+from src.tokens import count_tokens
+
+ENCODING_MODES = ("json", "minified", "tabular")
+
+# Only values at least this long and repeated this often go into the dictionary
+DICTIONARY_MIN_LENGTH = 6
+DICTIONARY_MIN_COUNT = 2
+DICTIONARY_PREFIX = "~"
+
+
+def _legacy_json(records) -> str:
+    return json.dumps(records, indent=2, sort_keys=True)
+
+
+def _estimate_legacy_tokens(minified: str, model) -> int:
+    # indent=2 puts every value on its own indented line; rendering it just to
+    # count tokens is slow (the indenting encoder is pure Python), so add one
+    # newline+indent token per value to the minified count instead.
+    values = minified.count(",") + minified.count("{") + minified.count("[")
+    return count_tokens(minified, model) + values
+
+
+def _minified_json(records) -> str:
+    return json.dumps(records, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def _is_flat(records) -> bool:
+    return all(
+        isinstance(rec, dict) and not any(isinstance(v, (dict, list)) for v in rec.values())
+        for rec in records
+    )
+
+
+def _cell(value) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _build_dictionary(rows) -> dict:
+    counts = Counter(
+        value for row in rows for value in row
+        if len(value) >= DICTIONARY_MIN_LENGTH
+    )
+    repeated = [value for value, count in counts.most_common() if count >= DICTIONARY_MIN_COUNT]
+    return {value: f"{DICTIONARY_PREFIX}{index}" for index, value in enumerate(repeated, start=1)}
+
+
+def _tabular(records, use_dictionary):
+    # Sorted for stable prompts, with the record id first
+    columns = sorted({key for rec in records for key in rec}, key=lambda key: (key not in ("id", "recipe_id"), key))
+    rows = [[_cell(rec.get(column)) for column in columns] for rec in records]
+
+    dictionary = {}
+    if use_dictionary and not any(value.startswith(DICTIONARY_PREFIX) for row in rows for value in row):
+        dictionary = _build_dictionary(rows)
+        if dictionary:
+            rows = [[dictionary.get(value, value) for value in row] for row in rows]
+
+    buffer = io.StringIO()
+    if dictionary:
+        buffer.write("Dictionary:\n")
+        for value, ref in dictionary.items():
+            buffer.write(f"{ref}={value}\n")
+        buffer.write("\nRecords:\n")
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return buffer.getvalue(), bool(dictionary)
+
+
+def encode_records(records, mode=None, use_dictionary=None, model=None) -> dict:
+    """
+    Serialise records for the prompt; tokens are counted for the given model.
+    Returns a dict with the encoded 'text', the 'mode' actually used, whether
+    a value 'dictionary' was written, a 'description' of the format for the
+    prompt, and token estimates of the encoded and the legacy (indent=2 JSON)
+    serialisation.
+    """
+    mode = (mode or config.PROMPT_ENCODING).lower()
+    if mode not in ENCODING_MODES:
+        raise ValueError(f"Invalid PROMPT_ENCODING '{mode}'. Must be one of: {', '.join(ENCODING_MODES)}.")
+    if use_dictionary is None:
+        use_dictionary = config.PROMPT_DICTIONARY
+
+    # Nested records (e.g. recipes with steps) can't be flattened into one table
+    if mode == "tabular" and not _is_flat(records):
+        mode = "minified"
+
+    has_dictionary = False
+    if mode == "json":
+        text = _legacy_json(records)
+        description = "JSON array of records"
+    elif mode == "minified":
+        text = _minified_json(records)
+        description = "JSON array of records"
+    else:
+        text, has_dictionary = _tabular(records, use_dictionary)
+        description = "CSV with a header row, one record per line; empty cells are null"
+        if has_dictionary:
+            description += (
+                f"; values written as {DICTIONARY_PREFIX}N refer to the dictionary listed before the records"
+            )
+
+    encoded_tokens = count_tokens(text, model)
+    if mode == "json":
+        legacy_tokens = encoded_tokens
+    elif mode == "minified":
+        legacy_tokens = _estimate_legacy_tokens(text, model)
+    else:
+        legacy_tokens = _estimate_legacy_tokens(_minified_json(records), model)
+    return {
+        "text": text,
+        "mode": mode,
+        "dictionary": has_dictionary,
+        "description": description,
+        "tokens": encoded_tokens,
+        "legacy_tokens": legacy_tokens,
+    }
+
+
+def encode_record_for_estimate(record) -> str:
+    """
+    Serialise a single record the way it contributes to an encoded prompt.
+    Used to size chunks before they are encoded.
+    """
+    mode = config.PROMPT_ENCODING.lower()
+    if mode == "json":
+        return json.dumps(record, indent=2, sort_keys=True)
+    if mode == "tabular" and _is_flat([record]):
+        return ",".join(_cell(value) for value in record.values()) + "\n"
+    return _minified_json(record)
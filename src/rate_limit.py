@@ -0,0 +1,238 @@
+# =====================================
+# File: rate_limit.py
+# Description:
+#   Adaptive rate limiting of LLM calls, one limiter per LLM_BACKEND shared
+#   by every audit in the process. Each call waits for:
+#     - the request and token budgets ({BACKEND}_RPM / {BACKEND}_TPM,
+#       token buckets refilled continuously; 0 = no budget)
+#     - the end of a Retry-After pause after a 429
+#     - a free slot of the concurrency window, which adapts with AIMD:
+#       halved on 429s, trimmed when latency per token degrades, and
+#       widened by one slot per window of successful calls
+# =====================================
+
+import email.utils
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+# Bursts of up to this many seconds of the per-minute budgets
+BURST_SECONDS = 10
+# Concurrency window after a 429, and after a latency spike
+RATE_LIMIT_DECREASE = 0.5
+LATENCY_DECREASE = 0.9
+# Weight of a new call in the smoothed seconds per token
+LATENCY_SMOOTHING = 0.1
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+# Share of the budgets used by this process (the batch CLI splits them across its workers)
+_process_share = 1.0
+
+
+def set_process_share(share):
+    """
+    Use only a share of the configured RPM/TPM budgets in this process.
+    """
+    global _process_share
+    _process_share = share
+
+
+def get_limiter(name=None):
+    """
+    Return the process-wide limiter of a backend (default: LLM_BACKEND).
+    """
+    name = (name or config.LLM_BACKEND).upper()
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter(
+                name,
+                rpm=getattr(config, f"{name}_RPM", 0) * _process_share,
+                tpm=getattr(config, f"{name}_TPM", 0) * _process_share,
+                max_concurrency=config.LLM_MAX_CONCURRENCY,
+            )
+        return _limiters[name]
+
+
+def _status_code(error):
+    # HTTP status of an SDK error (OpenAI/Portkey: status_code, google.api_core: code)
+    for attribute in ("status_code", "code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _error_chain(error):
+    while error is not None:
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def is_rate_limited(error) -> bool:
+    """
+    Whether an exception (or one it was raised from) is an HTTP 429 of the provider.
+    """
+    return any(_status_code(item) == 429 for item in _error_chain(error))
+
+
+def retry_after_seconds(error):
+    """
+    Seconds to wait according to the Retry-After(-ms) header of a 429, or None.
+    """
+    for item in _error_chain(error):
+        headers = getattr(getattr(item, "response", None), "headers", None)
+        if not headers:
+            continue
+        if headers.get("retry-after-ms"):
+            try:
+                return float(headers["retry-after-ms"]) / 1000
+            except ValueError:
+                pass
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+            try:
+                date = email.utils.parsedate_to_datetime(value)
+                return max(0.0, date.timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return None
+
+
+class TokenBucket:
+    """
+    Budget of a per-minute rate, refilled continuously, with bursts of up to BURST_SECONDS.
+    Takes that exceed the bucket are allowed once it is full and leave it in debt.
+    """
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_seconds(self, amount, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= amount
+
+    def give(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+    Request/token budgets, Retry-After pauses and an AIMD concurrency window of one backend.
+    """
+
+    def __init__(self, name, rpm=0, tpm=0, max_concurrency=16):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = float(self.max_concurrency)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.seconds_per_token = None
+        self.condition = threading.Condition()
+
+    def _wait_seconds(self, tokens, now):
+        # Seconds until a call may start (None: wait for a slot to be released)
+        waits = [self.blocked_until - now]
+        if self.requests:
+            waits.append(self.requests.wait_seconds(1, now))
+        if self.tokens:
+            waits.append(self.tokens.wait_seconds(tokens, now))
+        wait = max(waits)
+        if wait <= 0 and self.in_flight >= int(self.concurrency):
+            return None
+        return max(wait, 0.0)
+
+    @contextmanager
+    def slot(self, tokens):
+        """
+        Wait until a call of about tokens tokens (input + expected output) may start and run it.
+        Yields a dict for the call: "waited" (seconds) is set, and the caller may set
+        "tokens" to the tokens actually used. A 429 raised in the block pauses all calls
+        for its Retry-After and shrinks the concurrency window.
+        """
+        permit = {"reserved": tokens, "tokens": None, "waited": 0.0}
+        if not config.RATE_LIMIT_ENABLED:
+            yield permit
+            return
+        start = time.monotonic()
+        with self.condition:
+            while True:
+                wait = self._wait_seconds(tokens, time.monotonic())
+                if wait == 0:
+                    break
+                self.condition.wait(wait)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+            self.in_flight += 1
+        permit["started"] = time.monotonic()
+        permit["waited"] = permit["started"] - start
+        try:
+            yield permit
+        except BaseException as e:
+            self._release(permit, e)
+            raise
+        self._release(permit)
+
+    def _release(self, permit, error=None):
+        now = time.monotonic()
+        with self.condition:
+            self.in_flight -= 1
+            if self.tokens and permit["tokens"] is not None:
+                # Settle the reservation with the tokens actually used
+                difference = permit["reserved"] - permit["tokens"]
+                if difference > 0:
+                    self.tokens.give(difference)
+                else:
+                    self.tokens.take(-difference)
+            if error is not None and is_rate_limited(error):
+                pause = retry_after_seconds(error)
+                pause = config.CHUNK_RETRY_BASE_SECONDS if pause is None else pause
+                self.blocked_until = max(self.blocked_until, now + pause)
+                self._decrease(permit, RATE_LIMIT_DECREASE, f"rate limited, pausing {pause:.1f}s")
+            elif error is None:
+                if self._latency_degraded(now - permit["started"], permit["tokens"] or permit["reserved"]):
+                    self._decrease(permit, LATENCY_DECREASE, "latency degraded")
+                elif self.concurrency < self.max_concurrency:
+                    # Additive increase: one slot per window of successful calls
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self.condition.notify_all()
+
+    def _latency_degraded(self, seconds, tokens):
+        # Compares the call's seconds per token with the smoothed value of earlier calls
+        factor = config.RATE_LIMIT_LATENCY_FACTOR
+        pace = seconds / max(tokens, 1)
+        if self.seconds_per_token is None:
+            self.seconds_per_token = pace
+            return False
+        degraded = factor > 0 and pace > self.seconds_per_token * factor
+        self.seconds_per_token += LATENCY_SMOOTHING * (pace - self.seconds_per_token)
+        return degraded
+
+    def _decrease(self, permit, factor, reason):
+        # Once per round trip: calls started before the last decrease don't shrink the window again
+        if permit["started"] < self.last_decrease:
+            return
+        self.last_decrease = time.monotonic()
+        self.concurrency = max(1.0, self.concurrency * factor)
+        logging.info(f"{self.name} concurrency window reduced to {int(self.concurrency)} ({reason})")
@@ -0,0 +1,175 @@
+# =====================================
+# File: record_history.py
+# Description:
+#   Record-level fingerprints of previous audits for incremental re-audits.
+#   For each dataset lineage (dataset ID, backend, model and prompts) the
+#   content hash and LLM result of every record is kept, so a new version of
+#   the dataset only sends added or changed records to the LLM.
+# =====================================
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import config
+
+# Keys per IN (...) query, below SQLite's variable limit
+QUERY_BATCH_SIZE = 500
+
+_lock = threading.Lock()
+_initialized_paths = set()
+
+
+def record_fingerprint(record) -> str:
+    """
+    Content hash of a record, independent of key order.
+    """
+    payload = json.dumps(record, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def make_lineage_key(dataset_id, model, system_prompt, user_prompt) -> str:
+    """
+    Identify the versions of a dataset audited with the same backend, model and prompts.
+    dataset_id is chosen by the caller (the batch CLI uses the file path, the app asks
+    for it), never a bare upload name that unrelated files may share.
+    """
+    payload = json.dumps([dataset_id, config.LLM_BACKEND, model, system_prompt, user_prompt])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _connect():
+    path = os.path.join(config.AUDIT_CACHE_DIR, "record_history.sqlite3")
+    if path not in _initialized_paths:
+        os.makedirs(config.AUDIT_CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    if path not in _initialized_paths:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS record_results ("
+            " lineage TEXT NOT NULL,"
+            " record_key TEXT NOT NULL,"
+            " fingerprint TEXT NOT NULL,"
+            " result TEXT NOT NULL,"
+            " audited_at REAL NOT NULL,"
+            " PRIMARY KEY (lineage, record_key))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS audit_runs ("
+            " lineage TEXT PRIMARY KEY,"
+            " file_name TEXT NOT NULL,"
+            " data_quality_score REAL,"
+            " summary_text TEXT NOT NULL DEFAULT '',"
+            " audited_at REAL NOT NULL)"
+        )
+        conn.commit()
+        _initialized_paths.add(path)
+    return conn
+
+
+def previous_run(lineage):
+    """
+    Return the last completed audit of a lineage as a dict, or None.
+    """
+    try:
+        with _lock:
+            conn = _connect()
+            try:
+                row = conn.execute(
+                    "SELECT data_quality_score, summary_text, audited_at FROM audit_runs WHERE lineage = ?",
+                    (lineage,),
+                ).fetchone()
+            finally:
+                conn.close()
+    except sqlite3.Error as e:
+        logging.warning(f"Record history read failed: {e}")
+        return None
+    if row is None:
+        return None
+    return {"data_quality_score": row[0], "summary_text": row[1], "audited_at": row[2]}
+
+
+def load_previous(lineage, record_keys) -> dict:
+    """
+    Return {record_key: (fingerprint, result)} of previously audited records.
+    """
+    previous = {}
+    try:
+        with _lock:
+            conn = _connect()
+            try:
+                for start in range(0, len(record_keys), QUERY_BATCH_SIZE):
+                    keys = record_keys[start:start + QUERY_BATCH_SIZE]
+                    rows = conn.execute(
+                        f"SELECT record_key, fingerprint, result FROM record_results "
+                        f"WHERE lineage = ? AND record_key IN ({', '.join('?' * len(keys))})",
+                        (lineage, *keys),
+                    ).fetchall()
+                    for record_key, fingerprint, result in rows:
+                        previous[record_key] = (fingerprint, json.loads(result))
+            finally:
+                conn.close()
+    except sqlite3.Error as e:
+        logging.warning(f"Record history read failed: {e}")
+    return previous
+
+
+def save_records(lineage, rows):
+    """
+    Store (record_key, fingerprint, result) rows of freshly audited records.
+    """
+    now = time.time()
+    try:
+        with _lock:
+            conn = _connect()
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO record_results (lineage, record_key, fingerprint, result, audited_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (lineage, record_key, fingerprint, json.dumps(result, ensure_ascii=False, default=str), now)
+                        for record_key, fingerprint, result in rows
+                    ],
+                )
+                conn.commit()
+            finally:
+                conn.close()
+    except sqlite3.Error as e:
+        logging.warning(f"Record history write failed: {e}")
+
+
+def finish_run(lineage, file_name, seen_keys, data_quality_score, summary_text, complete):
+    """
+    Record a completed audit of a lineage. If the whole file was audited
+    (complete), records missing from this version are removed from the
+    history and their keys are returned.
+    """
+    removed = []
+    try:
+        with _lock:
+            conn = _connect()
+            try:
+                if complete:
+                    stored = [row[0] for row in conn.execute(
+                        "SELECT record_key FROM record_results WHERE lineage = ?", (lineage,)
+                    )]
+                    removed = [key for key in stored if key not in seen_keys]
+                    conn.executemany(
+                        "DELETE FROM record_results WHERE lineage = ? AND record_key = ?",
+                        [(lineage, key) for key in removed],
+                    )
+                conn.execute(
+                    "INSERT OR REPLACE INTO audit_runs (lineage, file_name, data_quality_score, summary_text, audited_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (lineage, os.path.basename(file_name), data_quality_score, summary_text or "", time.time()),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+    except sqlite3.Error as e:
+        logging.warning(f"Record history write failed: {e}")
+    return removed
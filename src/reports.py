@@ -0,0 +1,154 @@
+# =====================================
+# File: reports.py
+# Description:
+#   Report rendering and machine-readable exports of audit results.
+#   Reports are rendered on demand and memoised on disk by a hash of the
+#   results, so a report nobody downloads is never rendered and one that
+#   is downloaded again is served from the file. Besides the PDF, findings
+#   can be exported as JSONL, CSV or Parquet (one row per deviation).
+# =====================================
+
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+import config
+from src.metrics import span
+
+# Format -> (file suffix, MIME type)
+REPORT_FORMATS = {
+    "pdf": ("audit_report.pdf", "application/pdf"),
+    "jsonl": ("findings.jsonl", "application/x-ndjson"),
+    "csv": ("findings.csv", "text/csv"),
+    "parquet": ("findings.parquet", "application/vnd.apache.parquet"),
+}
+
+FINDING_COLUMNS = ["file", "record_id", "severity", "type", "description"]
+
+
+def results_hash(audit_results, file_name, summary_stats, audited_at=None) -> str:
+    """
+    Content hash identifying the reports of an audit result finished at audited_at.
+    """
+    payload = json.dumps(
+        [audit_results, os.path.basename(file_name), summary_stats, audited_at, config.PDF_MAX_FINDINGS],
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def iter_findings(audit_results, file_name):
+    """
+    Yield one flat row per deviation, in record order.
+    """
+    file_name = os.path.basename(file_name)
+    for rec in audit_results.get("records", []):
+        rec_id = rec.get("id")
+        for dev in rec.get("deviations") or []:
+            yield {
+                "file": file_name,
+                "record_id": None if rec_id is None else str(rec_id),
+                "severity": dev.get("severity"),
+                "type": dev.get("type"),
+                "description": dev.get("description"),
+            }
+
+
+def _write_jsonl(audit_results, file_name, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for row in iter_findings(audit_results, file_name):
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def _write_csv(audit_results, file_name, path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FINDING_COLUMNS)
+        writer.writeheader()
+        writer.writerows(iter_findings(audit_results, file_name))
+
+
+def _write_parquet(audit_results, file_name, path):
+    import pandas as pd
+    frame = pd.DataFrame.from_records(list(iter_findings(audit_results, file_name)), columns=FINDING_COLUMNS)
+    frame.to_parquet(path, index=False)
+
+
+def write_report(audit_results, file_name, summary_stats, fmt, path, audited_at=None):
+    """
+    Render one report format of an audit result to path.
+    The PDF is stamped with audited_at (epoch seconds, default now).
+    """
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format '{fmt}'. Must be one of: {', '.join(REPORT_FORMATS)}.")
+    with span(f"report_{fmt}", records=len(audit_results.get("records", []))) as fields:
+        if fmt == "pdf":
+            # fpdf is only loaded once a PDF is rendered
+            from src.pdf_generator import generate_audit_report
+            generate_audit_report(
+                audit_results=audit_results,
+                original_filename=file_name,
+                summary_stats=summary_stats,
+                output_path=path,
+                audited_at=audited_at
+            )
+        elif fmt == "jsonl":
+            _write_jsonl(audit_results, file_name, path)
+        elif fmt == "csv":
+            _write_csv(audit_results, file_name, path)
+        else:
+            _write_parquet(audit_results, file_name, path)
+        fields["bytes"] = os.path.getsize(path)
+    return path
+
+
+def report_path(digest, fmt):
+    """
+    Location of the memoised report of a results hash.
+    """
+    return os.path.join(config.REPORT_DIR, f"{digest}.{fmt}")
+
+
+def render_report(audit_results, file_name, summary_stats, fmt="pdf", digest=None, audited_at=None):
+    """
+    Return the path of a report, rendering it only if it isn't memoised yet.
+    audit_results may be a callable returning the results (with the digest
+    given), so they are only loaded when the report has to be rendered.
+    """
+    if digest is None:
+        digest = results_hash(audit_results, file_name, summary_stats, audited_at)
+    path = report_path(digest, fmt)
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+
+    os.makedirs(config.REPORT_DIR, exist_ok=True)
+    _prune()
+    if callable(audit_results):
+        audit_results = audit_results()
+    start = time.time()
+    # Render under a temporary name so concurrent requests never see a partial file
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        write_report(audit_results, file_name, summary_stats, fmt, tmp_path, audited_at)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logging.info(f"Rendered {fmt} report of {os.path.basename(file_name)} in {time.time() - start:.2f}s")
+    return path
+
+
+def _prune():
+    # Drop memoised reports not requested for REPORT_RETENTION_DAYS
+    cutoff = time.time() - config.REPORT_RETENTION_DAYS * 86400
+    for name in os.listdir(config.REPORT_DIR):
+        path = os.path.join(config.REPORT_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,271 @@
+# =====================================
+# File: rules.py
+# Description:
+#   Vectorised, deterministic pre-screening of flat recipe records.
+#   Emits deviations for checks that do not need LLM judgement
+#   (missing fields, timestamps, status values, quantity ranges)
+#   and decides which records still have to be sent to the LLM.
+# =====================================
+
+import re
+
+import numpy as np
+import pandas as pd
+
+import config
+from src.severity import severity_mapping
+
+# Columns that identify the flat recipe execution schema
+SCHEMA_COLUMNS = {"id", "quantity_kg", "start_time", "end_time", "status"}
+
+MANDATORY_FIELDS = [
+    "id", "material_code", "process_step", "quantity_kg",
+    "start_time", "end_time", "status", "operator",
+]
+TIMESTAMP_FIELDS = ["start_time", "end_time"]
+ALLOWED_STATUSES = ["in progress", "completed"]
+
+QUANTITY_MIN_KG = 0.01
+QUANTITY_MAX_KG = 1000.0
+# Quantities up to this factor above the maximum are "slightly" out of range
+QUANTITY_TOLERANCE = 1.1
+
+ISO_8601_PATTERN = (
+    r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?$"
+)
+
+# Which records are sent to the LLM after local screening
+LLM_SCOPES = ("all", "unflagged", "none")
+
+# Integral ids written as floats (CSV columns with gaps are read as float)
+FLOAT_ID_PATTERN = r"^(-?\d+)\.0+$"
+
+
+def applies_to(df: pd.DataFrame) -> bool:
+    """
+    Return True if the DataFrame has the flat schema the rules are written for.
+    """
+    return SCHEMA_COLUMNS.issubset(df.columns)
+
+
+def _text(series: pd.Series) -> pd.Series:
+    # String view of a column with missing values as empty strings
+    return series.astype("string").fillna("")
+
+
+def _missing(df: pd.DataFrame, texts: dict, field: str) -> np.ndarray:
+    if field not in df.columns:
+        return np.ones(len(df), dtype=bool)
+    return (df[field].isna() | (texts[field].str.strip() == "")).to_numpy()
+
+
+def normalize_id(value) -> str:
+    """
+    Text of a record id as matched across batches and LLM results: 1, "1" and "1.0" are the same record.
+    """
+    return re.sub(FLOAT_ID_PATTERN, r"\1", str(value).strip())
+
+
+def _parse_timestamps(text: pd.Series):
+    """
+    Return (parsed timestamps, ISO 8601 mask) for a column of timestamp strings.
+    Non-ISO values are parsed leniently so sequence checks still work.
+    """
+    is_iso = text.str.match(ISO_8601_PATTERN).fillna(False).to_numpy(dtype=bool)
+    parsed = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns, UTC]")
+    if is_iso.any():
+        parsed[is_iso] = pd.to_datetime(text[is_iso], errors="coerce", utc=True, format="ISO8601")
+    other = ~is_iso & (text.str.strip() != "").to_numpy()
+    if other.any():
+        parsed[other] = pd.to_datetime(text[other], errors="coerce", utc=True, format="mixed")
+    return parsed, is_iso
+
+
+def screen_records(df: pd.DataFrame, seen_ids=None) -> list:
+    """
+    Run all deterministic checks over the DataFrame.
+    Returns one list of deviations per row, in the same shape as LLM deviations.
+    seen_ids is an optional set of ids from earlier batches of the same file;
+    it is used for duplicate detection and updated with this batch's ids.
+    """
+    checks = []  # (mask, deviation type, description template, field filled into {value})
+    # Convert each column to strings once; most checks work on the text view
+    texts = {field: _text(df[field]) for field in df.columns}
+
+    # Fields absent from the whole upload (e.g. a CSV without an operator column) are not checked
+    for field in (field for field in MANDATORY_FIELDS if field in df.columns):
+        checks.append((_missing(df, texts, field), "Missing Mandatory Field", f"Field '{field}' is missing or empty.", None))
+
+    parsed = {}
+    for field in TIMESTAMP_FIELDS:
+        text = texts[field]
+        timestamps, is_iso = _parse_timestamps(text)
+        present = ~_missing(df, texts, field)
+        unparseable = present & timestamps.isna().to_numpy()
+        checks.append((
+            unparseable,
+            "Invalid Date Format",
+            f"Field '{field}' value '{{value}}' is not a valid timestamp.",
+            field,
+        ))
+        checks.append((
+            present & ~is_iso & ~unparseable,
+            "Non-Standard Timestamp",
+            f"Field '{field}' value '{{value}}' does not follow ISO 8601 (YYYY-MM-DDThh:mm:ss).",
+            field,
+        ))
+        parsed[field] = timestamps
+
+    start, end = parsed["start_time"], parsed["end_time"]
+    out_of_sequence = (start.notna() & end.notna() & (start >= end)).to_numpy()
+    checks.append((out_of_sequence, "Timestamp Sequence Error", "start_time is not earlier than end_time.", None))
+
+    status_raw = texts["status"]
+    status = status_raw.str.strip().str.lower()
+    status_present = ~_missing(df, texts, "status")
+    allowed = status.isin(ALLOWED_STATUSES).to_numpy()
+    checks.append((
+        status_present & ~allowed,
+        "Invalid Status",
+        "Status '{value}' is not one of: " + ", ".join(ALLOWED_STATUSES) + ".",
+        "status",
+    ))
+    checks.append((
+        allowed & (status_raw.str.strip() != status).to_numpy(),
+        "Inconsistent Casing",
+        "Status '{value}' should be lower case.",
+        "status",
+    ))
+    checks.append((
+        (status == "completed").to_numpy() & _missing(df, texts, "end_time"),
+        "Conflicting Status Code",
+        "Status is 'completed' but end_time is missing.",
+        None,
+    ))
+
+    quantity_raw = df["quantity_kg"]
+    quantity = pd.to_numeric(quantity_raw, errors="coerce").to_numpy(dtype=float)
+    quantity_present = ~_missing(df, texts, "quantity_kg")
+    with np.errstate(invalid="ignore"):
+        checks.append((
+            quantity_present & np.isnan(quantity),
+            "Format Error",
+            "quantity_kg '{value}' is not a number.",
+            "quantity_kg",
+        ))
+        checks.append((quantity < 0, "Negative Quantity", "quantity_kg {value} is negative.", "quantity_kg"))
+        checks.append((
+            (quantity >= 0) & (quantity < QUANTITY_MIN_KG),
+            "Value Out of Range",
+            "quantity_kg {value} is below the minimum of " + f"{QUANTITY_MIN_KG:g} kg.",
+            "quantity_kg",
+        ))
+        checks.append((
+            (quantity > QUANTITY_MAX_KG) & (quantity <= QUANTITY_MAX_KG * QUANTITY_TOLERANCE),
+            "Slightly Out of Range Quantity",
+            "quantity_kg {value} slightly exceeds the maximum of " + f"{QUANTITY_MAX_KG:g} kg.",
+            "quantity_kg",
+        ))
+        checks.append((
+            quantity > QUANTITY_MAX_KG * QUANTITY_TOLERANCE,
+            "Grossly Incorrect Quantity",
+            "quantity_kg {value} far exceeds the maximum of " + f"{QUANTITY_MAX_KG:g} kg.",
+            "quantity_kg",
+        ))
+
+    ids = df["id"]
+    id_keys = texts["id"].str.strip().str.replace(FLOAT_ID_PATTERN, r"\1", regex=True)
+    duplicated = ids.notna() & id_keys.duplicated(keep="first")
+    if seen_ids is not None:
+        duplicated |= ids.notna() & id_keys.isin(seen_ids)
+        seen_ids.update(id_keys[ids.notna()].tolist())
+    duplicated = duplicated.to_numpy()
+    checks.append((duplicated, "Duplicate Record", "Record id '{value}' appears more than once.", "id"))
+
+    for field in df.columns:
+        if df[field].dtype != object and not pd.api.types.is_string_dtype(df[field]):
+            continue
+        text = texts[field]
+        spaced = (text != text.str.strip()) | text.str.contains("  ", regex=False)
+        checks.append((spaced.to_numpy(), "Extra Spaces", f"Field '{field}' has leading, trailing or repeated spaces.", None))
+
+    findings = [[] for _ in range(len(df))]
+    for mask, dev_type, template, value_field in checks:
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            continue
+        severity = severity_mapping[dev_type]
+        values = texts[value_field].to_numpy()[rows] if value_field else None
+        for position, row in enumerate(rows):
+            findings[row].append({
+                "type": dev_type,
+                "severity": severity,
+                "description": template.format(value=values[position]) if value_field else template,
+            })
+
+    return findings
+
+
+def select_for_llm(findings, scope=None) -> list:
+    """
+    Return the row indices that still need LLM judgement.
+    - all: every record (local findings are merged into the LLM result)
+    - unflagged: only records without local findings; flagged records are settled locally
+    - none: no records, the audit is fully local
+    """
+    scope = (scope or config.RULES_LLM_SCOPE).lower()
+    if scope not in LLM_SCOPES:
+        raise ValueError(f"Invalid RULES_LLM_SCOPE '{scope}'. Must be one of: {', '.join(LLM_SCOPES)}.")
+    if scope == "all":
+        return list(range(len(findings)))
+    if scope == "unflagged":
+        return [index for index, devs in enumerate(findings) if not devs]
+    return []
+
+
+def combine_results(record_ids, findings, llm_indices, llm_result):
+    """
+    Merge local findings with the LLM result for the reviewed subset.
+    Returns a result with records in original order, data_quality_score and summary_text.
+    """
+    llm_result = llm_result or {}
+    llm_records = {}
+    unmatched = []
+    for rec in llm_result.get("records", []):
+        rec_id = normalize_id(rec.get("id"))
+        if rec_id in llm_records:
+            unmatched.append(rec)
+        else:
+            llm_records[rec_id] = rec
+
+    reviewed = set(llm_indices)
+    records = []
+    for index, rec_id in enumerate(record_ids):
+        local = findings[index]
+        if index in reviewed and normalize_id(rec_id) in llm_records:
+            rec = llm_records.pop(normalize_id(rec_id))
+            deviations = list(rec.get("deviations") or [])
+            known_types = {dev.get("type", "").strip() for dev in deviations}
+            deviations.extend(dev for dev in local if dev["type"] not in known_types)
+            records.append({**rec, "deviations": deviations})
+        else:
+            records.append({"id": rec_id, "deviations": list(local)})
+    records.extend(llm_records.values())
+    records.extend(unmatched)
+
+    local_count = len(record_ids) - len(reviewed)
+    local_compliant = sum(1 for index in range(len(record_ids)) if index not in reviewed and not findings[index])
+
+    scores = []
+    if local_count:
+        scores.append((max(1, round(10 * local_compliant / local_count)), local_count))
+    if reviewed and "data_quality_score" in llm_result:
+        scores.append((llm_result["data_quality_score"], len(reviewed)))
+    weight = sum(count for _, count in scores)
+    data_quality_score = round(sum(score * count for score, count in scores) / weight) if weight else 5
+
+    return {
+        "summary_text": llm_result.get("summary_text") or "",
+        "data_quality_score": data_quality_score,
+        "records": records,
+    }
@@ -0,0 +1,71 @@
+# =====================================
+# File: severity.py
+# Description:
+#   Canonical mapping of deviation types to severity levels,
+#   shared by the LLM result post-processing and the local rule engine.
+# =====================================
+
+severity_mapping = {
+    # Critical issues
+    "Missing Required Step": "Critical",
+    "Grossly Incorrect Quantity": "Critical",
+    "Conflicting Status Code": "Critical",
+    "Negative Quantity": "Critical",
+    "Data Conflict": "Critical",
+    "Invalid Status": "Critical",
+    "Step Contradicts Approved Recipe": "Critical",
+    "Potential Falsification": "Critical",
+    "Timestamp Sequence Error": "Critical",
+    "Missing Mandatory Field": "Critical",
+    # Moderate issues
+    "Slightly Out of Range Quantity": "Moderate",
+    "Incomplete Operator Name": "Moderate",
+    "Non-Standard Timestamp": "Moderate",
+    "Duplicate Record": "Moderate",
+    "Use of Deprecated Process Code": "Moderate",
+    "Inconsistent Sequencing": "Moderate",
+    "Missing Recommended Field": "Moderate",
+    "Format Error": "Moderate",
+    "Value Out of Range": "Moderate",
+    "Invalid Date Format": "Moderate",
+    "Partial Data Entry": "Moderate",
+    "Data Inconsistency": "Moderate",
+    # Minor issues
+    "Minor Formatting Error": "Minor",
+    "Non-Critical Typo": "Minor",
+    "Slight Naming Deviation": "Minor",
+    "Extra Spaces": "Minor",
+    "Alternative Terminology": "Minor",
+    "Timestamps Missing Seconds": "Minor",
+    "Inconsistent Casing": "Minor"
+}
+
+SEVERITY_LEVELS = ("Critical", "Moderate", "Minor")
+# Code of deviations whose severity is none of SEVERITY_LEVELS
+UNKNOWN_SEVERITY = len(SEVERITY_LEVELS)
+
+
+def normalize_label(text) -> str:
+    """
+    Case- and whitespace-insensitive form of a deviation type or severity.
+    """
+    return " ".join(str(text).split()).casefold()
+
+
+# Precomputed lookups on normalised labels: severity -> code, deviation type -> severity code
+severity_codes = {normalize_label(level): code for code, level in enumerate(SEVERITY_LEVELS)}
+type_severity_codes = {
+    normalize_label(dev_type): severity_codes[normalize_label(level)]
+    for dev_type, level in severity_mapping.items()
+}
+canonical_types = {normalize_label(dev_type): dev_type for dev_type in severity_mapping}
+
+
+def severity_code(dev_type, severity) -> int:
+    """
+    Severity code of a deviation: the mapped severity of its type, else its own.
+    """
+    code = type_severity_codes.get(normalize_label(dev_type or ""))
+    if code is None:
+        code = severity_codes.get(normalize_label(severity or ""), UNKNOWN_SEVERITY)
+    return code
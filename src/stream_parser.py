@@ -0,0 +1,123 @@
+# =====================================
+# File: stream_parser.py
+# Description:
+#   Incremental parser over a streamed LLM response.
+#   Emits each element of the top-level "records" array as soon as
+#   it is complete, while the rest of the response is still streaming,
+#   and salvages the complete records of truncated or malformed responses.
+# =====================================
+
+import json
+import logging
+import re
+
+
+class RecordStreamParser:
+    """
+    Feed response text piece by piece; completed records[] elements are
+    passed to on_record as they close. Text before the first '{' (e.g. a
+    Markdown fence) is ignored. The full text is available from text().
+    """
+
+    def __init__(self, on_record=None):
+        self.on_record = on_record
+        self.records = []
+        self._pieces = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        # Key strings at depth 1 are captured to find "records"
+        self._key_chars = None
+        self._last_key = None
+        self._records_depth = None
+        # Characters of the records[] element being read
+        self._element = None
+
+    def feed(self, piece: str):
+        self._pieces.append(piece)
+        for char in piece:
+            self._consume(char)
+
+    def text(self) -> str:
+        return "".join(self._pieces)
+
+    def _consume(self, char):
+        if not self._started:
+            if char != "{":
+                return
+            self._started = True
+
+        if self._element is not None:
+            self._element.append(char)
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._key_chars is not None:
+                    self._last_key = "".join(self._key_chars)
+                    self._key_chars = None
+                return
+            if self._key_chars is not None:
+                self._key_chars.append(char)
+            return
+
+        if char == '"':
+            self._in_string = True
+            if self._depth == 1:
+                self._key_chars = []
+        elif char in "{[":
+            if char == "[" and self._depth == 1 and self._last_key == "records":
+                self._records_depth = 2
+            elif char == "{" and self._records_depth is not None and self._depth == self._records_depth:
+                self._element = ["{"]
+            self._depth += 1
+        elif char in "}]":
+            self._depth -= 1
+            if self._element is not None and self._depth == self._records_depth:
+                self._emit("".join(self._element))
+                self._element = None
+            elif char == "]" and self._records_depth is not None and self._depth == self._records_depth - 1:
+                self._records_depth = None
+        elif char == "," and self._depth == 1:
+            self._last_key = None
+
+    def _emit(self, element_text):
+        try:
+            record = json.loads(element_text)
+        except json.JSONDecodeError:
+            logging.warning("Skipping malformed record in streamed response.")
+            return
+        self.records.append(record)
+        if self.on_record:
+            self.on_record(record)
+
+
+_SCORE_PATTERN = re.compile(r'"data_quality_score"\s*:\s*(-?\d+(?:\.\d+)?)')
+_SUMMARY_PATTERN = re.compile(r'"summary_text"\s*:\s*("(?:[^"\\]|\\.)*")', re.DOTALL)
+
+
+def salvage_response(text: str) -> dict:
+    """
+    Recover what is usable from a truncated or malformed JSON response:
+    every fully-formed records[] element, plus summary_text and
+    data_quality_score if they are intact.
+    """
+    parser = RecordStreamParser()
+    parser.feed(text)
+    salvaged = {"summary_text": "", "records": parser.records}
+
+    summary = _SUMMARY_PATTERN.search(text)
+    if summary:
+        try:
+            salvaged["summary_text"] = json.loads(summary.group(1))
+        except json.JSONDecodeError:
+            pass
+    score = _SCORE_PATTERN.search(text)
+    if score:
+        salvaged["data_quality_score"] = round(float(score.group(1)))
+    return salvaged
@@ -0,0 +1,136 @@
+# =====================================
+# File: tokens.py
+# Description:
+#   Offline token counting and per-model price lookup.
+#   Uses tiktoken for OpenAI/Azure models when its encoding files are
+#   already on disk (TIKTOKEN_CACHE_DIR, bundled in the Docker image) -
+#   nothing is downloaded; otherwise a calibrated approximation.
+# =====================================
+
+import hashlib
+import json
+import logging
+import os
+import string
+import tempfile
+from functools import lru_cache
+
+import config
+
+# USD per 1M tokens (input, output); override with LLM_PRICE_TABLE (JSON file)
+DEFAULT_PRICE_TABLE = {
+    "gpt-4o": {"input": 2.50, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+    "gpt-35-turbo": {"input": 0.50, "output": 1.50},
+    "gpt-3.5-turbo": {"input": 0.50, "output": 1.50},
+    "gemini-1.5-pro": {"input": 1.25, "output": 5.00},
+    "gemini-1.5-flash": {"input": 0.075, "output": 0.30},
+}
+FALLBACK_PRICES = {"input": 5.00, "output": 15.00}
+
+# Model name prefixes whose tokenizer is available through tiktoken
+TIKTOKEN_PREFIXES = ("gpt-", "o1", "o3")
+# Where tiktoken fetches the BPE file of an encoding; its cache is keyed by this URL
+TIKTOKEN_BLOB_URL = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+
+# Approximation of BPE tokenizers: short words are one token, longer words
+# add a token per few letters, digits group in short runs, symbols mostly stand alone.
+# Characters are mapped to classes with str.translate and counted with str.count,
+# which is an order of magnitude faster than regex matching on large prompts.
+_CHAR_CLASSES = str.maketrans(
+    {chr(code): "#" for code in range(128)}
+    | {char: "a" for char in string.ascii_letters}
+    | {char: "0" for char in string.digits}
+    | {char: " " for char in string.whitespace}
+)
+LETTERS_PER_WORD_TOKEN = 6
+LETTERS_PER_EXTRA_TOKEN = 4
+DIGITS_PER_TOKEN = 2.5
+SYMBOL_TOKEN_RATIO = 0.8
+
+
+@lru_cache(maxsize=None)
+def _tiktoken_encoder(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        # Azure deployment names (e.g. gpt-35-turbo) are unknown to tiktoken
+        name = "o200k_base" if "4o" in model else "cl100k_base"
+    if not _tiktoken_cached(name):
+        # Loading it would download the BPE file; estimates must stay offline
+        logging.info(f"tiktoken encoding '{name}' is not cached, using approximation")
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logging.warning(f"tiktoken encoding for '{model}' unavailable, using approximation: {e}")
+        return None
+
+
+def _tiktoken_cached(name: str) -> bool:
+    # Same cache location and file name as tiktoken.load.read_file_cached
+    cache_dir = os.environ.get("TIKTOKEN_CACHE_DIR")
+    if cache_dir is None:
+        cache_dir = os.environ.get("DATA_GYM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "data-gym-cache"))
+    if not cache_dir:
+        return False
+    cache_key = hashlib.sha1(TIKTOKEN_BLOB_URL.format(name).encode()).hexdigest()
+    return os.path.exists(os.path.join(cache_dir, cache_key))
+
+
+def _approximate_tokens(text: str) -> int:
+    classes = text.translate(_CHAR_CLASSES)
+    letters = classes.count("a")
+    digits = classes.count("0")
+    whitespace = classes.count(" ")
+    symbols = len(classes) - letters - digits - whitespace
+    # A word starts wherever a letter follows a non-letter
+    words = classes.count(" a") + classes.count("#a") + classes.count("0a") + classes.startswith("a")
+
+    extra_letters = max(0, letters - LETTERS_PER_WORD_TOKEN * words)
+    word_tokens = words + extra_letters / LETTERS_PER_EXTRA_TOKEN
+    digit_tokens = digits / DIGITS_PER_TOKEN
+    symbol_tokens = symbols * SYMBOL_TOKEN_RATIO
+    newline_tokens = text.count("\n")
+    return int(word_tokens + digit_tokens + symbol_tokens + newline_tokens) + 1
+
+
+def count_tokens(text: str, model: str = None) -> int:
+    """
+    Count the tokens of a text for the given model, offline.
+    """
+    if model and model.startswith(TIKTOKEN_PREFIXES):
+        encoder = _tiktoken_encoder(model)
+        if encoder is not None:
+            return len(encoder.encode(text, disallowed_special=()))
+    return _approximate_tokens(text)
+
+
+@lru_cache(maxsize=1)
+def _price_table() -> dict:
+    table = dict(DEFAULT_PRICE_TABLE)
+    if config.LLM_PRICE_TABLE:
+        try:
+            with open(config.LLM_PRICE_TABLE, encoding="utf-8") as f:
+                table.update(json.load(f))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not load price table {config.LLM_PRICE_TABLE}: {e}")
+    return table
+
+
+def get_prices(model: str) -> dict:
+    """
+    Return the input/output price per 1M tokens of a model.
+    Versioned model names match their longest known prefix (e.g. gpt-4o-2024-08-06).
+    """
+    table = _price_table()
+    if model in table:
+        return table[model]
+    matches = [name for name in table if model and model.startswith(name)]
+    if matches:
+        return table[max(matches, key=len)]
+    return FALLBACK_PRICES
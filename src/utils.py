@@ -3,19 +3,16 @@
 
 import re
 
+from src.tokens import get_prices
 
-def estimate_cost(num_tokens: int, model: str) -> float:
+
+def estimate_cost(input_tokens: int, output_tokens: int, model: str) -> float:
     """
-    Estimate the cost of processing tokens for a specific model.
+    Estimate the cost in USD of processing tokens for a specific model,
+    using the configurable price table.
     """
-    if model.startswith("gpt-3.5"):
-        price_per_1k = 0.001  # USD per 1K tokens (input only)
-    elif model.startswith("gpt-4o"):
-        price_per_1k = 0.005  # USD per 1K tokens (input only)
-    else:
-        price_per_1k = 0.01  # fallback/default for unknown models
-
-    return round((num_tokens / 1000) * price_per_1k, 4)
+    prices = get_prices(model)
+    return round((input_tokens * prices["input"] + output_tokens * prices["output"]) / 1_000_000, 4)
 
 
 def extract_file_metadata(uploaded_file, content_bytes):
@@ -0,0 +1,74 @@
+# =====================================
+# File: conftest.py
+# Description:
+#   Shared pytest setup: the repository and src/ on sys.path (as in
+#   app.py and the benchmarks), no metric logs, and every cache in a
+#   per-test temporary directory. The backend fixture replaces the LLM
+#   with a local stand-in that flags every record it is sent.
+# =====================================
+
+import csv
+import json
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'src')]
+os.environ.setdefault("METRICS_LOG", "false")
+
+import pytest
+
+import config
+from src import audit
+from src.backends import LLMBackend
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "AUDIT_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+class RecordingBackend(LLMBackend):
+    """
+    Flags every record it is sent and remembers their ids.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.calls = 0
+
+    def complete(self, system_prompt, instructions, data, model, on_text=None, usage=None):
+        text = data.split(":\n", 1)[1]
+        if "CSV with a header row" in data:
+            # Tabular prompts list the records after an optional value dictionary
+            records = list(csv.DictReader(text.split("Records:\n", 1)[-1].splitlines()))
+        else:
+            records = json.loads(text)
+        self.calls += 1
+        self.sent.extend(record["id"] for record in records)
+        text = json.dumps({
+            "summary_text": "ok",
+            "data_quality_score": 7,
+            "records": [
+                {"id": record["id"], "deviations": [
+                    {"type": "Non-Critical Typo", "severity": "Minor", "description": f"typo in {record['id']}"}
+                ]}
+                for record in records
+            ],
+        })
+        if on_text:
+            # Streamed in small pieces, as providers do
+            for start in range(0, len(text), 16):
+                on_text(text[start:start + 16])
+        return text
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = RecordingBackend()
+    monkeypatch.setattr(audit, "get_backend", lambda name=None: backend)
+    monkeypatch.setattr(config, "PROMPT_ENCODING", "minified")
+    monkeypatch.setattr(config, "DEDUP_ENABLED", False)
+    monkeypatch.setattr(config, "CHECKPOINT_ENABLED", False)
+    return backend
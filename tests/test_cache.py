@@ -0,0 +1,70 @@
+import time
+
+import config
+from src.audit import analyze_chunk, analyze_recipe
+from src.cache import cache_stats, get_cached_result, make_cache_key, store_result
+
+
+def test_key_covers_everything_that_determines_the_result():
+    key = make_cache_key("OPENAI", "gpt-4o", "system", "user", [{"id": 1, "a": 2}])
+    assert key == make_cache_key("OPENAI", "gpt-4o", "system", "user", [{"a": 2, "id": 1}])
+    assert key != make_cache_key("GEMINI", "gpt-4o", "system", "user", [{"id": 1, "a": 2}])
+    assert key != make_cache_key("OPENAI", "gpt-4o-mini", "system", "user", [{"id": 1, "a": 2}])
+    assert key != make_cache_key("OPENAI", "gpt-4o", "other", "user", [{"id": 1, "a": 2}])
+    assert key != make_cache_key("OPENAI", "gpt-4o", "system", "other", [{"id": 1, "a": 2}])
+    assert key != make_cache_key("OPENAI", "gpt-4o", "system", "user", [{"id": 1, "a": 3}])
+
+
+def test_results_are_stored_and_read_back():
+    before = cache_stats()
+    assert get_cached_result("missing") is None
+    store_result("key", {"records": [{"id": 1, "deviations": []}]})
+    assert get_cached_result("key") == {"records": [{"id": 1, "deviations": []}]}
+    after = cache_stats()
+    assert (after["misses"] - before["misses"], after["hits"] - before["hits"]) == (1, 1)
+
+
+def test_expired_results_are_misses(monkeypatch):
+    store_result("key", {"records": []})
+    monkeypatch.setattr(config, "AUDIT_CACHE_MAX_AGE_DAYS", 0)
+    time.sleep(0.01)
+    assert get_cached_result("key") is None
+
+
+def test_least_recently_used_results_are_evicted(monkeypatch):
+    monkeypatch.setattr(config, "AUDIT_CACHE_MAX_BYTES", 120)
+    store_result("old", {"text": "x" * 40})
+    store_result("used", {"text": "y" * 40})
+    get_cached_result("old")
+    store_result("new", {"text": "z" * 40})
+    assert get_cached_result("used") is None
+    assert get_cached_result("old") is not None
+    assert get_cached_result("new") is not None
+
+
+def test_repeated_audit_is_served_from_the_cache(backend, monkeypatch):
+    monkeypatch.setattr(config, "CHUNK_MAX_RECORDS", 3)
+    records = [{"id": f"R{index}", "quantity_kg": index} for index in range(8)]
+    first = analyze_recipe(records, "gpt-4o", "system", "user")
+    assert backend.calls == 3
+
+    assert analyze_recipe(records, "gpt-4o", "system", "user")["records"] == first["records"]
+    assert backend.calls == 3
+    analyze_recipe(records, "gpt-4o", "system", "user", use_cache=False)
+    assert backend.calls == 6
+    analyze_recipe(records, "gpt-4o", "system", "other")
+    assert backend.calls == 9
+
+
+def test_value_dictionary_is_part_of_the_chunk_key(backend, monkeypatch):
+    monkeypatch.setattr(config, "PROMPT_ENCODING", "tabular")
+    records = [{"id": f"R{index}", "operator": "A. Meier", "status": "completed"} for index in range(4)]
+
+    monkeypatch.setattr(config, "PROMPT_DICTIONARY", False)
+    analyze_chunk(records, "gpt-4o", "system", "user")
+    monkeypatch.setattr(config, "PROMPT_DICTIONARY", True)
+    analyze_chunk(records, "gpt-4o", "system", "user")
+    # The dictionary changes the prompt, so the result can't be shared
+    assert backend.calls == 2
+    analyze_chunk(records, "gpt-4o", "system", "user")
+    assert backend.calls == 2
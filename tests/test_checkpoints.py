@@ -0,0 +1,69 @@
+import io
+import json
+
+import pytest
+
+import config
+from src.audit_pipeline import _run_settings, audit_source
+from src.checkpoints import clear_checkpoints, count_checkpoints, get_checkpoint, make_run_key, save_checkpoint
+
+
+def test_run_key_covers_content_and_settings():
+    source = io.BytesIO(b'[{"id": 1}]')
+    key = make_run_key(source, {"model": "gpt-4o"})
+    assert source.tell() == 0
+    assert key == make_run_key('[{"id": 1}]', {"model": "gpt-4o"})
+    assert key != make_run_key('[{"id": 2}]', {"model": "gpt-4o"})
+    assert key != make_run_key('[{"id": 1}]', {"model": "gpt-4o-mini"})
+
+
+def test_checkpoints_are_stored_per_run():
+    save_checkpoint("run", "chunk-1", {"records": [{"id": 1}]})
+    save_checkpoint("run", "chunk-2", {"records": [{"id": 2}]})
+    save_checkpoint("other", "chunk-1", {"records": []})
+    assert get_checkpoint("run", "chunk-1") == {"records": [{"id": 1}]}
+    assert get_checkpoint("run", "chunk-3") is None
+    assert count_checkpoints("run") == 2
+
+    clear_checkpoints("run")
+    assert count_checkpoints("run") == 0
+    assert count_checkpoints("other") == 1
+
+
+def test_old_checkpoints_are_dropped(monkeypatch):
+    save_checkpoint("run", "chunk-1", {"records": []})
+    monkeypatch.setattr(config, "CHECKPOINT_MAX_AGE_DAYS", -1)
+    save_checkpoint("run", "chunk-2", {"records": []})
+    assert count_checkpoints("run") == 0
+
+
+def test_rerun_of_a_failed_audit_only_sends_the_remaining_chunks(backend, monkeypatch):
+    monkeypatch.setattr(config, "CHECKPOINT_ENABLED", True)
+    monkeypatch.setattr(config, "CHUNK_MAX_RECORDS", 3)
+    monkeypatch.setattr(config, "CHUNK_MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(config, "AUDIT_CONCURRENCY", 1)
+    records = [{"id": f"R{index}", "status": "completed"} for index in range(8)]
+    text = json.dumps(records)
+
+    complete = backend.complete
+
+    def fail_on_r4(system_prompt, instructions, data, *args, **kwargs):
+        if '"R4"' in data:
+            raise RuntimeError("provider unavailable")
+        return complete(system_prompt, instructions, data, *args, **kwargs)
+
+    monkeypatch.setattr(backend, "complete", fail_on_r4)
+    with pytest.raises(RuntimeError):
+        audit_source(io.BytesIO(text.encode()), "json", 100, "gpt-4o", "system", "user", use_cache=False)
+    assert backend.sent[:3] == ["R0", "R1", "R2"]
+    run_key = make_run_key(text, _run_settings(100, "gpt-4o", "system", "user"))
+    assert count_checkpoints(run_key) >= 1
+
+    backend.sent.clear()
+    monkeypatch.setattr(backend, "complete", complete)
+    result_json, _, _, _ = audit_source(io.BytesIO(text.encode()), "json", 100, "gpt-4o", "system", "user",
+                                        use_cache=False)
+    assert "R0" not in backend.sent and backend.sent[:3] == ["R3", "R4", "R5"]
+    assert [rec["id"] for rec in result_json["records"]] == [rec["id"] for rec in records]
+    # A completed run leaves no checkpoints behind
+    assert count_checkpoints(run_key) == 0
@@ -0,0 +1,89 @@
+import config
+from src.audit import analyze_recipe
+from src.chunking import estimate_output_tokens, get_token_budget, merge_chunk_results, split_into_chunks
+
+BACKEND = "OPENAI"
+MODEL = "gpt-4o"
+
+
+def _records(count):
+    return [{"id": f"R{index}", "process_step": "Mixing", "quantity_kg": index} for index in range(count)]
+
+
+def test_token_budget_is_capped_by_the_settings(monkeypatch):
+    monkeypatch.setattr(config, "CHUNK_MAX_INPUT_TOKENS", 1000)
+    monkeypatch.setattr(config, "CHUNK_MAX_OUTPUT_TOKENS", 500)
+    assert get_token_budget(BACKEND, MODEL) == {"input": 1000, "output": 500}
+
+
+def test_chunks_cover_every_record_in_order(monkeypatch):
+    monkeypatch.setattr(config, "CHUNK_MAX_RECORDS", 4)
+    records = _records(10)
+    chunks = split_into_chunks(records, BACKEND, MODEL)
+    assert [len(chunk["records"]) for chunk in chunks] == [4, 4, 2]
+    assert [chunk["start"] for chunk in chunks] == [0, 4, 8]
+    assert [rec for chunk in chunks for rec in chunk["records"]] == records
+
+
+def test_chunks_fit_the_input_budget(monkeypatch):
+    monkeypatch.setattr(config, "CHUNK_MAX_INPUT_TOKENS", 100)
+    chunks = split_into_chunks(_records(20), BACKEND, MODEL)
+    assert len(chunks) > 1
+    # The fixed prompt leaves less room for data
+    assert len(split_into_chunks(_records(20), BACKEND, MODEL, fixed_prompt_tokens=60)) > len(chunks)
+
+
+def test_chunks_fit_the_output_budget(monkeypatch):
+    monkeypatch.setattr(config, "CHUNK_MAX_OUTPUT_TOKENS", 1000)
+    monkeypatch.setattr(config, "OUTPUT_TOKENS_PER_RECORD", 100)
+    chunks = split_into_chunks(_records(20), BACKEND, MODEL)
+    assert max(len(chunk["records"]) for chunk in chunks) * 100 <= 1000
+
+
+def test_a_record_above_the_budget_gets_its_own_chunk(monkeypatch):
+    monkeypatch.setattr(config, "CHUNK_MAX_INPUT_TOKENS", 50)
+    records = _records(2) + [{"id": "big", "note": "word " * 200}] + _records(2)
+    chunks = split_into_chunks(records, BACKEND, MODEL)
+    assert {"start": 2, "records": [records[2]]} in chunks
+
+
+def test_output_estimate_is_capped_by_the_budget(monkeypatch):
+    monkeypatch.setattr(config, "CHUNK_MAX_OUTPUT_TOKENS", 1000)
+    monkeypatch.setattr(config, "OUTPUT_TOKENS_PER_RECORD", 100)
+    assert estimate_output_tokens(2, BACKEND, MODEL) < estimate_output_tokens(3, BACKEND, MODEL)
+    assert estimate_output_tokens(50, BACKEND, MODEL) == 1000
+
+
+def test_single_chunk_keeps_the_llm_summary():
+    chunks = [{"start": 0, "records": _records(2)}]
+    result = {"summary_text": " All good. ", "data_quality_score": 9, "records": [{"id": "R0", "deviations": []}]}
+    assert merge_chunk_results(chunks, [result]) == {
+        "summary_text": "All good.", "data_quality_score": 9, "records": [{"id": "R0", "deviations": []}]
+    }
+
+
+def test_chunk_scores_are_weighted_by_chunk_size():
+    chunks = [{"start": 0, "records": _records(3)}, {"start": 3, "records": _records(1)}, {"start": 4, "records": []}]
+    results = [
+        {"summary_text": "a", "data_quality_score": 8, "records": [{"id": "R0", "deviations": []}]},
+        {"summary_text": "b", "data_quality_score": 4, "records": [{"id": "R3", "deviations": [
+            {"type": "Invalid Status", "severity": "Critical", "description": "x"}
+        ]}]},
+        {"summary_text": "c", "records": []},
+    ]
+    merged = merge_chunk_results(chunks, results)
+    assert merged["data_quality_score"] == 7
+    assert [rec["id"] for rec in merged["records"]] == ["R0", "R3"]
+    # Several chunks are summarised from the merged findings, not from one chunk's summary
+    assert merged["summary_text"].startswith("1 of 2 audited records have deviations")
+
+
+def test_chunks_are_audited_and_merged_in_record_order(backend, monkeypatch):
+    monkeypatch.setattr(config, "CHUNK_MAX_RECORDS", 3)
+    progress = []
+    result = analyze_recipe(_records(8), MODEL, "system", "user", use_cache=False,
+                            progress_callback=lambda done, total: progress.append((done, total)))
+    assert backend.calls == 3
+    assert [rec["id"] for rec in result["records"]] == [f"R{index}" for index in range(8)]
+    assert progress[0] == (0, 3) and progress[-1] == (3, 3)
+
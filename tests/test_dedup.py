@@ -0,0 +1,74 @@
+from src.dedup import expand_results, group_records, record_signature
+
+VOLATILE = ("start_time", "end_time")
+
+
+def _record(rec_id, start="2024-03-01T08:00:00", end="2024-03-01T09:00:00", **fields):
+    return {"id": rec_id, "status": "completed", "start_time": start, "end_time": end, **fields}
+
+
+def test_signature_ignores_ids_and_volatile_values():
+    first = _record("R1")
+    second = _record("R2", start="2024-05-07T10:15:00", end="2024-05-07T11:00:00")
+    assert record_signature(first, VOLATILE) == record_signature(second, VOLATILE)
+    assert record_signature(first, VOLATILE) != record_signature(_record("R3", status="done"), VOLATILE)
+
+
+def test_signature_keeps_timestamp_format_and_order():
+    base = record_signature(_record("R1"), VOLATILE)
+    assert record_signature(_record("R2", start="01/03/2024 08:00"), VOLATILE) != base
+    assert record_signature(_record("R3", start="2024-03-01T10:00:00"), VOLATILE) != base
+
+
+def test_group_records():
+    records = [
+        _record("R1"),
+        _record("R2", start="2024-03-02T08:00:00", end="2024-03-02T09:00:00"),
+        _record("R3", status="done"),
+        {"status": "completed"},
+        _record("R4"),
+        _record("R4"),
+    ]
+    representatives, groups = group_records(records)
+    # Records without an id, or with a repeated id, are never grouped
+    assert representatives == [records[0], records[2], records[3], records[4], records[5]]
+    assert groups["R1"] == [(0, records[0]), (1, records[1])]
+    assert groups["R3"] == [(2, records[2])]
+    assert "R4" not in groups
+
+
+def test_expand_results_rewrites_ids_and_volatile_values():
+    records = [
+        _record("R1"),
+        _record("R10", status="in progress"),
+        _record("R2", start="2024-03-02T08:00:00", end="2024-03-02T09:00:00"),
+    ]
+    representatives, groups = group_records(records)
+    assert representatives == [records[0], records[1]]
+    result = [
+        {"id": "R10", "deviations": []},
+        {"id": "R1", "deviations": [{
+            "type": "Timestamp Sequence Error",
+            "severity": "Critical",
+            "description": "R1 (not R10) starts 2024-03-01T08:00:00 and ends 2024-03-01T09:00:00.",
+        }]},
+        {"id": "X", "deviations": []},
+    ]
+
+    expanded = expand_results(result, groups)
+
+    assert [rec["id"] for rec in expanded] == ["R1", "R10", "R2", "X"]
+    assert expanded[2]["deviations"][0]["description"] == (
+        "R2 (not R10) starts 2024-03-02T08:00:00 and ends 2024-03-02T09:00:00."
+    )
+    # The representative's own result is left untouched
+    assert expanded[0] is result[1]
+
+
+def test_signature_keeps_which_timestamps_are_invalid():
+    # Same masked format, but a different field fails to parse
+    bad_start = _record("R1", start="2024-02-30T08:00:00")
+    bad_end = _record("R2", end="2024-03-01T25:00:00")
+    assert record_signature(bad_start, VOLATILE) != record_signature(bad_end, VOLATILE)
+    assert record_signature(bad_start, VOLATILE) == record_signature(_record("R3", start="2024-04-31T08:00:00"),
+                                                                     VOLATILE)
@@ -0,0 +1,72 @@
+from src.deviation_store import (
+    build_store,
+    findings_summary,
+    record_deviation_counts,
+    records_by_severity,
+    remap_severities,
+    severity_counts,
+    top_types,
+    write_severities,
+)
+
+
+def _dev(dev_type, severity):
+    return {"type": dev_type, "severity": severity, "description": f"{dev_type} found"}
+
+
+def _records():
+    return [
+        {"id": 1, "deviations": [_dev("extra  spaces", "moderate"), _dev("Some Other Issue", "minor")]},
+        {"id": 2, "deviations": []},
+        {"id": 3, "deviations": [_dev("Invalid Status", "Minor"), _dev("Extra Spaces", "Minor")]},
+        {"id": 4},
+        {"id": 5, "deviations": [_dev("Unmapped", "unknown"), _dev(None, "Moderate")]},
+    ]
+
+
+def test_rows_point_at_their_deviation():
+    records = _records()
+    store = build_store(records)
+    assert store["record"].tolist() == [0, 0, 2, 2, 4, 4]
+    assert store["position"].tolist() == [0, 1, 0, 1, 0, 1]
+    # Types with the same normalised label share a code and the canonical name
+    assert store["type"][0] == store["type"][3]
+    assert store["type_names"][store["type"][0]] == "Extra Spaces"
+    assert store["type_names"][store["type"][5]] == "Unknown"
+    assert record_deviation_counts(store).tolist() == [2, 0, 2, 0, 2]
+
+
+def test_mapped_types_get_their_severity_written_back():
+    records = _records()
+    store = build_store(records)
+    rows = remap_severities(store)
+    write_severities(store, records, rows)
+    assert [dev["severity"] for dev in records[0]["deviations"]] == ["Minor", "Minor"]
+    assert [dev["severity"] for dev in records[2]["deviations"]] == ["Critical", "Minor"]
+    # Unknown severities of unmapped types are left as they are
+    assert [dev["severity"] for dev in records[4]["deviations"]] == ["unknown", "Moderate"]
+    assert sorted(rows.tolist()) == [0, 1, 2]
+
+
+def test_counts_and_top_types():
+    store = build_store(_records())
+    remap_severities(store)
+    assert severity_counts(store) == {"critical": 1, "moderate": 1, "minor": 3}
+    assert top_types(store, "Minor") == {"Extra Spaces": 2, "Some Other Issue": 1}
+    assert top_types(store, "Minor", limit=1) == {"Extra Spaces": 2}
+    assert top_types(store, "Critical") == {"Invalid Status": 1}
+
+
+def test_records_are_sorted_by_their_most_severe_deviation():
+    store = build_store(_records())
+    remap_severities(store)
+    assert records_by_severity(store).tolist() == [2, 4, 0]
+    assert records_by_severity(build_store([{"deviations": []}])).tolist() == []
+
+
+def test_findings_summary():
+    assert findings_summary([{"deviations": []}, {}]) == "All 2 audited records are fully compliant."
+    assert findings_summary(_records(), limit=2) == (
+        "3 of 5 audited records have deviations: 1 critical, 1 moderate and 3 minor. "
+        "Most common deviation types: Extra Spaces (2), Some Other Issue (1)."
+    )
@@ -0,0 +1,77 @@
+import io
+import json
+
+import pytest
+
+import config
+from src.audit_pipeline import audit_source, estimate_audit
+
+VALID = {
+    "id": 1,
+    "material_code": "MAT-001",
+    "process_step": "Mixing",
+    "quantity_kg": 12.5,
+    "start_time": "2024-03-01T08:00:00Z",
+    "end_time": "2024-03-01T09:30:00Z",
+    "status": "completed",
+    "operator": "A. Meier",
+}
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    monkeypatch.setattr(config, "RULES_LLM_SCOPE", "unflagged")
+    monkeypatch.setattr(config, "DEDUP_ENABLED", False)
+    monkeypatch.setattr(config, "INCREMENTAL_AUDIT", True)
+    monkeypatch.setattr(config, "INGEST_BATCH_SIZE", 40)
+
+
+def _records(count, flagged_every=0):
+    return [
+        {**VALID, "id": index, "quantity_kg": index + 1,
+         "status": "done" if flagged_every and index % flagged_every == 0 else "completed"}
+        for index in range(count)
+    ]
+
+
+def _estimate(sample, count=100, **kwargs):
+    return estimate_audit(sample, count, "gpt-4o", "system", "user", **kwargs)
+
+
+def test_sample_is_extrapolated_to_the_record_count():
+    sample = _records(20)
+    small, large = _estimate(sample, 20), _estimate(sample, 200)
+    assert (small["records"], large["records"]) == (20, 200)
+    assert 8 * small["output_tokens"] < large["output_tokens"] < 11 * small["output_tokens"]
+    assert large["estimated_cost"] > small["estimated_cost"] > 0
+    assert _estimate([], 100) == {}
+
+
+def test_records_settled_by_the_rules_are_not_counted(monkeypatch):
+    sample = _records(20, flagged_every=2)
+    unflagged = _estimate(sample)
+    assert unflagged["records"] == 50
+    monkeypatch.setattr(config, "RULES_LLM_SCOPE", "all")
+    assert _estimate(sample)["records"] == 100
+    assert _estimate(sample)["input_tokens"] > 1.5 * unflagged["input_tokens"]
+    monkeypatch.setattr(config, "RULES_LLM_SCOPE", "none")
+    assert _estimate(sample) == {}
+
+
+def test_near_duplicates_are_not_counted(monkeypatch):
+    sample = [{**VALID, "id": index} for index in range(20)]
+    assert _estimate(sample)["records"] == 100
+    monkeypatch.setattr(config, "DEDUP_ENABLED", True)
+    assert _estimate(sample)["records"] == 5
+
+
+def test_unchanged_records_are_not_counted(backend):
+    records = _records(20)
+    audit_source(io.BytesIO(json.dumps(records).encode()), "json", 100, "gpt-4o", "system", "user",
+                 dataset_id="plant-a")
+    records[0] = {**records[0], "quantity_kg": 99}
+
+    assert _estimate(records, 20, dataset_id="plant-a")["records"] == 1
+    assert _estimate(records, 20, dataset_id="plant-b")["records"] == 20
+    # Without the cache, unchanged records are audited again
+    assert _estimate(records, 20, dataset_id="plant-a", use_cache=False)["records"] == 20
@@ -0,0 +1,95 @@
+import io
+import json
+
+import pytest
+
+from src import ingest
+from src.audit_pipeline import _screen_batch
+from src.ingest import contains_null_bytes, iter_json_records, iter_record_batches
+
+RECORDS = [
+    {"id": 1, "quantity_kg": 1.5, "note": "[not] {an} \"array\"", "tags": ["a", "b"]},
+    {"id": 2, "quantity_kg": -1.5e10, "nested": {"values": [1e5, 0.25, -3]}},
+    {"id": "3", "quantity_kg": None, "done": True, "note": "café – \\ escaped"},
+]
+
+
+@pytest.fixture(params=[1, 2, 7, 1024 * 1024], ids=lambda size: f"block{size}")
+def block_size(request, monkeypatch):
+    monkeypatch.setattr(ingest, "READ_BLOCK_SIZE", request.param)
+    return request.param
+
+
+def _binary(text):
+    return io.BytesIO(text.encode("utf-8"))
+
+
+def test_json_array_is_streamed_across_blocks(block_size):
+    text = json.dumps(RECORDS, indent=2, ensure_ascii=False)
+    assert list(iter_json_records(_binary(text))) == RECORDS
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("[1.5]", [1.5]),
+    ("[1e5]", [1e5]),
+    ("[-1.5e10]", [-1.5e10]),
+    ("[ 12 , 3.25E-2 ]", [12, 0.0325]),
+    ("[true,null,\"x\"]", [True, None, "x"]),
+    ("[]", []),
+])
+def test_numbers_split_at_block_boundaries(block_size, text, expected):
+    assert list(iter_json_records(_binary(text))) == expected
+
+
+def test_single_json_document_is_one_record(block_size):
+    assert list(iter_json_records(_binary(' {"id": 1.25} '))) == [{"id": 1.25}]
+
+
+@pytest.mark.parametrize("text, message", [
+    ("[1.5", "unterminated array"),
+    ('[{"id": 1} {"id": 2}]', "expected ','"),
+    ("[1.]", "expected ','"),
+])
+def test_invalid_json_raises(block_size, text, message):
+    with pytest.raises(ValueError, match=message):
+        list(iter_json_records(_binary(text)))
+
+
+def test_invalid_utf8_raises():
+    with pytest.raises(UnicodeDecodeError):
+        list(iter_json_records(io.BytesIO(b'[{"id": "\xff"}]')))
+
+
+def test_json_batches(block_size):
+    records = [{"id": index} for index in range(10)]
+    batches = list(iter_record_batches(_binary(json.dumps(records)), "json", 4))
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert [rec for batch in batches for rec in batch] == records
+
+
+def test_csv_batches():
+    text = "id,quantity_kg,status\n" + "".join(f"{index},{index / 2},completed\n" for index in range(7))
+    batches = list(iter_record_batches(_binary(text), "csv", 3))
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert batches[2][0] == {"id": 6, "quantity_kg": 3.0, "status": "completed"}
+
+
+def test_source_stays_open_for_the_caller():
+    source = _binary("[1, 2]")
+    assert list(iter_json_records(source)) == [1, 2]
+    assert not source.closed
+
+
+def test_null_bytes_are_detected_and_the_file_is_rewound():
+    source = io.BytesIO(b'[{"id": 1}]\x00')
+    assert contains_null_bytes(source)
+    assert source.tell() == 0
+    assert not contains_null_bytes(_binary("[]"))
+
+
+def test_rows_without_id_are_labelled_by_their_row_in_the_file():
+    row = {"quantity_kg": 5, "start_time": "2024-01-01T08:00:00", "end_time": "2024-01-01T09:00:00",
+           "status": "completed"}
+    batch = [{"id": 41, **row}, {"id": None, **row}]
+    findings, llm_indices, record_ids = _screen_batch(batch, set(), start=40)
+    assert record_ids == [41, "row 42"]
@@ -0,0 +1,88 @@
+import io
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import config
+from src import jobs
+from src.jobs import DONE, QUEUED, find_finished_job, get_job, load_report, resume_jobs, submit_job
+
+
+@pytest.fixture(autouse=True)
+def job_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "JOB_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(jobs, "_executor", None)
+    yield
+    if jobs._executor is not None and hasattr(jobs._executor, "shutdown"):
+        jobs._executor.shutdown(wait=True)
+
+
+def _upload(count=5):
+    return io.BytesIO(json.dumps([{"id": f"R{index}", "status": "completed"} for index in range(count)]).encode())
+
+
+def _submit(source, **settings):
+    return submit_job(source, "batches.json", "json", 100, "gpt-4o", "system", "user", **settings)
+
+
+def _wait(job_id):
+    deadline = time.time() + 10
+    while (job := get_job(job_id))["status"] in jobs.ACTIVE_STATES:
+        assert time.time() < deadline, job
+        time.sleep(0.02)
+    return job
+
+
+def test_job_runs_in_the_background(backend):
+    job = _wait(_submit(_upload()))
+    assert job["status"] == DONE
+    assert job["result"]["summary_stats"]["total_records"] == 5
+    assert job["result"]["summary_stats"]["minor"] == 5
+    assert backend.sent == [f"R{index}" for index in range(5)]
+
+    rows = load_report(job["id"], "csv").decode("utf-8").splitlines()
+    assert len(rows) == 6 and "R4" in rows[-1]
+
+
+def test_resubmitting_an_active_job_returns_it(backend, monkeypatch):
+    release = threading.Event()
+    complete = backend.complete
+    monkeypatch.setattr(backend, "complete", lambda *args, **kwargs: release.wait(5) and complete(*args, **kwargs))
+
+    job_id = _submit(_upload())
+    assert _submit(_upload()) == job_id
+    assert _submit(_upload(), use_cache=False) != job_id
+    release.set()
+    assert _wait(job_id)["status"] == DONE
+    # A finished job is audited again
+    assert _submit(_upload()) != job_id
+
+
+def test_jobs_interrupted_by_a_restart_are_resumed(backend, monkeypatch):
+    # A pool that never runs its jobs stands in for a process that stopped
+    monkeypatch.setattr(jobs, "_executor", SimpleNamespace(submit=lambda *args: None))
+    job_id = _submit(_upload())
+    assert get_job(job_id)["status"] == QUEUED
+
+    monkeypatch.setattr(jobs, "_executor", None)
+    resume_jobs()
+    assert _wait(job_id)["status"] == DONE
+
+
+def test_jobs_of_different_files_with_known_digests_are_distinct(backend, monkeypatch):
+    # A pool that never runs its jobs keeps them active
+    monkeypatch.setattr(jobs, "_executor", SimpleNamespace(submit=lambda *args: None))
+    first = _submit(_upload(5), digest="digest-of-first")
+    assert _submit(_upload(5), digest="digest-of-first") == first
+    assert _submit(_upload(6), digest="digest-of-second") != first
+
+
+def test_finished_jobs_are_found_by_digest_and_settings(backend):
+    job_id = _wait(_submit(_upload(), digest="digest"))["id"]
+    settings = ("json", 100, "gpt-4o", "system", "user")
+    assert find_finished_job("digest", *settings) == job_id
+    assert find_finished_job("other", *settings) is None
+    assert find_finished_job("digest", *settings, use_cache=False) is None
@@ -0,0 +1,86 @@
+import json
+import logging
+import socket
+import urllib.request
+
+import pytest
+
+import config
+from src import metrics
+from src.metrics import merge, observe, render_prometheus, reset, snapshot, span, start_server
+
+
+@pytest.fixture(autouse=True)
+def clean_series():
+    reset()
+    yield
+    reset()
+
+
+def test_span_records_duration_and_counts():
+    with span("parse", backend="TEST", records=0) as fields:
+        fields["records"] = 40
+        fields["bytes"] = 1024
+    with pytest.raises(ValueError):
+        with span("parse", backend="TEST", records=2):
+            raise ValueError("bad row")
+
+    series = snapshot()[("parse", "TEST")]
+    assert (series["count"], series["errors"], series["records"], series["bytes"]) == (2, 1, 42, 1024)
+    assert sum(series["buckets"]) == 2
+
+
+def test_durations_fall_into_the_first_bucket_that_holds_them():
+    observe("llm", 0.3, backend="TEST")
+    observe("llm", 0.5, backend="TEST")
+    observe("llm", 1000, backend="TEST")
+    buckets = snapshot()[("llm", "TEST")]["buckets"]
+    assert buckets[metrics.LATENCY_BUCKETS.index(0.5)] == 2
+    # Longer than every bucket: only counted in +Inf
+    assert sum(buckets) == 2
+
+
+def test_snapshots_of_other_processes_are_merged():
+    observe("llm", 1.0, backend="TEST", input_tokens=100)
+    other = snapshot()
+    merge(other)
+    series = snapshot()[("llm", "TEST")]
+    assert (series["count"], series["input_tokens"]) == (2, 200)
+
+
+def test_prometheus_text_format():
+    observe("llm", 0.2, backend="TEST", output_tokens=7)
+    text = render_prometheus()
+    assert 'audit_stage_duration_seconds_bucket{stage="llm",backend="TEST",le="0.25"} 1' in text
+    assert 'audit_stage_duration_seconds_bucket{stage="llm",backend="TEST",le="+Inf"} 1' in text
+    assert 'audit_stage_output_tokens_total{stage="llm",backend="TEST"} 7' in text
+
+
+def test_spans_are_logged_as_json(monkeypatch, caplog):
+    monkeypatch.setattr(config, "METRICS_LOG", True)
+    with caplog.at_level(logging.INFO, logger="metrics"):
+        observe("report_csv", 0.1, backend="TEST", bytes=10, fmt="csv")
+    assert json.loads(caplog.records[-1].message) == {
+        "stage": "report_csv", "backend": "TEST", "seconds": 0.1, "bytes": 10, "fmt": "csv"
+    }
+
+
+def test_metrics_endpoint(monkeypatch):
+    monkeypatch.setattr(metrics, "_server", None)
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = start_server(port=port, host="127.0.0.1")
+    try:
+        assert start_server(port=port, host="127.0.0.1") is server
+        observe("llm", 0.2, backend="TEST")
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert 'stage="llm",backend="TEST"' in response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_disabled_endpoint(monkeypatch):
+    monkeypatch.setattr(metrics, "_server", None)
+    assert start_server(port=0) is None
@@ -0,0 +1,66 @@
+import csv
+import json
+
+import pytest
+
+import config
+from src.prompt_encoding import DICTIONARY_PREFIX, encode_records
+
+RECORDS = [
+    {"id": index, "operator": "A. Meier", "process_step": "Mixing", "quantity_kg": index * 1.5,
+     "status": "completed" if index % 3 else None}
+    for index in range(1, 21)
+]
+
+
+def test_tabular_is_csv_with_the_id_first():
+    encoded = encode_records(RECORDS, mode="tabular", use_dictionary=False)
+    rows = list(csv.reader(encoded["text"].splitlines()))
+    assert encoded["mode"] == "tabular" and not encoded["dictionary"]
+    assert rows[0] == ["id", "operator", "process_step", "quantity_kg", "status"]
+    assert rows[1] == ["1", "A. Meier", "Mixing", "1.5", "completed"]
+    # Missing values are empty cells, as the description tells the model
+    assert rows[3][4] == ""
+    assert "empty cells are null" in encoded["description"]
+
+
+def test_tabular_needs_fewer_tokens_than_the_legacy_json():
+    tabular = encode_records(RECORDS, mode="tabular", use_dictionary=False)
+    legacy = encode_records(RECORDS, mode="json")
+    assert tabular["tokens"] < 0.6 * legacy["tokens"]
+    assert tabular["legacy_tokens"] == pytest.approx(legacy["tokens"], rel=0.1)
+
+
+def test_value_dictionary_replaces_repeated_values():
+    encoded = encode_records(RECORDS, mode="tabular", use_dictionary=True)
+    assert encoded["dictionary"]
+    assert encoded["text"].startswith(f"Dictionary:\n{DICTIONARY_PREFIX}1=")
+    assert "A. Meier" not in encoded["text"].split("Records:\n", 1)[1]
+    assert f"{DICTIONARY_PREFIX}N refer to the dictionary" in encoded["description"]
+
+
+def test_values_that_look_like_references_disable_the_dictionary():
+    records = [{"id": index, "code": f"{DICTIONARY_PREFIX}1", "operator": "A. Meier"} for index in range(3)]
+    assert not encode_records(records, mode="tabular", use_dictionary=True)["dictionary"]
+
+
+def test_nested_records_fall_back_to_minified_json():
+    records = [{"recipe_id": 1, "steps": [{"name": "Mixing"}]}]
+    encoded = encode_records(records, mode="tabular")
+    assert encoded["mode"] == "minified"
+    assert json.loads(encoded["text"]) == records
+    assert encoded["description"] == "JSON array of records"
+
+
+def test_minified_json_round_trips():
+    encoded = encode_records(RECORDS, mode="minified")
+    assert json.loads(encoded["text"]) == RECORDS
+    assert encoded["tokens"] < encoded["legacy_tokens"]
+
+
+def test_mode_defaults_to_the_setting(monkeypatch):
+    monkeypatch.setattr(config, "PROMPT_ENCODING", "MINIFIED")
+    assert encode_records(RECORDS)["mode"] == "minified"
+    monkeypatch.setattr(config, "PROMPT_ENCODING", "yaml")
+    with pytest.raises(ValueError, match="PROMPT_ENCODING"):
+        encode_records(RECORDS)
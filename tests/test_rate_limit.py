@@ -0,0 +1,147 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import config
+from src.rate_limit import RateLimiter, TokenBucket, is_rate_limited, retry_after_seconds
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(config, "RATE_LIMIT_LATENCY_FACTOR", 0)
+    monkeypatch.setattr(config, "CHUNK_RETRY_BASE_SECONDS", 2)
+
+
+def test_token_bucket_refills_continuously():
+    bucket = TokenBucket(per_minute=60)
+    now = bucket.updated
+    assert bucket.capacity == 10
+    assert bucket.wait_seconds(10, now) == 0
+    bucket.take(10)
+    assert bucket.wait_seconds(1, now) == pytest.approx(1.0)
+    assert bucket.wait_seconds(1, now + 1) == pytest.approx(0.0)
+    # Amounts above the capacity only wait for a full bucket, then leave it in debt
+    assert bucket.wait_seconds(50, now + 1) == pytest.approx(9.0)
+
+
+def test_rate_limited_errors_and_their_cause():
+    assert is_rate_limited(HTTPError(429))
+    assert not is_rate_limited(HTTPError(500))
+    try:
+        try:
+            raise HTTPError(429)
+        except HTTPError as e:
+            raise RuntimeError("chunk failed") from e
+    except RuntimeError as wrapped:
+        assert is_rate_limited(wrapped)
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after": "3"}, 3.0),
+    ({"retry-after-ms": "1500", "retry-after": "9"}, 1.5),
+    ({"retry-after": "soon"}, None),
+    ({}, None),
+])
+def test_retry_after_seconds(headers, expected):
+    assert retry_after_seconds(HTTPError(429, headers)) == expected
+
+
+def test_retry_after_http_date():
+    date = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 30))
+    assert retry_after_seconds(HTTPError(429, {"retry-after": date})) == pytest.approx(30, abs=2)
+
+
+def test_429_pauses_calls_and_halves_the_window():
+    limiter = RateLimiter("TEST", max_concurrency=8)
+    with pytest.raises(HTTPError):
+        with limiter.slot(100):
+            raise HTTPError(429, {"retry-after": "5"})
+    assert limiter.concurrency == 4
+    assert limiter.blocked_until == pytest.approx(time.monotonic() + 5, abs=0.5)
+    assert limiter.in_flight == 0
+
+
+def test_calls_started_before_a_decrease_dont_shrink_the_window_again():
+    limiter = RateLimiter("TEST", max_concurrency=8)
+    errors = []
+    started = threading.Barrier(2)
+
+    def call():
+        try:
+            with limiter.slot(100):
+                started.wait()
+                raise HTTPError(429, {"retry-after": "0"})
+        except HTTPError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 2
+    assert limiter.concurrency == 4
+
+
+def test_successful_calls_widen_the_window_additively():
+    limiter = RateLimiter("TEST", max_concurrency=8)
+    limiter.concurrency = 4.0
+    for _ in range(4):
+        with limiter.slot(10):
+            pass
+    assert 4.9 < limiter.concurrency < 5.1
+
+
+def test_window_limits_calls_in_flight():
+    limiter = RateLimiter("TEST", max_concurrency=1)
+    entered = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def first():
+        with limiter.slot(10):
+            entered.set()
+            release.wait()
+            order.append("first")
+
+    def second():
+        with limiter.slot(10) as permit:
+            order.append("second")
+            assert permit["waited"] > 0
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    threads[0].start()
+    entered.wait()
+    threads[1].start()
+    time.sleep(0.1)
+    assert order == []
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert order == ["first", "second"]
+
+
+def test_token_reservation_is_settled_with_the_tokens_used():
+    limiter = RateLimiter("TEST", tpm=60000)
+    level = limiter.tokens.level
+    with limiter.slot(5000) as permit:
+        permit["tokens"] = 2000
+    assert limiter.tokens.level == pytest.approx(level - 2000, abs=50)
+
+
+def test_disabled_limiter_never_waits(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_ENABLED", False)
+    limiter = RateLimiter("TEST", rpm=1, max_concurrency=1)
+    limiter.blocked_until = time.monotonic() + 60
+    with limiter.slot(10) as permit:
+        assert permit["waited"] == 0
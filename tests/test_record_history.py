@@ -0,0 +1,96 @@
+import io
+import json
+
+import pytest
+
+import config
+from src.audit_pipeline import audit_source, summarize_changes
+from src.record_history import (
+    finish_run,
+    load_previous,
+    make_lineage_key,
+    previous_run,
+    record_fingerprint,
+    save_records,
+)
+
+
+def test_fingerprint_ignores_key_order():
+    assert record_fingerprint({"id": 1, "a": [1, 2]}) == record_fingerprint({"a": [1, 2], "id": 1})
+    assert record_fingerprint({"id": 1, "a": [1, 2]}) != record_fingerprint({"id": 1, "a": [2, 1]})
+
+
+def test_lineage_is_scoped_by_dataset_model_and_prompts():
+    key = make_lineage_key("plant-a/batches", "gpt-4o", "system", "user")
+    assert key == make_lineage_key("plant-a/batches", "gpt-4o", "system", "user")
+    assert key != make_lineage_key("plant-b/batches", "gpt-4o", "system", "user")
+    assert key != make_lineage_key("plant-a/batches", "gpt-4o-mini", "system", "user")
+    assert key != make_lineage_key("plant-a/batches", "gpt-4o", "system", "other")
+
+
+def test_records_and_runs_are_stored():
+    lineage = make_lineage_key("dataset", "gpt-4o", "s", "u")
+    assert previous_run(lineage) is None
+    save_records(lineage, [("1", "f1", {"id": 1, "deviations": []}), ("2", "f2", None)])
+    assert load_previous(lineage, ["1", "2", "3"]) == {"1": ("f1", {"id": 1, "deviations": []}), "2": ("f2", None)}
+
+    assert finish_run(lineage, "/data/v1.json", {"1", "2"}, 8, "summary", complete=True) == []
+    run = previous_run(lineage)
+    assert (run["data_quality_score"], run["summary_text"]) == (8, "summary")
+
+    # A complete audit of a version without record 2 removes it
+    assert finish_run(lineage, "/data/v2.json", {"1"}, 9, "", complete=True) == ["2"]
+    assert set(load_previous(lineage, ["1", "2"])) == {"1"}
+    # A partial audit keeps records it didn't reach
+    save_records(lineage, [("3", "f3", None)])
+    assert finish_run(lineage, "/data/v3.json", {"1"}, 9, "", complete=False) == []
+    assert set(load_previous(lineage, ["1", "3"])) == {"1", "3"}
+
+
+@pytest.fixture(autouse=True)
+def incremental(monkeypatch):
+    monkeypatch.setattr(config, "INCREMENTAL_AUDIT", True)
+
+
+def _audit(records, dataset_id, use_cache=True):
+    source = io.BytesIO(json.dumps(records).encode("utf-8"))
+    result_json, _, _, _ = audit_source(
+        source, "json", 100, "gpt-4o", "system", "user", use_cache=use_cache,
+        file_name="batches.json", dataset_id=dataset_id
+    )
+    return result_json
+
+
+def test_reaudit_only_sends_added_and_changed_records(backend):
+    first = [{"id": f"R{index}", "step": "mix", "value": index} for index in range(1, 6)]
+    result = _audit(first, "plant-a")
+    assert backend.sent == ["R1", "R2", "R3", "R4", "R5"]
+    assert result.get("changes") is None
+
+    second = [rec for rec in first if rec["id"] != "R5"] + [{"id": "R6", "step": "mix", "value": 6}]
+    second[1] = {**second[1], "value": 20}
+    backend.sent.clear()
+    result = _audit(second, "plant-a")
+
+    assert backend.sent == ["R2", "R6"]
+    assert [rec["id"] for rec in result["records"]] == ["R1", "R2", "R3", "R4", "R6"]
+    # Unchanged records carry their previous findings
+    assert result["records"][0]["deviations"][0]["description"] == "typo in R1"
+    changes = summarize_changes(result["changes"])
+    assert {key: changes[key] for key in ("added", "changed", "removed", "unchanged")} == {
+        "added": 1, "changed": 1, "removed": 1, "unchanged": 3
+    }
+
+
+def test_other_datasets_and_audits_without_id_start_fresh(backend):
+    records = [{"id": f"R{index}", "step": "mix", "value": index} for index in range(1, 4)]
+    _audit(records, "plant-a")
+    backend.sent.clear()
+    result = _audit(records, "plant-b", use_cache=False)
+    assert backend.sent == ["R1", "R2", "R3"]
+    assert result.get("changes") is None
+
+    backend.sent.clear()
+    result = _audit(records, None, use_cache=False)
+    assert backend.sent == ["R1", "R2", "R3"]
+    assert "changes" not in result
@@ -0,0 +1,81 @@
+import csv
+import json
+
+import pandas as pd
+import pytest
+
+import config
+from src.audit_pipeline import summarize_results
+from src.reports import REPORT_FORMATS, iter_findings, render_report, results_hash
+
+RESULTS = {
+    "summary_text": "Two records with deviations.",
+    "data_quality_score": 6,
+    "records": [
+        {"id": 1, "deviations": [
+            {"type": "Invalid Status", "severity": "Critical", "description": "Status 'done' is not allowed."},
+            {"type": "Extra Spaces", "severity": "Minor", "description": "Operator has a leading space."},
+        ]},
+        {"id": 2, "deviations": []},
+        {"id": "R3", "deviations": [
+            {"type": "Value Out of Range", "severity": "Moderate", "description": "Quantity 0.001 kg, \"tiny\"."},
+        ]},
+    ],
+}
+STATS = summarize_results(RESULTS, 3)
+
+
+@pytest.fixture(autouse=True)
+def report_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "REPORT_DIR", str(tmp_path / "reports"))
+
+
+def test_findings_are_flat_rows_in_record_order():
+    rows = list(iter_findings(RESULTS, "/uploads/batches.json"))
+    assert [(row["record_id"], row["type"]) for row in rows] == [
+        ("1", "Invalid Status"), ("1", "Extra Spaces"), ("R3", "Value Out of Range")
+    ]
+    assert {row["file"] for row in rows} == {"batches.json"}
+
+
+def test_results_hash_covers_the_audit_time():
+    digest = results_hash(RESULTS, "batches.json", STATS, audited_at=1)
+    assert digest == results_hash(RESULTS, "/other/dir/batches.json", STATS, audited_at=1)
+    assert digest != results_hash(RESULTS, "batches.json", STATS, audited_at=2)
+    assert digest != results_hash({**RESULTS, "records": []}, "batches.json", STATS, audited_at=1)
+
+
+def test_exports_hold_every_finding():
+    rows = list(iter_findings(RESULTS, "batches.json"))
+    with open(render_report(RESULTS, "batches.json", STATS, "jsonl"), encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == rows
+    with open(render_report(RESULTS, "batches.json", STATS, "csv"), encoding="utf-8", newline="") as f:
+        assert list(csv.DictReader(f)) == rows
+    frame = pd.read_parquet(render_report(RESULTS, "batches.json", STATS, "parquet"))
+    assert frame.to_dict("records") == rows
+
+
+def test_pdf_report_is_rendered():
+    with open(render_report(RESULTS, "batches.json", STATS, "pdf", audited_at=0), "rb") as f:
+        assert f.read(5) == b"%PDF-"
+
+
+def test_reports_are_rendered_once_and_loaded_lazily():
+    loads = []
+
+    def load_results():
+        loads.append(1)
+        return RESULTS
+
+    digest = results_hash(RESULTS, "batches.json", STATS)
+    path = render_report(load_results, "batches.json", STATS, "csv", digest=digest)
+    assert render_report(load_results, "batches.json", STATS, "csv", digest=digest) == path
+    assert loads == [1]
+    # Without a digest the results are hashed, and the memoised report is found
+    assert render_report(RESULTS, "batches.json", STATS, "csv") == path
+
+
+def test_unknown_format_is_rejected():
+    assert set(REPORT_FORMATS) == {"pdf", "jsonl", "csv", "parquet"}
+    with pytest.raises(ValueError, match="Unknown report format"):
+        render_report(RESULTS, "batches.json", STATS, "xlsx")
@@ -0,0 +1,116 @@
+import pandas as pd
+import pytest
+
+import config
+from src.rules import applies_to, combine_results, normalize_id, screen_records, select_for_llm
+
+VALID = {
+    "id": 1,
+    "material_code": "MAT-001",
+    "process_step": "Mixing",
+    "quantity_kg": 12.5,
+    "start_time": "2024-03-01T08:00:00Z",
+    "end_time": "2024-03-01T09:30:00Z",
+    "status": "completed",
+    "operator": "A. Meier",
+}
+
+
+def _types(findings):
+    return [sorted(dev["type"] for dev in devs) for devs in findings]
+
+
+def _screen(*changes, seen_ids=None):
+    frame = pd.DataFrame.from_records([{**VALID, "id": index + 1, **change} for index, change in enumerate(changes)])
+    return screen_records(frame, seen_ids)
+
+
+def test_applies_only_to_the_flat_schema():
+    assert applies_to(pd.DataFrame.from_records([VALID]))
+    assert not applies_to(pd.DataFrame.from_records([{"recipe_id": 1, "steps": []}]))
+
+
+def test_valid_record_has_no_findings():
+    assert _screen({}) == [[]]
+
+
+@pytest.mark.parametrize("change, expected", [
+    ({"operator": ""}, ["Missing Mandatory Field"]),
+    ({"status": "done"}, ["Invalid Status"]),
+    ({"status": "Completed"}, ["Inconsistent Casing"]),
+    ({"status": "completed", "end_time": None}, ["Conflicting Status Code", "Missing Mandatory Field"]),
+    ({"quantity_kg": -2}, ["Negative Quantity"]),
+    ({"quantity_kg": 0.001}, ["Value Out of Range"]),
+    ({"quantity_kg": 1050}, ["Slightly Out of Range Quantity"]),
+    ({"quantity_kg": 5000}, ["Grossly Incorrect Quantity"]),
+    ({"quantity_kg": "twelve"}, ["Format Error"]),
+    ({"start_time": "2024-03-01T10:00:00Z"}, ["Timestamp Sequence Error"]),
+    ({"start_time": "01/03/2024 08:00"}, ["Non-Standard Timestamp"]),
+    ({"start_time": "not a date"}, ["Invalid Date Format"]),
+    ({"operator": " A. Meier"}, ["Extra Spaces"]),
+])
+def test_checks(change, expected):
+    assert _types(_screen({}, change)) == [[], sorted(expected)]
+
+
+def test_absent_mandatory_columns_are_not_checked():
+    record = {key: value for key, value in VALID.items() if key != "operator"}
+    assert screen_records(pd.DataFrame.from_records([record])) == [[]]
+
+
+def test_descriptions_name_the_value():
+    findings = _screen({"status": "done"})
+    assert findings[0][0]["severity"] == "Critical"
+    assert "'done'" in findings[0][0]["description"]
+
+
+def test_duplicates_within_and_across_batches():
+    seen_ids = set()
+    first = _screen({"id": 1}, {"id": 1}, seen_ids=seen_ids)
+    assert _types(first) == [[], ["Duplicate Record"]]
+    # Float-formatted ids (CSV columns with gaps) match their integer form
+    second = _screen({"id": 1.0}, {"id": 2.0}, seen_ids=seen_ids)
+    assert _types(second) == [["Duplicate Record"], []]
+    assert seen_ids == {"1", "2"}
+
+
+@pytest.mark.parametrize("value, expected", [(1, "1"), (1.0, "1"), (" 12.00", "12"), ("1.5", "1.5"), ("A1.0", "A1.0")])
+def test_normalize_id(value, expected):
+    assert normalize_id(value) == expected
+
+
+def test_select_for_llm_scopes():
+    findings = [[], [{"type": "Invalid Status"}], []]
+    assert select_for_llm(findings, "all") == [0, 1, 2]
+    assert select_for_llm(findings, "unflagged") == [0, 2]
+    assert select_for_llm(findings, "none") == []
+    with pytest.raises(ValueError):
+        select_for_llm(findings, "some")
+
+
+def test_combine_results_merges_local_findings_into_llm_records():
+    local = {"type": "Invalid Status", "severity": "Critical", "description": "local"}
+    findings = [[local], [], [local]]
+    llm_result = {
+        "summary_text": "LLM summary",
+        "data_quality_score": 8,
+        "records": [
+            {"id": "1", "deviations": [{"type": "Invalid Status", "severity": "Critical", "description": "llm"}]},
+            {"id": "2", "deviations": []},
+        ],
+    }
+    combined = combine_results([1.0, 2.0, 3.0], findings, [0, 1], llm_result)
+
+    assert [rec["id"] for rec in combined["records"]] == ["1", "2", 3.0]
+    # The LLM already reported the local finding's type for record 1
+    assert [dev["description"] for dev in combined["records"][0]["deviations"]] == ["llm"]
+    assert combined["records"][2]["deviations"] == [local]
+    assert combined["summary_text"] == "LLM summary"
+    # One record settled locally (non-compliant: score 1), two scored 8 by the LLM
+    assert combined["data_quality_score"] == round((1 + 2 * 8) / 3)
+
+
+def test_only_unflagged_records_go_to_the_llm_by_default(monkeypatch):
+    monkeypatch.delenv("RULES_LLM_SCOPE", raising=False)
+    assert config.Settings().rules_llm_scope == "unflagged"
+
@@ -0,0 +1,80 @@
+import json
+
+import config
+from src.audit import analyze_chunk, analyze_recipe
+from src.stream_parser import RecordStreamParser, salvage_response
+
+RESPONSE = {
+    "summary_text": "Two records, one with a \"quoted\" {brace}.",
+    "records": [
+        {"id": "R1", "deviations": [{"type": "Extra Spaces", "description": "Field '}' has ]"}]},
+        {"id": "R2", "deviations": [], "steps": [{"name": "mix"}]},
+    ],
+    "data_quality_score": 7,
+}
+
+
+def test_records_are_emitted_as_they_close():
+    text = "```json\n" + json.dumps(RESPONSE) + "\n```"
+    emitted = []
+    parser = RecordStreamParser(on_record=emitted.append)
+    for char in text:
+        parser.feed(char)
+    assert emitted == RESPONSE["records"]
+    assert parser.records == RESPONSE["records"]
+    assert parser.text() == text
+
+
+def test_record_is_emitted_before_the_response_ends():
+    text = json.dumps(RESPONSE)
+    parser = RecordStreamParser()
+    parser.feed(text[:text.index('{"id": "R2"')])
+    assert [rec["id"] for rec in parser.records] == ["R1"]
+
+
+def test_arrays_outside_records_are_ignored():
+    parser = RecordStreamParser()
+    parser.feed(json.dumps({"notes": [{"id": "N1"}], "records": [{"id": "R1"}], "tail": [{"id": "T1"}]}))
+    assert parser.records == [{"id": "R1"}]
+
+
+
+def test_streamed_records_reach_the_callback_of_every_chunk(backend, monkeypatch):
+    monkeypatch.setattr(config, "CHUNK_MAX_RECORDS", 2)
+    streamed = []
+    result = analyze_recipe([{"id": f"R{index}"} for index in range(5)], "gpt-4o", "system", "user",
+                            use_cache=False, record_callback=streamed.extend)
+    # Chunks finish in any order; every record is streamed once
+    assert sorted(streamed, key=lambda rec: rec["id"]) == result["records"]
+
+
+def test_salvage_keeps_complete_records_of_a_truncated_response():
+    text = json.dumps(RESPONSE)
+    truncated = text[:text.index('"steps"') + 12]
+    salvaged = salvage_response(truncated)
+    assert salvaged["records"] == RESPONSE["records"][:1]
+    assert salvaged["summary_text"] == RESPONSE["summary_text"]
+    assert "data_quality_score" not in salvaged
+
+
+def test_salvage_reads_the_score_and_skips_malformed_records():
+    text = '{"records": [{"id": "R1"}, {"id": R2}, {"id": "R3"}], "data_quality_score": 6.6}'
+    salvaged = salvage_response(text)
+    assert [rec["id"] for rec in salvaged["records"]] == ["R1", "R3"]
+    assert salvaged["data_quality_score"] == 7
+    assert salvaged["summary_text"] == ""
+
+
+def test_only_records_missing_from_a_truncated_response_are_requested_again(backend, monkeypatch):
+    complete = backend.complete
+    calls = []
+
+    def truncate_first(*args, **kwargs):
+        text = complete(*args, **kwargs)
+        calls.append(text)
+        return text[:text.index('{"id": "R2"') + 10] if len(calls) == 1 else text
+
+    monkeypatch.setattr(backend, "complete", truncate_first)
+    result = analyze_chunk([{"id": f"R{index}"} for index in range(4)], "gpt-4o", "system", "user", use_cache=False)
+    assert backend.sent == ["R0", "R1", "R2", "R3", "R2", "R3"]
+    assert [rec["id"] for rec in result["records"]] == ["R0", "R1", "R2", "R3"]